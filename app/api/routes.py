@@ -1,72 +1,461 @@
 import os
-import io
 import uuid
+import json
+import asyncio
+import hashlib
+import functools
 import shutil
 import tempfile
 import zipfile
-from datetime import datetime
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, File, Form, Query, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from app.core import config
+from app.core.executor import JobCancelled
+from app.core.metrics import REGISTRY, CollectedCounter, Gauge, resident_memory_bytes
 from app.core.task_manager import TaskManager
-from app.services.audio_separator import AudioSeparator
+from app.core.task_store import UNFINISHED_STATUSES
+from app.core.warmup import Warmup
+from app.services.audio_separator import DEMUCS_AVAILABLE, find_excerpt, get_separator, separate
+from app.services.encoding import available_formats, media_type_for, stem_path
+from app.services.inference import INFERENCE_PROFILES
+from app.services.model_registry import SUPPORTED_MODELS
+from app.services.profiling import profile_files
+from app.services.result_cache import ResultCache
+from app.services.stems import known_stems, parse_stems, resolve_stems
+from app.services.storage import JobStorage
+from app.utils.audio_probe import ProbeError, probe_audio
+from app.utils.growing_wav import HEADER_READ_BYTES, follow_wav, wav_layout
+from app.utils.http_files import file_response
+from app.utils.zipstream import stream_zip
 
 router = APIRouter()
-task_manager = TaskManager()
-separator = AudioSeparator()
+task_manager = TaskManager(run_jobs=not config.API_ONLY)
+warmup = Warmup()
+separator = get_separator()
+result_cache = (
+    ResultCache(config.RESULT_CACHE_DIR, config.RESULT_CACHE_MAX_BYTES)
+    if config.RESULT_CACHE_ENABLED else None
+)
+storage = JobStorage(
+    config.STORAGE_DIR, config.JOB_TTL_SECONDS, config.STORAGE_HIGH_WATERMARK, config.STORAGE_LOW_WATERMARK
+)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+SSE_KEEPALIVE_SECONDS = 15
+# How often a stem that is still being rendered is checked for new samples
+STEM_FOLLOW_SECONDS = 0.25
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg')
+TASK_STATUSES = ("queued", "processing", "completed", "failed", "cancelled")
+
+def cache_counters() -> dict:
+    # The PCM cache only counts lookups by jobs that ran in this process
+    caches = {"result": result_cache, "pcm": separator.pcm_cache}
+    return {name: cache for name, cache in caches.items() if cache is not None}
+
+def cache_lookups() -> dict:
+    lookups = {}
+    for name, cache in cache_counters().items():
+        lookups[(name, "hit")] = cache.hits
+        lookups[(name, "miss")] = cache.misses
+    return lookups
+
+def cache_hit_ratio() -> dict:
+    return {
+        name: cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0.0
+        for name, cache in cache_counters().items()
+    }
+
+def active_tasks() -> int:
+    # Worker processes are only visible through the store
+    if task_manager.run_jobs:
+        return len(task_manager.active_tasks)
+    return task_manager.store.count("processing")
+
+# Read on every scrape, so /metrics costs a few COUNT(*) queries
+REGISTRY.register(Gauge(
+    "stem_separator_tasks", "Tasks in the store by status",
+    lambda: {status: task_manager.store.count(status) for status in TASK_STATUSES}, labels=("status",)
+))
+REGISTRY.register(Gauge("stem_separator_active_tasks", "Tasks being separated right now", active_tasks))
+REGISTRY.register(CollectedCounter(
+    "stem_separator_cache_lookups_total", "Cache lookups by cache and outcome",
+    cache_lookups, labels=("cache", "result")
+))
+REGISTRY.register(Gauge(
+    "stem_separator_cache_hit_ratio", "Share of cache lookups that were hits", cache_hit_ratio, labels=("cache",)
+))
+REGISTRY.register(Gauge(
+    "process_resident_memory_bytes", "Resident memory of the API process", resident_memory_bytes
+))
+REGISTRY.register(Gauge(
+    "stem_separator_storage_free_bytes", "Free space on the disk that holds job directories",
+    lambda: shutil.disk_usage(storage.root).free
+))
 
 @router.get("/")
 async def root():
     return {
         "message": "Audio Stem Separator API",
         "status": "running",
-        "demucs_available": separator.model is not None,
-        "device": separator.device
+        "demucs_available": DEMUCS_AVAILABLE,
+        "device": warmup.device,
+        "models": list(SUPPORTED_MODELS),
+        "default_model": config.DEFAULT_MODEL,
+        "output_formats": available_formats(),
+        "default_output_format": config.OUTPUT_FORMAT
     }
 
+@router.get("/health/live")
+async def liveness():
+    # Answers as soon as the server accepts connections, warm or not
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness():
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+@router.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 async def process_task(task_id: str):
     task = task_manager.get_task(task_id)
+    profile_dir = None
     try:
-        temp_dir = tempfile.mkdtemp()
-        output_dir = os.path.join(temp_dir, 'stems')
+        # Tasks queued before job directories existed get a temporary one
+        job_dir = task.job_dir or tempfile.mkdtemp()
+        output_dir = os.path.join(job_dir, 'stems')
         os.makedirs(output_dir, exist_ok=True)
+        if task.capture_profile:
+            profile_dir = os.path.join(job_dir, 'profile')
+        progress = functools.partial(task_manager.update_progress, task_id)
+        
+        excerpt = None
+        if task.excerpt_seconds:
+            task.excerpt_start = await task_manager.executor.run(
+                find_excerpt, task.input_path, task.excerpt_seconds, task.content_hash, progress=progress
+            )
+            excerpt = (task.excerpt_start, task.excerpt_seconds)
         
-        input_path = os.path.join(temp_dir, task.input_path)
+        stem_files, timings = await task_manager.executor.run(
+            separate, task.input_path, output_dir, task.model, task.output_format, task.requested_stems,
+            task.inference_profile, task.content_hash, profile_dir, excerpt, progress=progress
+        )
+        task.profile_files = profile_files(profile_dir)
+        task_manager.complete_task(task_id, stem_files, timings)
         
-        await separator.separate_audio(input_path, output_dir, task_id, task_manager.tasks)
-        task.completed_at = datetime.now()
+        if result_cache is not None and task.cache_key:
+            try:
+                await asyncio.to_thread(result_cache.put, task.cache_key, stem_files)
+            except Exception as e:
+                print(f"Error caching stems for {task_id}: {e}")
         
+    except JobCancelled:
+        # The task is already marked cancelled
+        pass
     except Exception as e:
-        task.status = "failed"
-        task.error = str(e)
+        # A profile of the failed run is kept as well
+        task.profile_files = profile_files(profile_dir)
+        task_manager.fail_task(task_id, str(e))
         raise e
 
 @router.post("/upload")
-async def upload_audio(file: UploadFile = File(...)):
-    if not file.content_type or not file.content_type.startswith('audio/'):
-        allowed_extensions = {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg'}
-        if not any(file.filename.lower().endswith(ext) for ext in allowed_extensions):
-            raise HTTPException(
-                status_code=400, 
-                detail="Invalid file type. Please upload an audio file."
-            )
+async def upload_audio(file: UploadFile = File(...), model: str = Form(config.DEFAULT_MODEL),
+                       output_format: str = Form(config.OUTPUT_FORMAT), stems: str = Form(""),
+                       profile: str = Form(config.INFERENCE_PROFILE), capture_profile: bool = Form(False),
+                       preview: bool = Form(False)):
+    requested_stems = check_options(model, output_format, stems, profile)
+    
+    if capture_profile and not config.PROFILING_ALLOWED:
+        raise HTTPException(status_code=400, detail="Profiling is disabled on this server")
+    capture_profile = capture_profile or config.PROFILE_EVERY_TASK
+    
+    if not is_audio_upload(file):
+        raise HTTPException(
+            status_code=400, 
+            detail="Invalid file type. Please upload an audio file."
+        )
     
     task_id = str(uuid.uuid4())
     
-    # Create temporary directory and save file
-    temp_dir = tempfile.mkdtemp()
-    input_path = os.path.join(temp_dir, file.filename)
-    with open(input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Save the file into the task's job directory, hashing it on the way
+    job_dir = storage.create(task_id)
+    input_path = storage.input_path(job_dir, file.filename)
+    try:
+        content_hash = await ingest_upload(file, input_path, config.MAX_FILE_SIZE)
+        # Corrupt or unsupported files are turned away before they are queued
+        audio_info = await asyncio.to_thread(probe_audio, input_path)
+    except ProbeError as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    
+    cache_key = None
+    if result_cache is not None:
+        signature = separator.cache_signature(model, output_format, requested_stems, profile)
+        cache_key = ResultCache.make_key(content_hash, signature)
+    # A task that is to be profiled has to actually run
+    if cache_key is not None and not capture_profile:
+        stem_files = await asyncio.to_thread(
+            result_cache.materialize, cache_key, os.path.join(job_dir, 'stems')
+        )
+        if stem_files is not None:
+            task_manager.add_cached_task(
+                task_id, input_path, stem_files, job_dir=job_dir,
+                content_hash=content_hash, cache_key=cache_key, model=model,
+                output_format=output_format, requested_stems=requested_stems,
+                inference_profile=profile, **audio_info.model_dump(exclude={"prober"})
+            )
+            return {
+                "task_id": task_id,
+                "status": "completed",
+                "queue_position": None,
+                "cache_hit": True,
+                "duration": audio_info.duration
+            }
+    
+    # A preview jumps the queue: an excerpt of the upload, separated with
+    # the fast profile, and never cached since it isn't the full result
+    preview_task_id = None
+    if preview and audio_info.duration > config.PREVIEW_SECONDS:
+        preview_task_id = str(uuid.uuid4())
+        task_manager.add_task(
+            preview_task_id, input_path, job_dir=storage.create(preview_task_id), content_hash=content_hash,
+            model=model, output_format=output_format, requested_stems=requested_stems,
+            inference_profile=config.PREVIEW_PROFILE, priority=1, preview_of=task_id,
+            excerpt_seconds=config.PREVIEW_SECONDS, **audio_info.model_dump(exclude={"prober"})
+        )
     
     # Create task and add to queue
-    task = task_manager.add_task(task_id, input_path)
+    task = task_manager.add_task(
+        task_id, input_path, job_dir=job_dir, content_hash=content_hash, cache_key=cache_key, model=model,
+        output_format=output_format, requested_stems=requested_stems,
+        inference_profile=profile, capture_profile=capture_profile, preview_task_id=preview_task_id,
+        **audio_info.model_dump(exclude={"prober"})
+    )
     
     return {
         "task_id": task_id,
         "status": "queued",
-        "queue_position": task.queue_position
+        "queue_position": task.queue_position,
+        "cache_hit": False,
+        "duration": audio_info.duration,
+        "preview_task_id": preview_task_id
+    }
+
+@router.post("/batch")
+async def upload_batch(files: List[UploadFile] = File(None), archive: Optional[UploadFile] = File(None),
+                       model: str = Form(config.DEFAULT_MODEL), output_format: str = Form(config.OUTPUT_FORMAT),
+                       stems: str = Form(""), profile: str = Form(config.INFERENCE_PROFILE)):
+    # Several tracks (an album, say) as one group: sent as files, or as one
+    # ZIP archive, with the same options for all of them. Every track becomes
+    # a task of its own, and they are queued back to back so that they run
+    # side by side on one loaded model.
+    requested_stems = check_options(model, output_format, stems, profile)
+    if bool(files) == (archive is not None):
+        raise HTTPException(status_code=400, detail="Send either files or one archive")
+    
+    group_id = str(uuid.uuid4())
+    # (task_id, job_dir, input_path, content_hash) per track
+    jobs: List[Tuple[str, str, str, str]] = []
+    try:
+        if archive is not None:
+            await ingest_archive(archive, jobs)
+        else:
+            await ingest_files(files, jobs)
+        # One unreadable track turns the whole group away
+        infos = []
+        for _, _, input_path, _ in jobs:
+            try:
+                infos.append(await asyncio.to_thread(probe_audio, input_path))
+            except ProbeError as e:
+                raise HTTPException(status_code=400, detail=f"{os.path.basename(input_path)}: {e}")
+        
+        cached = []
+        signature = separator.cache_signature(model, output_format, requested_stems, profile)
+        for task_id, job_dir, _, content_hash in jobs:
+            stem_files = cache_key = None
+            if result_cache is not None:
+                cache_key = ResultCache.make_key(content_hash, signature)
+                stem_files = await asyncio.to_thread(
+                    result_cache.materialize, cache_key, os.path.join(job_dir, 'stems')
+                )
+            cached.append((cache_key, stem_files))
+    except BaseException:
+        for _, job_dir, _, _ in jobs:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    
+    # Nothing is awaited from here on, so no other upload lands in between
+    for (task_id, job_dir, input_path, content_hash), audio_info, (cache_key, stem_files) in zip(jobs, infos, cached):
+        fields = dict(
+            job_dir=job_dir, content_hash=content_hash, cache_key=cache_key, model=model,
+            output_format=output_format, requested_stems=requested_stems, inference_profile=profile,
+            group_id=group_id, **audio_info.model_dump(exclude={"prober"})
+        )
+        if stem_files is not None:
+            task_manager.add_cached_task(task_id, input_path, stem_files, **fields)
+        else:
+            task_manager.add_task(task_id, input_path, **fields)
+    
+    return group_summary(group_id, task_manager.get_group(group_id))
+
+async def ingest_files(files: List[UploadFile], jobs: list):
+    if len(files) > config.BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {config.BATCH_MAX_FILES} files per batch")
+    for upload in files:
+        if not is_audio_upload(upload):
+            raise HTTPException(status_code=400, detail=f"{upload.filename} is not an audio file")
+    total = 0
+    for upload in files:
+        task_id = str(uuid.uuid4())
+        job_dir = storage.create(task_id)
+        input_path = storage.input_path(job_dir, upload.filename)
+        jobs.append((task_id, job_dir, input_path, None))
+        content_hash = await ingest_upload(upload, input_path, config.MAX_FILE_SIZE)
+        jobs[-1] = (task_id, job_dir, input_path, content_hash)
+        total += os.path.getsize(input_path)
+        if total > config.MAX_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f"Batch is larger than the {config.MAX_BATCH_SIZE} byte limit")
+
+async def ingest_archive(archive: UploadFile, jobs: list):
+    fd, archive_path = tempfile.mkstemp(suffix=".zip")
+    os.close(fd)
+    try:
+        await ingest_upload(archive, archive_path, config.MAX_BATCH_SIZE)
+        await asyncio.to_thread(unpack_archive, archive_path, jobs)
+    except (zipfile.BadZipFile, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(archive_path)
+
+def unpack_archive(archive_path: str, jobs: list):
+    # Audio files anywhere in the archive, each into a job directory of its
+    # own; sizes are counted while copying, the archive's own claims can lie
+    with zipfile.ZipFile(archive_path) as zf:
+        members = [
+            info for info in zf.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(AUDIO_EXTENSIONS)
+            # Resource forks and other hidden files some archivers add
+            and not info.filename.startswith("__MACOSX/") and not os.path.basename(info.filename).startswith(".")
+        ]
+        if not members:
+            raise ValueError("The archive has no audio files in it")
+        if len(members) > config.BATCH_MAX_FILES:
+            raise ValueError(f"At most {config.BATCH_MAX_FILES} files per batch")
+        total = 0
+        for info in members:
+            task_id = str(uuid.uuid4())
+            job_dir = storage.create(task_id)
+            input_path = storage.input_path(job_dir, info.filename)
+            jobs.append((task_id, job_dir, input_path, None))
+            digest = hashlib.sha256()
+            size = 0
+            with zf.open(info) as source, open(input_path, "wb") as target:
+                for chunk in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b""):
+                    size += len(chunk)
+                    total += len(chunk)
+                    if size > config.MAX_FILE_SIZE:
+                        raise ValueError(f"{info.filename} is larger than the {config.MAX_FILE_SIZE} byte limit")
+                    if total > config.MAX_BATCH_SIZE:
+                        raise ValueError(f"Batch is larger than the {config.MAX_BATCH_SIZE} byte limit")
+                    write_chunk(target, digest, chunk)
+            jobs[-1] = (task_id, job_dir, input_path, digest.hexdigest())
+
+def group_summary(group_id: str, tasks: list) -> dict:
+    counts = {}
+    for task in tasks:
+        counts[task.status] = counts.get(task.status, 0) + 1
+    unfinished = [task for task in tasks if task.status in UNFINISHED_STATUSES]
+    if unfinished:
+        status = "queued" if len(unfinished) == len(tasks) and "processing" not in counts else "processing"
+    elif counts.get("completed") == len(tasks):
+        status = "completed"
+    else:
+        # Some or all tracks failed or were cancelled
+        status = "partial" if "completed" in counts else "failed"
+    # Finished tracks count in full, whatever their outcome
+    progress = sum(task.progress if task.status in UNFINISHED_STATUSES else 100 for task in tasks)
+    return {
+        "group_id": group_id,
+        "status": status,
+        "progress": round(progress / len(tasks)),
+        "counts": counts,
+        "tasks": [
+            {
+                "task_id": task.task_id,
+                "filename": os.path.basename(task.input_path or ""),
+                "status": task.status,
+                "progress": task.progress,
+                "queue_position": task.queue_position,
+                "cache_hit": task.cache_hit,
+                "error": task.error
+            }
+            for task in tasks
+        ]
     }
 
+def check_options(model: str, output_format: str, stems: str, profile: str) -> Optional[List[str]]:
+    # Returns the requested stems
+    if model not in SUPPORTED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown model. Choose one of: {', '.join(SUPPORTED_MODELS)}"
+        )
+    
+    if output_format not in available_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported output format. Choose one of: {', '.join(available_formats())}"
+        )
+    
+    if profile not in INFERENCE_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown inference profile. Choose one of: {', '.join(INFERENCE_PROFILES)}"
+        )
+    
+    # Comma separated, e.g. "vocals,instrumental"; empty asks for every source
+    requested_stems = parse_stems(stems)
+    if requested_stems:
+        try:
+            requested_stems = resolve_stems(requested_stems, separator.stem_sources(model))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return requested_stems
+
+def is_audio_upload(upload: UploadFile) -> bool:
+    if upload.content_type and upload.content_type.startswith('audio/'):
+        return True
+    return (upload.filename or "").lower().endswith(AUDIO_EXTENSIONS)
+
+async def ingest_upload(upload: UploadFile, destination: str, max_bytes: int) -> str:
+    # Copy, hash and size check happen in one pass; the blocking parts run
+    # in a thread so a large upload never stalls the event loop
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File is larger than the {max_bytes} byte limit")
+    
+    digest = hashlib.sha256()
+    size = 0
+    with open(destination, "wb") as buffer:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"File is larger than the {max_bytes} byte limit")
+            await asyncio.to_thread(write_chunk, buffer, digest, chunk)
+    return digest.hexdigest()
+
+def write_chunk(buffer, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+
 @router.get("/status/{task_id}")
 async def get_task_status(task_id: str):
     task = task_manager.get_task(task_id)
@@ -74,8 +463,102 @@ async def get_task_status(task_id: str):
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
+@router.get("/events/{task_id}")
+async def task_events(task_id: str, request: Request):
+    if not task_manager.get_task(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    queue = task_manager.subscribe(task_id)
+    
+    async def event_stream():
+        try:
+            event = task_manager.task_event(task_id)
+            while event is not None:
+                yield f"event: {event['status']}\ndata: {json.dumps(event)}\n\n"
+                if event["status"] not in UNFINISHED_STATUSES:
+                    break
+                sent, event = event, None
+                while event is None:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            return
+                        # With several server processes the task may run in
+                        # another one, whose updates only reach us through
+                        # the store
+                        current = task_manager.task_event(task_id)
+                        if current is None:
+                            return
+                        if (current["status"], current["progress"]) != (sent["status"], sent["progress"]):
+                            event = current
+                        else:
+                            # Comment line keeps proxies from closing an idle stream
+                            yield ": keep-alive\n\n"
+        finally:
+            task_manager.unsubscribe(task_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/cancel/{task_id}")
+async def cancel_task(task_id: str):
+    task = task_manager.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    # Checked again by cancel_task, the task may finish in between
+    if task.status not in UNFINISHED_STATUSES or task_manager.cancel_task(task_id) is None:
+        raise HTTPException(status_code=409, detail="Task has already finished")
+    return {"task_id": task_id, "status": "cancelled"}
+
+@router.get("/batch/{group_id}")
+async def get_batch_status(group_id: str):
+    tasks = task_manager.get_group(group_id)
+    if not tasks:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return group_summary(group_id, tasks)
+
+@router.get("/batch/{group_id}/download")
+async def download_batch(group_id: str, compress: bool = False):
+    tasks = task_manager.get_group(group_id)
+    if not tasks:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    if any(task.status in UNFINISHED_STATUSES for task in tasks):
+        raise HTTPException(status_code=400, detail="Batch not finished yet")
+    
+    # One folder per track, named after the uploaded file
+    entries = []
+    folders = set()
+    for task in tasks:
+        if task.status != "completed":
+            continue
+        name = os.path.splitext(os.path.basename(task.input_path or ""))[0] or task.task_id
+        folder, n = name, 1
+        while folder in folders:
+            n += 1
+            folder = f"{name} ({n})"
+        folders.add(folder)
+        entries += [
+            (candidate, f"{folder}/{os.path.basename(candidate)}")
+            for candidate in task.stems or []
+            if os.path.exists(candidate)
+        ]
+    
+    if not entries:
+        raise HTTPException(status_code=404, detail="No stems found")
+    
+    return StreamingResponse(
+        stream_zip(entries, compress=compress),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=stems_{group_id}.zip"}
+    )
+
 @router.get("/download/{task_id}")
-async def download_stems(task_id: str):
+async def download_stems(task_id: str, compress: bool = False):
     task = task_manager.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -86,24 +569,21 @@ async def download_stems(task_id: str):
     if not task.stems:
         raise HTTPException(status_code=404, detail="No stems found")
     
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for stem_path in task.stems:
-            if os.path.exists(stem_path):
-                stem_name = os.path.basename(stem_path)
-                zip_file.write(stem_path, stem_name)
-    
-    zip_buffer.seek(0)
+    entries = [
+        (candidate, os.path.basename(candidate))
+        for candidate in task.stems
+        if os.path.exists(candidate)
+    ]
     
+    # Entries are written to the response as they are read from disk
     return StreamingResponse(
-        io.BytesIO(zip_buffer.read()),
+        stream_zip(entries, compress=compress),
         media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename=stems_{task_id}.zip"}
     )
 
 @router.get("/download/{task_id}/{stem_name}")
-async def download_single_stem(task_id: str, stem_name: str):
+async def download_single_stem(task_id: str, stem_name: str, request: Request):
     task = task_manager.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -112,18 +592,77 @@ async def download_single_stem(task_id: str, stem_name: str):
         raise HTTPException(status_code=400, detail="Task not completed yet")
     
     stem_file = None
-    for stem_path in task.stems or []:
-        if stem_name in os.path.basename(stem_path):
-            stem_file = stem_path
+    for candidate in task.stems or []:
+        if stem_name in os.path.basename(candidate):
+            stem_file = candidate
             break
     
     if not stem_file or not os.path.exists(stem_file):
         raise HTTPException(status_code=404, detail="Stem not found")
     
-    return FileResponse(
-        stem_file,
-        media_type="audio/wav",
-        filename=os.path.basename(stem_file)
+    # Range and If-None-Match/If-Range requests are answered from the file
+    return await file_response(request, stem_file, media_type_for(stem_file), os.path.basename(stem_file))
+
+@router.get("/stream/{task_id}/{stem_name}")
+async def stream_stem(task_id: str, stem_name: str, request: Request):
+    # Plays while the task runs: the WAV being written is passed on as it
+    # grows. Long files are written segment by segment, so their first
+    # samples are here long before the task is done; a task whose stems only
+    # show up at the end (or not as WAV) is streamed from its finished file.
+    task = task_manager.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.status in UNFINISHED_STATUSES and stem_name not in (task.requested_stems or separator.stem_sources(task.model)):
+        raise HTTPException(status_code=404, detail="Stem not found")
+    
+    # Rendered WAV, or the lossless intermediate of formats written after separation
+    partial_file = stem_path(os.path.join(task.job_dir or "", 'stems'), stem_name, "wav24")
+    while task.status in UNFINISHED_STATUSES:
+        if task.job_dir and await asyncio.to_thread(wav_header_written, partial_file):
+            def finished():
+                current = task_manager.get_task(task_id)
+                return current is None or current.status not in UNFINISHED_STATUSES
+            return StreamingResponse(
+                follow_wav(partial_file, finished, STEM_FOLLOW_SECONDS),
+                media_type="audio/wav", headers={"Cache-Control": "no-cache"}
+            )
+        await asyncio.sleep(STEM_FOLLOW_SECONDS)
+        if await request.is_disconnected():
+            raise HTTPException(status_code=499, detail="Client went away")
+        task = task_manager.get_task(task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+    
+    return await download_single_stem(task_id, stem_name, request)
+
+def wav_header_written(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return wav_layout(f.read(HEADER_READ_BYTES)) is not None
+    except OSError:
+        return False
+
+@router.get("/profile/{task_id}")
+async def download_profile(task_id: str):
+    task = task_manager.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    if task.status not in ("completed", "failed"):
+        raise HTTPException(status_code=400, detail="Task not finished yet")
+    
+    entries = [
+        (profile_path, os.path.basename(profile_path))
+        for profile_path in task.profile_files or []
+        if os.path.exists(profile_path)
+    ]
+    if not entries:
+        raise HTTPException(status_code=404, detail="No profile was captured for this task")
+    
+    return StreamingResponse(
+        stream_zip(entries, compress=True),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=profile_{task_id}.zip"}
     )
 
 @router.delete("/cleanup/{task_id}")
@@ -132,22 +671,52 @@ async def cleanup_task(task_id: str):
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    if task.stems:
-        for stem_path in task.stems:
-            try:
-                stem_dir = os.path.dirname(stem_path)
-                if os.path.exists(stem_dir):
-                    shutil.rmtree(os.path.dirname(stem_dir))
-            except Exception as e:
-                print(f"Error cleaning up {stem_path}: {e}")
+    # The upload goes too, not just the stems
+    job_dirs = {task.job_dir} if task.job_dir else {
+        os.path.dirname(os.path.dirname(candidate)) for candidate in task.stems or []
+    }
+    reclaimed = 0
+    for job_dir in job_dirs:
+        if os.path.exists(job_dir):
+            reclaimed += await asyncio.to_thread(storage.remove, job_dir, "cleanup")
     
     task_manager.cleanup_task(task_id)
-    return {"message": "Task cleaned up successfully"}
+    return {"message": "Task cleaned up successfully", "reclaimed_bytes": reclaimed}
+
+async def sweep_storage(interval: float):
+    # Expired jobs, and the oldest finished ones when the disk fills up,
+    # lose their directory and their task record
+    while True:
+        try:
+            for task_id in await asyncio.to_thread(storage.sweep, task_manager.store):
+                task_manager.cleanup_task(task_id)
+        except Exception as e:
+            print(f"Error sweeping job storage: {e}")
+        await asyncio.sleep(interval)
 
 @router.get("/tasks")
-async def list_tasks():
-    return task_manager.list_tasks()
+async def list_tasks(status: Optional[str] = None, limit: int = Query(50, ge=1, le=500),
+                     offset: int = Query(0, ge=0)):
+    return task_manager.list_tasks(status, limit, offset)
 
 @router.get("/queue/status")
 async def get_queue_status():
-    return task_manager.get_queue_status() 
\ No newline at end of file
+    return task_manager.get_queue_status() 
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+@router.get("/models")
+async def get_models():
+    return {
+        "available": list(SUPPORTED_MODELS),
+        "default": config.DEFAULT_MODEL,
+        "profiles": list(INFERENCE_PROFILES),
+        "default_profile": config.INFERENCE_PROFILE,
+        # What the stems upload field accepts for each model
+        "stems": {name: known_stems(separator.stem_sources(name)) for name in SUPPORTED_MODELS},
+        **separator.registry.stats()
+    }
@@ -0,0 +1,131 @@
+import os
+import re
+import tempfile
+
+def parse_size(value: str) -> int:
+    # "500MB", "2GB", "1.5 GiB" or a plain number of bytes
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)(i?B)?\s*", value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    number, unit, _ = match.groups()
+    return int(float(number) * 1024 ** " KMGT".index(unit.upper() or " "))
+
+MAX_CONCURRENT_TASKS = int(os.getenv("MAX_CONCURRENT_TASKS", "2"))
+
+# "thread" shares one model across worker threads, "process" gives every
+# worker its own interpreter (and its own copy of the model)
+EXECUTOR_BACKEND = os.getenv("EXECUTOR_BACKEND", "thread")
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_DIR = os.getenv(
+    "RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "stem-separator-cache")
+)
+RESULT_CACHE_MAX_BYTES = parse_size(os.getenv("RESULT_CACHE_MAX_BYTES", "5GB"))
+
+# Inputs at least this long are separated segment by segment with bounded
+# memory; set to 0 to always stream, or a negative value to never stream
+STREAMING_THRESHOLD_SECONDS = float(os.getenv("STREAMING_THRESHOLD_SECONDS", "300"))
+STREAMING_SEGMENT_SECONDS = float(os.getenv("STREAMING_SEGMENT_SECONDS", "30"))
+STREAMING_OVERLAP_SECONDS = float(os.getenv("STREAMING_OVERLAP_SECONDS", "1"))
+
+# Segments from concurrent tasks are separated together in batches of up to
+# this many (1 disables batching); a batch waits at most the given time for
+# more segments. Batching routes every readable input through segmenting.
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "1"))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "50"))
+
+# Fallback drum stem: "onset" gates the mix around detected onsets,
+# "hpss" keeps the percussive half of a harmonic/percussive split
+DRUM_EXTRACTION_MODE = os.getenv("DRUM_EXTRACTION_MODE", "onset")
+
+# Demucs checkpoints are read from MODEL_PATH when it exists (otherwise they
+# are downloaded to the torch hub cache). Models load on first use and the
+# least recently used one is unloaded once the budget would be exceeded.
+MODEL_PATH = os.getenv("MODEL_PATH", "models/")
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "htdemucs")
+MODEL_MEMORY_BUDGET_BYTES = parse_size(os.getenv("MODEL_MEMORY_BUDGET_BYTES", "2GB"))
+
+# Heavy imports happen in the background after the server is up; the
+# readiness probe turns green once they (and optionally the default model)
+# are loaded
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_LOAD_MODEL = os.getenv("WARMUP_LOAD_MODEL", "true").lower() == "true"
+
+# Uploads over this size are rejected with 413, before or while they are read
+MAX_FILE_SIZE = parse_size(os.getenv("MAX_FILE_SIZE", "1GB"))
+
+# "sqlite" keeps every task across restarts (queued and interrupted ones
+# are picked up again), "memory" forgets them when the process exits
+TASK_STORE = os.getenv("TASK_STORE", "sqlite")
+TASK_DB_PATH = os.getenv(
+    "TASK_DB_PATH", os.path.join(tempfile.gettempdir(), "stem-separator", "tasks.db")
+)
+
+# API_ONLY=true leaves separation to `python -m app.worker`, which runs
+# WORKER_PROCESSES separator processes against the TASK_DB_PATH queue. A
+# worker that stops refreshing its lease for WORKER_LEASE_SECONDS is
+# presumed dead and its task is queued again, at most WORKER_MAX_ATTEMPTS
+# times in total. Without API_ONLY, every server process runs jobs and
+# leases them the same way, so only a dead process's tasks are taken over.
+API_ONLY = os.getenv("API_ONLY", "false").lower() == "true"
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(max(1, (os.cpu_count() or 2) // 2))))
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "0.5"))
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "60"))
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+
+# Stem format when an upload doesn't ask for one: wav16, wav24, flac, ogg
+# (Vorbis) or opus. Stems are encoded in parallel, one thread per stem
+# unless ENCODER_THREADS caps it.
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "wav16")
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+
+# Threads torch uses per process; 0 splits the cores between the
+# MAX_CONCURRENT_TASKS jobs that run at once so they don't oversubscribe.
+# TORCH_INTEROP_THREADS 0 keeps torch's default.
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+
+# How Demucs runs unless an upload picks otherwise: "fp32", "bf16"
+# (bfloat16 autocast) or "int8" (dynamically quantized, CPU only)
+INFERENCE_PROFILE = os.getenv("INFERENCE_PROFILE", "fp32")
+
+# Decoders tried in order for every input: "soundfile" (libsndfile, incl.
+# MP3), "ffmpeg" (when installed; M4A, AAC, ...) and "librosa" (audioread).
+# Decoded PCM is kept memory-mapped in PCM_CACHE_DIR under the upload's
+# content hash, least recently used first out once PCM_CACHE_MAX_BYTES is hit.
+AUDIO_DECODERS = [
+    name.strip() for name in os.getenv("AUDIO_DECODERS", "soundfile,ffmpeg,librosa").split(",") if name.strip()
+]
+PCM_CACHE_ENABLED = os.getenv("PCM_CACHE_ENABLED", "true").lower() == "true"
+PCM_CACHE_DIR = os.getenv(
+    "PCM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "stem-separator-pcm")
+)
+PCM_CACHE_MAX_BYTES = parse_size(os.getenv("PCM_CACHE_MAX_BYTES", "4GB"))
+
+# Every task gets a directory under STORAGE_DIR for its upload, stems and
+# profile. Finished jobs are removed JOB_TTL_SECONDS after they finish (0
+# keeps them until /cleanup); once the disk is more than
+# STORAGE_HIGH_WATERMARK full, the oldest finished jobs are removed until it
+# is back under STORAGE_LOW_WATERMARK. Checked every STORAGE_SWEEP_SECONDS.
+STORAGE_DIR = os.getenv("STORAGE_DIR", os.path.join(tempfile.gettempdir(), "stem-separator", "jobs"))
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", str(24 * 60 * 60)))
+STORAGE_HIGH_WATERMARK = float(os.getenv("STORAGE_HIGH_WATERMARK", "0.9"))
+STORAGE_LOW_WATERMARK = float(os.getenv("STORAGE_LOW_WATERMARK", "0.8"))
+STORAGE_SWEEP_SECONDS = float(os.getenv("STORAGE_SWEEP_SECONDS", "60"))
+
+# /batch takes up to BATCH_MAX_FILES tracks per request, as files or in one
+# ZIP archive, and no more than MAX_BATCH_SIZE of them altogether
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+MAX_BATCH_SIZE = parse_size(os.getenv("MAX_BATCH_SIZE", "10GB"))
+
+# Uploads with preview=true also get a preview task that jumps the queue and
+# separates the PREVIEW_SECONDS with the most energy in the track, using the
+# PREVIEW_PROFILE inference profile
+PREVIEW_SECONDS = float(os.getenv("PREVIEW_SECONDS", "30"))
+PREVIEW_PROFILE = os.getenv("PREVIEW_PROFILE", "bf16")
+
+# Uploads may ask for their task to be profiled (cProfile, plus the torch
+# profiler on the Demucs path) unless PROFILING_ALLOWED is off;
+# PROFILE_EVERY_TASK profiles all of them, which slows every job down
+PROFILING_ALLOWED = os.getenv("PROFILING_ALLOWED", "true").lower() == "true"
+PROFILE_EVERY_TASK = os.getenv("PROFILE_EVERY_TASK", "false").lower() == "true"
@@ -0,0 +1,140 @@
+import asyncio
+import functools
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+class JobCancelled(Exception):
+    # Raised by a progress callback to stop the job reporting to it. Jobs in
+    # threads stop right there; a job in another process runs to the end and
+    # its result is dropped.
+    pass
+
+class SeparationExecutor:
+    # func is called as func(*args, progress=callback); callback takes a
+    # percentage and is always invoked from a worker thread, never the loop
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+
+    async def run(self, func: Callable, *args, progress: Optional[Callable[[int], None]] = None):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+class ThreadSeparationExecutor(SeparationExecutor):
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="separator")
+
+    async def run(self, func, *args, progress=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.pool, functools.partial(func, *args, progress=progress)
+        )
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class ProgressReporter:
+    # Picklable stand-in for the progress callback inside a worker process
+
+    def __init__(self, queue, job_id: int):
+        self.queue = queue
+        self.job_id = job_id
+
+    def __call__(self, value: int):
+        self.queue.put((self.job_id, value))
+
+class ProcessSeparationExecutor(SeparationExecutor):
+    # func and its arguments must be picklable: pass module-level functions,
+    # not bound methods that drag a loaded model along
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers)
+        self.pool = None
+        self._manager = None
+        self._progress_queue = None
+        self._pump = None
+        self._callbacks: Dict[int, Callable[[int], None]] = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self.pool is not None:
+                return
+            # torch does not survive fork() well, always start clean interpreters
+            ctx = multiprocessing.get_context("spawn")
+            self._manager = ctx.Manager()
+            self._progress_queue = self._manager.Queue()
+            self.pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+            self._pump = threading.Thread(
+                target=self._pump_progress, name="separator-progress", daemon=True
+            )
+            self._pump.start()
+
+    def _pump_progress(self):
+        while True:
+            try:
+                item = self._progress_queue.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            job_id, value = item
+            if value is None:
+                self._callbacks.pop(job_id, None)
+                continue
+            callback = self._callbacks.get(job_id)
+            if callback is not None:
+                try:
+                    callback(value)
+                except JobCancelled:
+                    self._callbacks.pop(job_id, None)
+                except Exception as e:
+                    print(f"Error in progress callback: {e}")
+
+    async def run(self, func, *args, progress=None):
+        self._ensure_started()
+        reporter = None
+        job_id = next(self._job_ids)
+        if progress is not None:
+            self._callbacks[job_id] = progress
+            reporter = ProgressReporter(self._progress_queue, job_id)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.pool, functools.partial(func, *args, progress=reporter)
+            )
+        finally:
+            if reporter is not None:
+                # Queued behind the worker's own updates, so none of them get dropped
+                self._progress_queue.put((job_id, None))
+
+    def shutdown(self):
+        with self._lock:
+            if self.pool is None:
+                return
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self._progress_queue.put(None)
+            self._manager.shutdown()
+            self.pool = None
+
+EXECUTOR_BACKENDS = {
+    "thread": ThreadSeparationExecutor,
+    "process": ProcessSeparationExecutor,
+}
+
+def create_executor(backend: str, max_workers: int) -> SeparationExecutor:
+    try:
+        executor_class = EXECUTOR_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown executor backend '{backend}', expected one of: {', '.join(EXECUTOR_BACKENDS)}"
+        )
+    return executor_class(max_workers)
@@ -0,0 +1,199 @@
+import os
+import time
+import bisect
+import resource
+import threading
+import contextlib
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# A few counters and histograms rendered in the Prometheus text format, so
+# /metrics needs no client library. Recording is a lock and a list update.
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labels, key)), value
+
+class Gauge(Metric):
+    # Read when scraped: collect returns a value, or one per label tuple
+    kind = "gauge"
+
+    def __init__(self, name, help, collect: Callable[[], object], labels=()):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def samples(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            key = key if isinstance(key, tuple) else (key,)
+            if value is not None:
+                yield self.name, dict(zip(self.labels, key)), value
+
+class CollectedCounter(Gauge):
+    # A count kept elsewhere (the caches' own hit counters), read when scraped
+    kind = "counter"
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label tuple: count per bucket (the last one is +Inf), sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        for key, counts, total in series:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Registering a name again replaces the old metric (module reloads, tests)
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "stem_separator_queue_wait_seconds", "Time tasks spent queued before a worker started them"
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "stem_separator_stage_seconds", "Time spent per task in each separation stage", labels=("stage",)
+))
+REAL_TIME_FACTOR = REGISTRY.register(Histogram(
+    "stem_separator_real_time_factor", "Processing time divided by audio duration per completed task",
+    buckets=RATIO_BUCKETS
+))
+TASKS_FINISHED = REGISTRY.register(Counter(
+    "stem_separator_tasks_finished_total", "Tasks that finished (completed, failed or cancelled)", labels=("status",)
+))
+STORAGE_RECLAIMED_BYTES = REGISTRY.register(Counter(
+    "stem_separator_storage_reclaimed_bytes_total", "Bytes freed by removing job directories", labels=("reason",)
+))
+STORAGE_JOBS_REMOVED = REGISTRY.register(Counter(
+    "stem_separator_storage_jobs_removed_total", "Job directories removed", labels=("reason",)
+))
+
+@contextlib.contextmanager
+def stage_timer(timings: Optional[Dict[str, float]], stage: str):
+    # Adds the time spent in the block to timings[stage]; a stage entered
+    # more than once (one per segment when streaming) accumulates
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def observe_task(task):
+    # Called once per task when it finishes, in the process that serves
+    # /metrics, whichever process or worker ran it
+    TASKS_FINISHED.inc(status=task.status)
+    if task.cache_hit or task.started_at is None:
+        return
+    QUEUE_WAIT_SECONDS.observe(max((task.started_at - task.created_at).total_seconds(), 0.0))
+    for stage, seconds in (task.timings or {}).items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    if task.status == "completed" and task.completed_at and task.duration:
+        elapsed = (task.completed_at - task.started_at).total_seconds()
+        REAL_TIME_FACTOR.observe(elapsed / task.duration)
+
+def resident_memory_bytes() -> int:
+    # Current RSS from /proc where there is one, peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
@@ -1,59 +1,367 @@
+import os
+import time
+import uuid
+import socket
 import asyncio
+import functools
 from collections import deque
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional, Set
+from app.core import config, metrics
+from app.core.executor import JobCancelled, SeparationExecutor, create_executor
+from app.core.task_store import MemoryTaskStore, TaskStore, create_task_store
 from app.models.task import SeparationTask
 
 class TaskManager:
-    def __init__(self, max_concurrent_tasks: int = 2):
+    def __init__(self, max_concurrent_tasks: int = config.MAX_CONCURRENT_TASKS,
+                 executor: Optional[SeparationExecutor] = None,
+                 store: Optional[TaskStore] = None, run_jobs: bool = True,
+                 lease_seconds: float = config.WORKER_LEASE_SECONDS):
         self.max_concurrent_tasks = max_concurrent_tasks
+        # With run_jobs off this process only enqueues and reports; worker
+        # processes (app/worker.py) claim the jobs from the shared store
+        self.run_jobs = run_jobs
+        # Jobs are handed to the executor so the event loop never blocks on them
+        self.executor = executor or create_executor(config.EXECUTOR_BACKEND, max_concurrent_tasks)
+        self.store = store or create_task_store(config.TASK_STORE, config.TASK_DB_PATH)
+        if not run_jobs and isinstance(self.store, MemoryTaskStore):
+            raise ValueError("Worker processes need the sqlite task store to share the queue")
         self.task_queue = deque()
         self.active_tasks: Dict[str, asyncio.Task] = {}
+        # Queued and running tasks only; finished ones are read from the store
         self.tasks: Dict[str, SeparationTask] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # API-only mode: tasks this process queued that a worker has yet to
+        # finish, watched so their timings still reach /metrics
+        self._awaiting_workers: Set[str] = set()
+        # Running tasks that were cancelled and stop at their next progress report
+        self._cancelled: Set[str] = set()
+        # Every server process (uvicorn --workers) runs its own manager on
+        # the shared store; each holds a lease on the tasks it runs or has
+        # queued, and only takes over those whose owner stopped renewing
+        self.owner_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        if run_jobs:
+            self.recover()
+
+    def recover(self):
+        # Tasks that were queued or running when their process stopped go
+        # back into the queue in their original order and start from scratch
+        recovered = 0
+        for task in self.store.adopt(self.owner_id, self.lease_seconds):
+            if task.task_id in self.tasks:
+                continue
+            if not task.input_path or not os.path.exists(task.input_path):
+                task.status = "failed"
+                task.error = "Input file was lost while the server restarted"
+                task.queue_position = None
+                self.store.save(task)
+                self.store.release(task.task_id, self.owner_id)
+                continue
+            task.status = "queued"
+            task.progress = 0
+            task.started_at = None
+            self.tasks[task.task_id] = task
+            self._enqueue(task)
+            self.store.save(task)
+            recovered += 1
+        if recovered:
+            print(f"Recovered {recovered} unfinished tasks")
+            self._update_queue_positions()
+            self._notify()
 
     async def process_queue(self, process_task_func):
+        # Created here so it binds to the loop that actually runs the scheduler
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        renew_at = time.monotonic() + self.lease_seconds / 3
         while True:
-            if len(self.active_tasks) < self.max_concurrent_tasks and self.task_queue:
-                task_id = self.task_queue.popleft()
-                task = self.tasks[task_id]
-                task.status = "processing"
-                task.started_at = datetime.now()
-                task.queue_position = None
-                
-                # Create background task for processing
-                self.active_tasks[task_id] = asyncio.create_task(
-                    process_task_func(task_id)
-                )
-                
-                # Add callback to remove from active tasks when done
-                self.active_tasks[task_id].add_done_callback(
-                    lambda t: self.active_tasks.pop(task_id, None)
-                )
+            while len(self.active_tasks) < self.max_concurrent_tasks:
+                task_id = self._next_task()
+                if task_id is None:
+                    break
+                self._dispatch(task_id, process_task_func)
             
-            await asyncio.sleep(1)  # Check queue every second
+            # Sleep until a job is enqueued, a worker frees its slot or the
+            # leases are due
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, renew_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if time.monotonic() >= renew_at:
+                self.store.renew(self.owner_id)
+                # Takes over the tasks of a server process that died meanwhile
+                self.recover()
+                renew_at = time.monotonic() + self.lease_seconds / 3
+
+    async def watch_store(self, interval: float):
+        # Stand-in for process_queue when jobs run in worker processes: their
+        # progress only reaches us through the store, so the tasks somebody
+        # is subscribed to are re-read and published whenever they change
+        self._loop = asyncio.get_running_loop()
+        last_events: Dict[str, dict] = {}
+        while True:
+            for task_id in list(self._subscribers):
+                event = self.task_event(task_id)
+                if event != last_events.get(task_id):
+                    last_events[task_id] = event
+                    self._publish(task_id)
+            for task_id in list(last_events):
+                if task_id not in self._subscribers:
+                    del last_events[task_id]
+            if self._awaiting_workers:
+                for task in self.store.finished(list(self._awaiting_workers)):
+                    self._awaiting_workers.discard(task.task_id)
+                    metrics.observe_task(task)
+            await asyncio.sleep(interval)
+
+    def _next_task(self) -> Optional[str]:
+        # A task with a preview waits until the preview is done: the preview
+        # gets the CPU to itself, and the full job can still be cancelled
+        # before it has cost anything
+        for task_id in self.task_queue:
+            if self.tasks[task_id].preview_task_id not in self.tasks:
+                return task_id
+        return None
+
+    def _dispatch(self, task_id: str, process_task_func):
+        self.task_queue.remove(task_id)
+        task = self.tasks[task_id]
+        task.status = "processing"
+        task.started_at = datetime.now()
+        task.queue_position = None
+        self.store.save(task)
+        self._update_queue_positions()
+        self._publish(task_id)
+        
+        self.active_tasks[task_id] = asyncio.create_task(process_task_func(task_id))
+        self.active_tasks[task_id].add_done_callback(
+            functools.partial(self._on_task_done, task_id)
+        )
+
+    def _on_task_done(self, task_id: str, future: asyncio.Task):
+        self.active_tasks.pop(task_id, None)
+        self._cancelled.discard(task_id)
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Task {task_id} failed: {future.exception()}")
+        self._notify()
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _update_queue_positions(self):
+        for position, task_id in enumerate(self.task_queue, start=1):
+            task = self.tasks[task_id]
+            if task.queue_position != position:
+                task.queue_position = position
+                self._publish(task_id)
+
+    def update_progress(self, task_id: str, progress: int):
+        # Called from executor threads, hence the hop back onto the loop
+        if task_id in self._cancelled:
+            raise JobCancelled()
+        task = self.tasks.get(task_id)
+        if task is None or task.progress == progress:
+            return
+        task.progress = progress
+        self._publish_threadsafe(task_id)
+
+    def complete_task(self, task_id: str, stems: List[str], timings: Optional[Dict[str, float]] = None):
+        task = self.tasks.get(task_id)
+        # Cancelled or cleaned up while it ran
+        if task is None:
+            return
+        task.progress = 100
+        task.status = "completed"
+        task.stems = stems
+        task.timings = timings
+        task.completed_at = datetime.now()
+        self._finish(task)
+
+    def fail_task(self, task_id: str, error: str):
+        task = self.tasks.get(task_id)
+        if task is None:
+            return
+        task.status = "failed"
+        task.error = error
+        self._finish(task)
+
+    def _finish(self, task: SeparationTask):
+        self.store.save(task)
+        self.store.release(task.task_id, self.owner_id)
+        self._publish(task.task_id)
+        self.tasks.pop(task.task_id, None)
+        metrics.observe_task(task)
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        # Each event is a full snapshot, so a slow client only needs the latest
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(task_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[task_id]
+
+    def task_event(self, task_id: str) -> Optional[dict]:
+        task = self.get_task(task_id)
+        if task is None:
+            return None
+        return {**task.model_dump(mode="json"), "queue_length": self.queue_length()}
 
-    def add_task(self, task_id: str, input_path: str) -> SeparationTask:
+    def queue_length(self) -> int:
+        return len(self.task_queue) if self.run_jobs else self.store.count("queued")
+
+    def _publish(self, task_id: str):
+        subscribers = self._subscribers.get(task_id)
+        if not subscribers:
+            return
+        event = self.task_event(task_id)
+        for queue in subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def _publish_threadsafe(self, task_id: str):
+        if self._loop is None or task_id not in self._subscribers:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._publish(task_id)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, task_id)
+
+    def add_task(self, task_id: str, input_path: str, **fields) -> SeparationTask:
         task = SeparationTask(
             task_id=task_id,
             status="queued",
             progress=0,
-            input_path=input_path
+            input_path=input_path,
+            **fields
         )
         
+        if not self.run_jobs:
+            self.store.save(task)
+            self._awaiting_workers.add(task_id)
+            task.queue_position = self.store.queue_position(task)
+            return task
+        
         self.tasks[task_id] = task
-        self.task_queue.append(task_id)
-        task.queue_position = len(self.task_queue)
+        self._enqueue(task)
+        # Leased before it is saved, so no other process can take it over
+        self.store.hold(task_id, self.owner_id)
+        self.store.save(task)
+        self._notify()
         
         return task
 
-    def get_task(self, task_id: str) -> SeparationTask:
-        return self.tasks.get(task_id)
+    def _enqueue(self, task: SeparationTask):
+        # Behind every task with the same or a higher priority
+        position = len(self.task_queue)
+        while position > 0 and self.tasks[self.task_queue[position - 1]].priority < task.priority:
+            position -= 1
+        self.task_queue.insert(position, task.task_id)
+        if position == len(self.task_queue) - 1:
+            task.queue_position = position + 1
+        else:
+            self._update_queue_positions()
+
+    def cancel_task(self, task_id: str) -> Optional[SeparationTask]:
+        # A queued task never runs; a running one stops at its next progress
+        # report. None when the task is unknown or finished already.
+        if not self.run_jobs:
+            task = self.store.cancel(task_id)
+            if task is not None:
+                self._awaiting_workers.discard(task_id)
+                self._publish(task_id)
+                metrics.observe_task(task)
+            return task
+        
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        if task_id in self.task_queue:
+            self.task_queue.remove(task_id)
+            self._update_queue_positions()
+        if task_id in self.active_tasks:
+            self._cancelled.add(task_id)
+        task.status = "cancelled"
+        task.queue_position = None
+        self._finish(task)
+        return task
+
+    def add_cached_task(self, task_id: str, input_path: str, stems: List[str], **fields) -> SeparationTask:
+        # Results were already on disk, so the task never enters the queue
+        now = datetime.now()
+        task = SeparationTask(
+            task_id=task_id,
+            status="completed",
+            progress=100,
+            input_path=input_path,
+            stems=stems,
+            cache_hit=True,
+            started_at=now,
+            completed_at=now,
+            **fields
+        )
+        self.store.save(task)
+        metrics.observe_task(task)
+        return task
+
+    def get_task(self, task_id: str) -> Optional[SeparationTask]:
+        # Live tasks come from memory, everything else is one primary-key lookup
+        task = self.tasks.get(task_id)
+        if task is None:
+            task = self.store.get(task_id)
+            # Positions of tasks queued by this process are kept up to date in
+            # memory, anything else is counted in the store
+            if task is not None and task.status == "queued":
+                task.queue_position = self.store.queue_position(task)
+        return task
+
+    def get_group(self, group_id: str) -> List[SeparationTask]:
+        # Live tasks of the group with their latest progress
+        tasks = [self.tasks.get(task.task_id, task) for task in self.store.group(group_id)]
+        for task in tasks:
+            if task.status == "queued" and task.task_id not in self.tasks:
+                task.queue_position = self.store.queue_position(task)
+        return tasks
 
     def get_queue_status(self):
+        if not self.run_jobs:
+            unfinished = self.store.unfinished()
+            queued = [task for task in unfinished if task.status == "queued"]
+            active = [task for task in unfinished if task.status == "processing"]
+            return {
+                "queue_length": len(queued),
+                "active_tasks": len(active),
+                "max_concurrent_tasks": None,
+                "queued_audio_seconds": sum(task.duration or 0 for task in queued),
+                "queued_tasks": [
+                    {"task_id": task.task_id, "position": position, "created_at": task.created_at}
+                    for position, task in enumerate(queued, start=1)
+                ],
+                "active_task_ids": [task.task_id for task in active]
+            }
         return {
             "queue_length": len(self.task_queue),
             "active_tasks": len(self.active_tasks),
             "max_concurrent_tasks": self.max_concurrent_tasks,
+            # Seconds of audio still waiting, a rough measure of the backlog
+            "queued_audio_seconds": sum(
+                self.tasks[task_id].duration or 0 for task_id in self.task_queue
+            ),
             "queued_tasks": [
                 {
                     "task_id": task_id,
@@ -65,11 +373,34 @@ class TaskManager:
             "active_task_ids": list(self.active_tasks.keys())
         }
 
-    def list_tasks(self):
-        return {"tasks": list(self.tasks.keys()), "count": len(self.tasks)}
+    def list_tasks(self, status: Optional[str] = None, limit: int = 50, offset: int = 0):
+        tasks, total = self.store.list(status, limit, offset)
+        # Stored copies of live tasks miss their latest progress
+        tasks = [self.tasks.get(task.task_id, task) for task in tasks]
+        return {
+            "tasks": [task.task_id for task in tasks],
+            "items": tasks,
+            "count": total,
+            "limit": limit,
+            "offset": offset
+        }
 
     def cleanup_task(self, task_id: str):
-        if task_id in self.tasks:
-            del self.tasks[task_id]
-            return True
-        return False 
\ No newline at end of file
+        if self.get_task(task_id) is None:
+            return False
+        if task_id in self.task_queue:
+            self.task_queue.remove(task_id)
+            self._update_queue_positions()
+        self.tasks.pop(task_id, None)
+        self._awaiting_workers.discard(task_id)
+        self.store.delete(task_id)
+        self.store.release(task_id, self.owner_id)
+        return True
+
+    def shutdown(self):
+        self.executor.shutdown()
+        # What this process leaves unfinished is picked up on the next start
+        # or by another process right away, not after the leases go stale
+        if self.run_jobs:
+            self.store.release_all(self.owner_id)
+        self.store.close() 
\ No newline at end of file
@@ -0,0 +1,431 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.models.task import SeparationTask
+
+UNFINISHED_STATUSES = ("queued", "processing")
+
+def queue_order(task: SeparationTask):
+    # Higher priority first (previews), then first come, first served
+    return (-task.priority, task.created_at)
+
+class TaskStore:
+    # Durable record of every task. The task manager keeps queued and running
+    # tasks in memory as well and only writes here on state changes, never
+    # on progress updates.
+
+    def save(self, task: SeparationTask):
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[SeparationTask]:
+        raise NotImplementedError
+
+    def delete(self, task_id: str):
+        raise NotImplementedError
+
+    def list(self, status: Optional[str] = None, limit: int = 50,
+             offset: int = 0) -> Tuple[List[SeparationTask], int]:
+        # Newest first, along with the total number of matches
+        raise NotImplementedError
+
+    def unfinished(self) -> List[SeparationTask]:
+        # In queue order: highest priority first, oldest first within a priority
+        raise NotImplementedError
+
+    def count(self, status: str) -> int:
+        raise NotImplementedError
+
+    def finished(self, task_ids: List[str]) -> List[SeparationTask]:
+        # Those of task_ids that are no longer queued or running: completed,
+        # failed or cancelled. The storage sweep and watch_store count on all three.
+        raise NotImplementedError
+
+    def group(self, group_id: str) -> List[SeparationTask]:
+        # Every task of the group, in the order they were submitted
+        raise NotImplementedError
+
+    def queue_position(self, task: SeparationTask) -> int:
+        # 1 for the task that runs next
+        raise NotImplementedError
+
+    # Server processes that run jobs themselves hold a lease on each task
+    # they queued or took over. A store only one process uses has nobody
+    # to share with, so these default to taking everything.
+
+    def adopt(self, owner_id: str, stale_after: float) -> List[SeparationTask]:
+        # Unfinished tasks no live process holds, now held by owner_id
+        return self.unfinished()
+
+    def hold(self, task_id: str, owner_id: str):
+        pass
+
+    def renew(self, owner_id: str):
+        pass
+
+    def release(self, task_id: str, worker_id: str):
+        pass
+
+    def release_all(self, owner_id: str):
+        pass
+
+    def close(self):
+        pass
+
+class MemoryTaskStore(TaskStore):
+    def __init__(self):
+        self.tasks: Dict[str, SeparationTask] = {}
+
+    def save(self, task: SeparationTask):
+        self.tasks[task.task_id] = task
+
+    def get(self, task_id: str) -> Optional[SeparationTask]:
+        return self.tasks.get(task_id)
+
+    def delete(self, task_id: str):
+        self.tasks.pop(task_id, None)
+
+    def list(self, status=None, limit=50, offset=0):
+        matches = [task for task in self.tasks.values() if status is None or task.status == status]
+        matches.sort(key=lambda task: task.created_at, reverse=True)
+        return matches[offset:offset + limit], len(matches)
+
+    def unfinished(self):
+        matches = [task for task in self.tasks.values() if task.status in UNFINISHED_STATUSES]
+        return sorted(matches, key=queue_order)
+
+    def count(self, status):
+        return sum(1 for task in self.tasks.values() if task.status == status)
+
+    def finished(self, task_ids):
+        tasks = (self.tasks.get(task_id) for task_id in task_ids)
+        return [task for task in tasks if task is not None and task.status not in UNFINISHED_STATUSES]
+
+    def group(self, group_id):
+        matches = [task for task in self.tasks.values() if task.group_id == group_id]
+        return sorted(matches, key=lambda task: task.created_at)
+
+    def queue_position(self, task):
+        return 1 + sum(
+            1 for other in self.tasks.values()
+            if other.status == "queued" and queue_order(other) < queue_order(task)
+        )
+
+class SqliteTaskStore(TaskStore):
+    # One row per task: the indexed columns are what lookups filter and sort
+    # on, the full task is kept as JSON so new fields need no migration
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS tasks_status_created ON tasks (status, created_at);
+        CREATE INDEX IF NOT EXISTS tasks_created ON tasks (created_at);
+        CREATE TABLE IF NOT EXISTS leases (
+            task_id TEXT PRIMARY KEY,
+            worker_id TEXT,
+            heartbeat_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS leases_worker ON leases (worker_id);
+    """
+    # Columns added later, and what adds them to a database from before
+    MIGRATIONS = {
+        "priority": "ALTER TABLE tasks ADD COLUMN priority INTEGER NOT NULL DEFAULT 0",
+        "group_id": "ALTER TABLE tasks ADD COLUMN group_id TEXT",
+        "preview_task_id": "ALTER TABLE tasks ADD COLUMN preview_task_id TEXT",
+    }
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS tasks_queue ON tasks (status, priority DESC, created_at);
+        CREATE INDEX IF NOT EXISTS tasks_group ON tasks (group_id, created_at);
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # The API and every worker process open the same file; writers wait
+        # for each other instead of failing with "database is locked"
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        # WAL lets readers carry on while a write is in progress; NORMAL
+        # sync is still safe against corruption with WAL
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(tasks)")}
+        for column, migration in self.MIGRATIONS.items():
+            if column not in columns:
+                self._db.execute(migration)
+        self._db.executescript(self.INDEXES)
+
+    def save(self, task: SeparationTask):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, status, created_at, priority, group_id, preview_task_id, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (task.task_id, task.status, task.created_at.isoformat(), task.priority, task.group_id,
+                 task.preview_task_id, task.model_dump_json())
+            )
+
+    def get(self, task_id: str) -> Optional[SeparationTask]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return SeparationTask.model_validate_json(row[0]) if row else None
+
+    def delete(self, task_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def list(self, status=None, limit=50, offset=0):
+        where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM tasks {where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT data FROM tasks {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                params + (limit, offset)
+            ).fetchall()
+        return [SeparationTask.model_validate_json(row[0]) for row in rows], total
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM tasks WHERE status IN (?, ?) ORDER BY priority DESC, created_at",
+                UNFINISHED_STATUSES
+            ).fetchall()
+        return [SeparationTask.model_validate_json(row[0]) for row in rows]
+
+    def count(self, status):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tasks WHERE status = ?", (status,)).fetchone()[0]
+
+    def finished(self, task_ids):
+        rows = []
+        # SQLite caps the number of bound parameters per statement
+        for start in range(0, len(task_ids), 500):
+            batch = task_ids[start:start + 500]
+            with self._lock:
+                rows += self._db.execute(
+                    f"SELECT data FROM tasks WHERE task_id IN ({','.join('?' * len(batch))}) "
+                    "AND status NOT IN (?, ?)",
+                    tuple(batch) + UNFINISHED_STATUSES
+                ).fetchall()
+        return [SeparationTask.model_validate_json(row[0]) for row in rows]
+
+    def group(self, group_id):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM tasks WHERE group_id = ? ORDER BY created_at", (group_id,)
+            ).fetchall()
+        return [SeparationTask.model_validate_json(row[0]) for row in rows]
+
+    def queue_position(self, task):
+        with self._lock:
+            ahead = self._db.execute(
+                "SELECT COUNT(*) FROM tasks WHERE status = 'queued' "
+                "AND (priority > ? OR (priority = ? AND created_at < ?))",
+                (task.priority, task.priority, task.created_at.isoformat())
+            ).fetchone()[0]
+        return ahead + 1
+
+    # Worker processes (app/worker.py) share the queue through the methods
+    # below. A claimed task carries a lease that the worker keeps fresh; a
+    # lease whose worker died or went quiet puts the task back in the queue.
+    # Server processes that run jobs lease their tasks the same way, so a
+    # restart of one of them never takes over what another is running.
+
+    def adopt(self, owner_id, stale_after):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                rows = self._db.execute(
+                    "SELECT data FROM tasks WHERE status IN (?, ?) AND NOT EXISTS ("
+                    "SELECT 1 FROM leases WHERE leases.task_id = tasks.task_id "
+                    "AND worker_id IS NOT NULL AND heartbeat_at >= ?) ORDER BY priority DESC, created_at",
+                    UNFINISHED_STATUSES + (now - stale_after,)
+                ).fetchall()
+                tasks = [SeparationTask.model_validate_json(row[0]) for row in rows]
+                for task in tasks:
+                    self._hold(task.task_id, owner_id, now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return tasks
+
+    def hold(self, task_id, owner_id):
+        with self._lock:
+            self._hold(task_id, owner_id, time.time())
+
+    def _hold(self, task_id: str, owner_id: str, now: float):
+        self._db.execute(
+            "INSERT INTO leases (task_id, worker_id, heartbeat_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (task_id) DO UPDATE SET worker_id = excluded.worker_id, "
+            "heartbeat_at = excluded.heartbeat_at",
+            (task_id, owner_id, now)
+        )
+
+    def renew(self, owner_id):
+        with self._lock:
+            self._db.execute("UPDATE leases SET heartbeat_at = ? WHERE worker_id = ?", (time.time(), owner_id))
+
+    def release_all(self, owner_id):
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE worker_id = ?", (owner_id,))
+
+    def update(self, task: SeparationTask, worker_id: Optional[str] = None) -> bool:
+        # Unlike save, never brings back a task that was cleaned up meanwhile,
+        # and with worker_id only while that worker still holds the lease
+        query = "UPDATE tasks SET status = ?, data = ? WHERE task_id = ?"
+        params = (task.status, task.model_dump_json(), task.task_id)
+        if worker_id is not None:
+            # A task cancelled while running is no longer the worker's to update
+            query += " AND status = 'processing' AND EXISTS (SELECT 1 FROM leases WHERE task_id = ? AND worker_id = ?)"
+            params += (task.task_id, worker_id)
+        with self._lock:
+            cursor = self._db.execute(query, params)
+        return cursor.rowcount > 0
+
+    def claim_next(self, worker_id: str) -> Optional[SeparationTask]:
+        with self._lock:
+            # Idle workers poll with a plain read and only take the write lock
+            # when there is something to claim
+            if self._db.execute("SELECT 1 FROM tasks WHERE status = 'queued' LIMIT 1").fetchone() is None:
+                return None
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # A task with an unfinished preview waits for it
+                row = self._db.execute(
+                    "SELECT data FROM tasks WHERE status = 'queued' AND (preview_task_id IS NULL OR NOT EXISTS ("
+                    "SELECT 1 FROM tasks AS preview WHERE preview.task_id = tasks.preview_task_id "
+                    "AND preview.status IN (?, ?))) ORDER BY priority DESC, created_at LIMIT 1",
+                    UNFINISHED_STATUSES
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                task = SeparationTask.model_validate_json(row[0])
+                task.status = "processing"
+                task.progress = 0
+                task.queue_position = None
+                task.started_at = datetime.now()
+                self._db.execute(
+                    "UPDATE tasks SET status = ?, data = ? WHERE task_id = ?",
+                    (task.status, task.model_dump_json(), task.task_id)
+                )
+                self._db.execute(
+                    "INSERT INTO leases (task_id, worker_id, heartbeat_at, attempts) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (task_id) DO UPDATE SET worker_id = excluded.worker_id, "
+                    "heartbeat_at = excluded.heartbeat_at, attempts = attempts + 1",
+                    (task.task_id, worker_id, time.time())
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return task
+
+    def cancel(self, task_id: str) -> Optional[SeparationTask]:
+        # Queued or running; a worker running it finds out at its next
+        # progress update. None when the task had finished already.
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT data FROM tasks WHERE task_id = ? AND status IN (?, ?)", (task_id,) + UNFINISHED_STATUSES
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                task = SeparationTask.model_validate_json(row[0])
+                task.status = "cancelled"
+                task.queue_position = None
+                self._db.execute(
+                    "UPDATE tasks SET status = ?, data = ? WHERE task_id = ?",
+                    (task.status, task.model_dump_json(), task_id)
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return task
+
+    def heartbeat(self, task_id: str, worker_id: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE leases SET heartbeat_at = ? WHERE task_id = ? AND worker_id = ?",
+                (time.time(), task_id, worker_id)
+            )
+
+    def release(self, task_id: str, worker_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE task_id = ? AND worker_id = ?", (task_id, worker_id))
+
+    def requeue_abandoned(self, worker_ids: Optional[List[str]] = None, stale_after: Optional[float] = None,
+                          max_attempts: int = 3) -> List[str]:
+        # Leases held by the given (dead) workers, or not refreshed for
+        # stale_after seconds. A task that keeps killing its worker fails
+        # after max_attempts instead of taking the next one down as well.
+        conditions, params = [], []
+        if worker_ids:
+            conditions.append(f"worker_id IN ({', '.join('?' * len(worker_ids))})")
+            params.extend(worker_ids)
+        if stale_after is not None:
+            conditions.append("heartbeat_at < ?")
+            params.append(time.time() - stale_after)
+        if not conditions:
+            return []
+
+        requeued = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                leases = self._db.execute(
+                    f"SELECT task_id, attempts FROM leases WHERE worker_id IS NOT NULL "
+                    f"AND ({' OR '.join(conditions)})", params
+                ).fetchall()
+                for task_id, attempts in leases:
+                    row = self._db.execute(
+                        "SELECT data FROM tasks WHERE task_id = ? AND status = 'processing'", (task_id,)
+                    ).fetchone()
+                    if row is None:
+                        self._db.execute("DELETE FROM leases WHERE task_id = ?", (task_id,))
+                        continue
+                    task = SeparationTask.model_validate_json(row[0])
+                    task.progress = 0
+                    task.started_at = None
+                    if attempts >= max_attempts:
+                        task.status = "failed"
+                        task.error = f"Worker crashed {attempts} times while separating this file"
+                        self._db.execute("DELETE FROM leases WHERE task_id = ?", (task_id,))
+                    else:
+                        task.status = "queued"
+                        self._db.execute("UPDATE leases SET worker_id = NULL WHERE task_id = ?", (task_id,))
+                        requeued.append(task_id)
+                    self._db.execute(
+                        "UPDATE tasks SET status = ?, data = ? WHERE task_id = ?",
+                        (task.status, task.model_dump_json(), task_id)
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return requeued
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def create_task_store(backend: str, path: str) -> TaskStore:
+    if backend == "sqlite":
+        return SqliteTaskStore(path)
+    if backend == "memory":
+        return MemoryTaskStore()
+    raise ValueError(f"Unknown task store backend: {backend}")
@@ -0,0 +1,46 @@
+import time
+from datetime import datetime
+from typing import Callable, Optional
+from app.core.executor import SeparationExecutor
+
+class Warmup:
+    # pending -> warming -> ready | failed, or skipped when warm-up is off
+    # (the first job then pays for the imports and the model load)
+
+    def __init__(self):
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.device: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.duration: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "skipped")
+
+    async def run(self, executor: SeparationExecutor, func: Callable):
+        self.state = "warming"
+        self.started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            self.device = await executor.run(func)
+            self.state = "ready"
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+            self.error = str(e)
+            self.state = "failed"
+        finally:
+            self.duration = time.perf_counter() - start
+
+    def skip(self):
+        self.state = "skipped"
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "error": self.error,
+            "device": self.device,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "duration_seconds": self.duration,
+        }
@@ -1,7 +1,10 @@
 import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router, task_manager, process_task
+from app.core import config
+from app.api.middleware import UploadSizeLimit
+from app.api.routes import router, task_manager, warmup, process_task, sweep_storage
+from app.services.audio_separator import warm_up
 
 app = FastAPI(
     title="Audio Stem Separator API",
@@ -9,6 +12,11 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Middleware added last runs first: CORS goes outside the size limits so a
+# browser can read their 413s
+app.add_middleware(UploadSizeLimit, path="/upload", max_bytes=config.MAX_FILE_SIZE)
+app.add_middleware(UploadSizeLimit, path="/batch", max_bytes=config.MAX_BATCH_SIZE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,7 +29,24 @@ app.include_router(router)
 
 @app.on_event("startup")
 async def startup_event():
+    if config.STORAGE_SWEEP_SECONDS > 0:
+        asyncio.create_task(sweep_storage(config.STORAGE_SWEEP_SECONDS))
+    
+    if config.API_ONLY:
+        # Separation happens in app.worker processes, nothing to warm up here
+        asyncio.create_task(task_manager.watch_store(config.WORKER_POLL_SECONDS))
+        warmup.skip()
+        return
+    
     asyncio.create_task(task_manager.process_queue(process_task))
+    if config.WARMUP_ENABLED:
+        asyncio.create_task(warmup.run(task_manager.executor, warm_up))
+    else:
+        warmup.skip()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    task_manager.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
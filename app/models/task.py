@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
 
 class SeparationTask(BaseModel):
     task_id: str
@@ -9,7 +9,36 @@ class SeparationTask(BaseModel):
     stems: Optional[List[str]] = None
     error: Optional[str] = None
     queue_position: Optional[int] = None
-    created_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=datetime.now)
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
-    input_path: Optional[str] = None 
\ No newline at end of file
+    input_path: Optional[str] = None
+    # Holds the upload, the stems and any profile; removing it frees everything
+    job_dir: Optional[str] = None
+    model: Optional[str] = None
+    output_format: Optional[str] = None
+    # Stems the client asked for, None for every source of the model
+    requested_stems: Optional[List[str]] = None
+    inference_profile: Optional[str] = None
+    # Read from the file header at upload time
+    duration: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    content_hash: Optional[str] = None
+    cache_key: Optional[str] = None
+    cache_hit: bool = False
+    # Seconds spent in each separation stage (decode, inference, encode, ...)
+    timings: Optional[Dict[str, float]] = None
+    capture_profile: bool = False
+    # Previews separate excerpt_seconds of the upload of the task in
+    # preview_of, starting at excerpt_start (picked when the preview runs),
+    # and go ahead of every task with a lower priority
+    priority: int = 0
+    preview_of: Optional[str] = None
+    preview_task_id: Optional[str] = None
+    excerpt_start: Optional[float] = None
+    excerpt_seconds: Optional[float] = None
+    # Tasks submitted together through /batch share a group
+    group_id: Optional[str] = None
+    # cProfile and torch profiler output, when the task was profiled
+    profile_files: Optional[List[str]] = None 
\ No newline at end of file
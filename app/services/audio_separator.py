@@ -1,140 +1,308 @@
 import os
-import torch
+import functools
+import threading
+import importlib.util
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 import numpy as np
-import librosa
-import soundfile as sf
-from scipy import signal
+from app.core import config
+from app.core.metrics import stage_timer
+from app.services.batching import InferenceBatcher
+from app.services.chunked import separate_in_chunks
+from app.services.decoding import PcmReader, open_audio
+from app.services.encoding import encode_stems
+from app.services.inference import (
+    configure_threads, default_torch_threads, inference_context, model_key, prepare_model, split_model_key
+)
+from app.services.model_registry import ModelRegistry
+from app.services.pcm_cache import PcmCache
+from app.services.profiling import capture
+from app.services.stems import (
+    FALLBACK_SOURCES, MODEL_SOURCES, DERIVED_STEMS, resolve_stems, select_stems, sources_needed
+)
 
-try:
-    from demucs.pretrained import get_model
-    from demucs.apply import apply_model
-    DEMUCS_AVAILABLE = True
-except ImportError:
-    DEMUCS_AVAILABLE = False
+# torch, librosa, scipy and demucs take seconds to import, so they are only
+# imported by the code that uses them (or by warm_up) and never at startup
+DEMUCS_AVAILABLE = importlib.util.find_spec("demucs") is not None
 
 class AudioSeparator:
     def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = None
-        self.model_name = "htdemucs"
-        
-        if DEMUCS_AVAILABLE:
-            self.load_model()
-    
-    def load_model(self):
-        try:
-            print(f"Loading model: {self.model_name}")
-            self.model = get_model(self.model_name)
-            self.model.to(self.device)
-            print(f"Model loaded on {self.device}")
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            self.model = None
-    
-    async def separate_audio(self, audio_path: str, output_dir: str, task_id: str, tasks: dict):
-        try:
-            if not DEMUCS_AVAILABLE or self.model is None:
-                return await self.simple_separation(audio_path, output_dir, task_id, tasks)
-            
-            tasks[task_id].progress = 20
-            
-            audio, sr = librosa.load(audio_path, sr=None, mono=False)
-            
-            if audio.ndim == 1:
-                audio = np.stack([audio, audio])
-            
-            audio_tensor = torch.from_numpy(audio).float().to(self.device)
-            if audio_tensor.dim() == 2:
-                audio_tensor = audio_tensor.unsqueeze(0)
-            
-            tasks[task_id].progress = 50
-            
-            with torch.no_grad():
-                separated = apply_model(self.model, audio_tensor, device=self.device)
-            
-            tasks[task_id].progress = 80
-            
-            stem_files = []
-            stem_names = self.model.sources
-            
-            for i, stem_name in enumerate(stem_names):
-                stem_audio = separated[0, i].cpu().numpy()
-                stem_file = os.path.join(output_dir, f"{stem_name}.wav")
-                sf.write(stem_file, stem_audio.T, sr)
-                stem_files.append(stem_file)
-            
-            tasks[task_id].progress = 100
-            tasks[task_id].status = "completed"
-            tasks[task_id].stems = stem_files
-            
-            return stem_files
-            
-        except Exception as e:
-            tasks[task_id].status = "failed"
-            tasks[task_id].error = str(e)
-            raise e
-    
-    async def simple_separation(self, audio_path: str, output_dir: str, task_id: str, tasks: dict):
-        try:
-            tasks[task_id].progress = 30
-            
-            audio, sr = librosa.load(audio_path, sr=None, mono=False)
-            
-            if audio.ndim == 1:
-                audio = np.stack([audio, audio])
-            
-            tasks[task_id].progress = 60
-            
-            stems = {}
-            
-            vocals = (audio[0] + audio[1]) / 2
-            stems['vocals'] = vocals
-            
-            instrumental = audio[0] - audio[1]
-            stems['other'] = instrumental
-            
-            drums = self.extract_drums(audio, sr)
-            stems['drums'] = drums
-            
-            bass = self.extract_bass(audio, sr)
-            stems['bass'] = bass
-            
-            tasks[task_id].progress = 90
-            
-            stem_files = []
-            for stem_name, stem_audio in stems.items():
-                stem_file = os.path.join(output_dir, f"{stem_name}.wav")
-                sf.write(stem_file, stem_audio, sr)
-                stem_files.append(stem_file)
-            
-            tasks[task_id].progress = 100
-            tasks[task_id].status = "completed"
-            tasks[task_id].stems = stem_files
-            
-            return stem_files
-            
-        except Exception as e:
-            tasks[task_id].status = "failed"
-            tasks[task_id].error = str(e)
-            raise e
+        self._device = None
+        self.registry = ModelRegistry(self.load_model, config.MODEL_MEMORY_BUDGET_BYTES)
+        # One batcher per model and profile, since a batch goes through a single forward pass
+        self.batchers: Dict[Tuple[str, str], InferenceBatcher] = {}
+        self._batchers_lock = threading.Lock()
+        self.pcm_cache = (
+            PcmCache(config.PCM_CACHE_DIR, config.PCM_CACHE_MAX_BYTES, config.AUDIO_DECODERS)
+            if config.PCM_CACHE_ENABLED else None
+        )
+    
+    @property
+    def device(self) -> str:
+        if self._device is None:
+            import torch
+            configure_threads(
+                config.TORCH_THREADS or default_torch_threads(config.MAX_CONCURRENT_TASKS),
+                config.TORCH_INTEROP_THREADS
+            )
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return self._device
+    
+    def warm_up(self, load_model: bool = True):
+        # Everything the first job would otherwise wait for
+        import librosa  # noqa: F401 - only loaded here so the first job skips the import
+        import scipy.signal  # noqa: F401 - likewise, librosa pulls it in lazily
+        print(f"Separator warming up on {self.device}")
+        if DEMUCS_AVAILABLE and load_model:
+            self.registry.get(model_key(config.DEFAULT_MODEL, config.INFERENCE_PROFILE))
+    
+    def stem_sources(self, model_name: Optional[str] = None) -> Tuple[str, ...]:
+        # What a full pass produces, known without loading the model
+        if not DEMUCS_AVAILABLE:
+            return FALLBACK_SOURCES
+        model_name = model_name or config.DEFAULT_MODEL
+        if model_name in MODEL_SOURCES:
+            return MODEL_SOURCES[model_name]
+        return tuple(self.registry.get(model_name).sources)
+    
+    def cache_signature(self, model_name: Optional[str] = None, output_format: Optional[str] = None,
+                        stems: Optional[List[str]] = None, profile: Optional[str] = None) -> dict:
+        # Everything besides the input that changes what the stems sound like
+        signature = {"format": output_format or config.OUTPUT_FORMAT}
+        sources = self.stem_sources(model_name)
+        stem_names = resolve_stems(stems, sources)
+        if stem_names != list(sources):
+            signature["stems"] = stem_names
+        if not DEMUCS_AVAILABLE:
+            return {**signature, "model": "simple", "drums": config.DRUM_EXTRACTION_MODE}
+        profile = profile or config.INFERENCE_PROFILE
+        if profile != "fp32":
+            signature["profile"] = profile
+        return {**signature, "model": model_name or config.DEFAULT_MODEL}
+    
+    def load_model(self, key: str):
+        from demucs.pretrained import get_model
+        model_name, profile = split_model_key(key)
+        print(f"Loading model: {model_name} ({profile})")
+        repo = Path(config.MODEL_PATH) if os.path.isdir(config.MODEL_PATH) else None
+        model = get_model(model_name, repo=repo)
+        model.to(self.device)
+        model.eval()
+        model = prepare_model(model, profile, self.device)
+        print(f"Model {model_name} ({profile}) loaded on {self.device}")
+        return model
+    
+    def open_audio(self, audio_path: str, content_hash: Optional[str] = None):
+        # A file that was decoded before (a retry, another model, a preview)
+        # is read back from the PCM cache instead of being decoded again
+        if self.pcm_cache is not None and content_hash:
+            return self.pcm_cache.open(content_hash, audio_path)
+        return open_audio(audio_path, config.AUDIO_DECODERS)
+    
+    def open_source(self, audio_path: str, content_hash: Optional[str] = None,
+                    excerpt: Optional[Tuple[float, float]] = None):
+        # excerpt is (start, seconds): only that part is read, into memory
+        source = self.open_audio(audio_path, content_hash)
+        if excerpt is None:
+            return source
+        start, seconds = excerpt
+        with source:
+            sr = source.samplerate
+            source.seek(min(int(start * sr), source.frames))
+            audio = source.read(int(seconds * sr), dtype='float32', always_2d=True)
+        return PcmReader(audio, sr)
+    
+    def find_excerpt(self, audio_path: str, seconds: float, content_hash: Optional[str] = None) -> float:
+        with self.open_audio(audio_path, content_hash) as source:
+            return loudest_window(source, seconds)
+    
+    def separate_audio(self, audio_path: str, output_dir: str, progress: Optional[Callable[[int], None]] = None,
+                       model_name: Optional[str] = None, output_format: Optional[str] = None,
+                       stems: Optional[List[str]] = None, profile: Optional[str] = None,
+                       content_hash: Optional[str] = None,
+                       timings: Optional[Dict[str, float]] = None,
+                       excerpt: Optional[Tuple[float, float]] = None) -> List[str]:
+        # stems picks what gets written (all sources when empty); seconds
+        # spent per stage are added to timings when given; excerpt limits
+        # the job to (start, seconds) of the input
+        output_format = output_format or config.OUTPUT_FORMAT
+        if not DEMUCS_AVAILABLE:
+            return self.simple_separation(
+                audio_path, output_dir, progress, output_format, stems, content_hash, timings, excerpt
+            )
+        
+        model_name = model_name or config.DEFAULT_MODEL
+        profile = profile or config.INFERENCE_PROFILE
+        with stage_timer(timings, "model_load"):
+            model = self.registry.get(model_key(model_name, profile))
+        
+        import torch
+        from demucs.apply import apply_model
+        
+        report = progress or (lambda value: None)
+        
+        with stage_timer(timings, "decode"):
+            source = self.open_source(audio_path, content_hash, excerpt)
+        with source:
+            if self.should_stream(source):
+                return self.separate_streaming(
+                    source, output_dir, progress, model_name, output_format, stems, profile, timings
+                )
+            report(20)
+            with stage_timer(timings, "decode"):
+                audio, sr = read_stereo(source)
+        
+        audio_tensor = torch.from_numpy(audio).float().to(self.device)
+        if audio_tensor.dim() == 2:
+            audio_tensor = audio_tensor.unsqueeze(0)
+        
+        report(50)
+        
+        with stage_timer(timings, "inference"), inference_context(profile, self.device):
+            separated = apply_model(model, audio_tensor, device=self.device)
+        
+        report(80)
+        
+        # Demucs computes every source in the same pass anyway; only the
+        # requested ones are encoded
+        stem_names = resolve_stems(stems, model.sources)
+        selected = select_stems(separated[0].float().cpu().numpy(), audio, model.sources, stem_names)
+        with stage_timer(timings, "encode"):
+            stem_files = encode_stems(
+                {stem_name: selected[i].T for i, stem_name in enumerate(stem_names)},
+                sr, output_dir, output_format, config.ENCODER_THREADS or None
+            )
+        
+        report(100)
+        return stem_files
+    
+    def should_stream(self, source) -> bool:
+        if source.frames == 0:
+            return False
+        # Only segmented jobs can share batches with other tasks
+        if config.INFERENCE_BATCH_SIZE > 1:
+            return True
+        if config.STREAMING_THRESHOLD_SECONDS < 0:
+            return False
+        return source.frames / source.samplerate >= config.STREAMING_THRESHOLD_SECONDS
+    
+    def separate_streaming(self, source, output_dir: str, progress: Optional[Callable[[int], None]] = None,
+                           model_name: Optional[str] = None, output_format: Optional[str] = None,
+                           stems: Optional[List[str]] = None, profile: Optional[str] = None,
+                           timings: Optional[Dict[str, float]] = None) -> List[str]:
+        # Peak memory depends on the segment length, not on the input duration
+        model_name = model_name or config.DEFAULT_MODEL
+        profile = profile or config.INFERENCE_PROFILE
+        with stage_timer(timings, "model_load"):
+            sources = list(self.registry.get(model_key(model_name, profile)).sources)
+        stem_names = resolve_stems(stems, sources)
+        
+        def infer(segment):
+            return select_stems(self.infer_segment(model_name, profile, segment), segment, sources, stem_names)
+        
+        stem_files = separate_in_chunks(
+            source, output_dir, stem_names, infer,
+            config.STREAMING_SEGMENT_SECONDS, config.STREAMING_OVERLAP_SECONDS,
+            progress, output_format or config.OUTPUT_FORMAT, timings
+        )
+        if progress:
+            progress(100)
+        return stem_files
+    
+    def infer_segment(self, model_name: str, profile: str, segment: np.ndarray) -> np.ndarray:
+        batcher = self.get_batcher(model_name, profile)
+        if batcher is not None:
+            return batcher.submit(segment)
+        return self.forward_batch(model_name, profile, segment[np.newaxis])[0]
+    
+    def get_batcher(self, model_name: str, profile: str) -> Optional[InferenceBatcher]:
+        if config.INFERENCE_BATCH_SIZE <= 1:
+            return None
+        with self._batchers_lock:
+            if (model_name, profile) not in self.batchers:
+                self.batchers[(model_name, profile)] = InferenceBatcher(
+                    functools.partial(self.forward_batch, model_name, profile),
+                    config.INFERENCE_BATCH_SIZE, config.INFERENCE_BATCH_WAIT_MS
+                )
+            return self.batchers[(model_name, profile)]
+    
+    def forward_batch(self, model_name: str, profile: str, batch: np.ndarray) -> np.ndarray:
+        import torch
+        from demucs.apply import apply_model
+        model = self.registry.get(model_key(model_name, profile))
+        audio_tensor = torch.from_numpy(batch).float().to(self.device)
+        with inference_context(profile, self.device):
+            separated = apply_model(model, audio_tensor, device=self.device)
+        return separated.float().cpu().numpy()
+    
+    def simple_separation(self, audio_path: str, output_dir: str, progress: Optional[Callable[[int], None]] = None,
+                          output_format: Optional[str] = None, stems: Optional[List[str]] = None,
+                          content_hash: Optional[str] = None,
+                          timings: Optional[Dict[str, float]] = None,
+                          excerpt: Optional[Tuple[float, float]] = None) -> List[str]:
+        stem_names = resolve_stems(stems, FALLBACK_SOURCES)
+        report = progress or (lambda value: None)
+        report(30)
+        
+        with stage_timer(timings, "decode"), self.open_source(audio_path, content_hash, excerpt) as source:
+            audio, sr = read_stereo(source)
+        
+        report(60)
+        
+        # Onset detection and the bass filter are the slow parts, so sources
+        # nobody asked for are not computed at all
+        extractors = {
+            'vocals': lambda: (audio[0] + audio[1]) / 2,
+            'other': lambda: audio[0] - audio[1],
+            'drums': lambda: self.extract_drums(audio, sr),
+            'bass': lambda: self.extract_bass(audio, sr),
+        }
+        with stage_timer(timings, "inference"):
+            sources = {name: extractors[name]() for name in sources_needed(stem_names)}
+        
+        stems = {}
+        for stem_name in stem_names:
+            if stem_name in DERIVED_STEMS:
+                # Stereo mix minus the mono source
+                stems[stem_name] = (audio - sources[DERIVED_STEMS[stem_name]]).T
+            else:
+                stems[stem_name] = sources[stem_name]
+        
+        report(90)
+        
+        with stage_timer(timings, "encode"):
+            stem_files = encode_stems(
+                stems, sr, output_dir, output_format or config.OUTPUT_FORMAT, config.ENCODER_THREADS or None
+            )
+        
+        report(100)
+        return stem_files
     
     def extract_drums(self, audio, sr):
+        if config.DRUM_EXTRACTION_MODE == "hpss":
+            return self.extract_percussive(audio, sr)
+        
+        import librosa
+        
         hop_length = 512
-        frame_length = 2048
+        mono_audio = audio.mean(axis=0)
         
         onset_frames = librosa.onset.onset_detect(
-            y=audio.mean(axis=0), sr=sr, hop_length=hop_length
+            y=mono_audio, sr=sr, hop_length=hop_length
         )
         
-        drum_mask = np.zeros(audio.shape[1])
-        for frame in onset_frames:
-            start = max(0, frame * hop_length - 1024)
-            end = min(len(drum_mask), frame * hop_length + 1024)
-            drum_mask[start:end] = 1
-        
-        return audio.mean(axis=0) * drum_mask
+        return mono_audio * onset_mask(onset_frames * hop_length, len(mono_audio))
+    
+    def extract_percussive(self, audio, sr):
+        # One STFT, median-filter HPSS on its magnitude, one inverse STFT
+        import librosa
+        mono_audio = audio.mean(axis=0)
+        stft = librosa.stft(mono_audio)
+        _, percussive = librosa.decompose.hpss(stft)
+        return librosa.istft(percussive, length=len(mono_audio))
     
     def extract_bass(self, audio, sr):
+        from scipy import signal
         nyquist = sr / 2
         cutoff = 250 / nyquist
         b, a = signal.butter(4, cutoff, btype='low')
@@ -142,4 +310,104 @@ class AudioSeparator:
         mono_audio = audio.mean(axis=0)
         bass = signal.filtfilt(b, a, mono_audio)
         
-        return bass 
\ No newline at end of file
+        return bass 
+
+def read_stereo(source) -> Tuple[np.ndarray, int]:
+    # Whole file as (channels, frames), mono upmixed to stereo
+    audio = source.read(dtype='float32', always_2d=True).T
+    if audio.shape[0] == 1:
+        audio = np.repeat(audio, 2, axis=0)
+    return audio, source.samplerate
+
+def loudest_window(source, seconds: float, hop_seconds: float = 1.0) -> float:
+    # Start, in seconds, of the stretch of the given length with the most
+    # energy: where most instruments play at once, usually a chorus. Reads
+    # the input a hop at a time, so a long file is never held in memory.
+    hop = max(int(hop_seconds * source.samplerate), 1)
+    energy = []
+    while True:
+        block = source.read(hop, dtype='float32', always_2d=True)
+        if len(block) == 0:
+            break
+        energy.append(float(np.square(block, dtype=np.float64).sum()))
+    window = max(int(round(seconds / hop_seconds)), 1)
+    if len(energy) <= window:
+        return 0.0
+    totals = np.convolve(energy, np.ones(window), mode='valid')
+    return float(np.argmax(totals) * hop / source.samplerate)
+
+def onset_mask(onset_samples: np.ndarray, length: int, width: int = 2048, fade: int = 256) -> np.ndarray:
+    # Gate open for width samples around every onset. Overlapping windows are
+    # merged up front so the mask is written in one pass, then each merged
+    # region gets raised-cosine edges instead of a hard 0/1 step.
+    half = width // 2
+    starts = np.clip(np.sort(onset_samples) - half, 0, length)
+    ends = np.clip(np.sort(onset_samples) + half, 0, length)
+    if len(starts) == 0:
+        return np.zeros(length, dtype=np.float32)
+    
+    opens_region = np.ones(len(starts), dtype=bool)
+    opens_region[1:] = starts[1:] > np.maximum.accumulate(ends)[:-1]
+    region_starts = starts[opens_region]
+    region_ends = np.maximum.reduceat(ends, np.flatnonzero(opens_region))
+    
+    bounds = np.empty(2 * len(region_starts) + 2, dtype=np.int64)
+    bounds[0], bounds[-1] = 0, length
+    bounds[1:-1:2] = region_starts
+    bounds[2:-1:2] = region_ends
+    levels = np.zeros(len(bounds) - 1, dtype=np.float32)
+    levels[1::2] = 1
+    mask = np.repeat(levels, np.diff(bounds))
+    
+    ramp = (0.5 - 0.5 * np.cos(np.pi * (np.arange(fade) + 0.5) / fade)).astype(np.float32)
+    ramps = np.broadcast_to(ramp, (len(region_starts), fade))
+    
+    fade_in = region_starts[:, None] + np.arange(fade)
+    valid = fade_in < region_ends[:, None]
+    mask[fade_in[valid]] = ramps[valid]
+    
+    fade_out = region_ends[:, None] - 1 - np.arange(fade)
+    valid = fade_out >= region_starts[:, None]
+    mask[fade_out[valid]] = np.minimum(mask[fade_out[valid]], ramps[valid])
+    return mask
+
+_separator = None
+_separator_lock = threading.Lock()
+
+def get_separator() -> AudioSeparator:
+    # One separator (and one model registry) per process, shared by its threads
+    global _separator
+    with _separator_lock:
+        if _separator is None:
+            _separator = AudioSeparator()
+    return _separator
+
+def separate(audio_path: str, output_dir: str, model_name: Optional[str] = None,
+             output_format: Optional[str] = None, stems: Optional[List[str]] = None,
+             profile: Optional[str] = None, content_hash: Optional[str] = None,
+             profile_dir: Optional[str] = None, excerpt: Optional[Tuple[float, float]] = None,
+             progress: Optional[Callable[[int], None]] = None) -> Tuple[List[str], Dict[str, float]]:
+    # Module-level entry point so process-pool workers can unpickle the job.
+    # Returns the stem files and the seconds spent per stage, which travel
+    # back with the result so /metrics sees them whichever process ran it.
+    # With profile_dir set the job is profiled into that directory.
+    timings: Dict[str, float] = {}
+    with capture(profile_dir, torch_trace=DEMUCS_AVAILABLE):
+        stem_files = get_separator().separate_audio(
+            audio_path, output_dir, progress, model_name, output_format, stems, profile, content_hash, timings,
+            excerpt
+        )
+    return stem_files, timings
+
+def find_excerpt(audio_path: str, seconds: float, content_hash: Optional[str] = None,
+                 progress: Optional[Callable[[int], None]] = None) -> float:
+    # Where a preview of the given length starts; runs on the executor
+    # like separate, and leaves the decoded input in the PCM cache for it
+    return get_separator().find_excerpt(audio_path, seconds, content_hash)
+
+def warm_up(progress: Optional[Callable[[int], None]] = None) -> str:
+    # Runs on the executor like a job, so with the process backend it is the
+    # worker that picks it up which gets warm
+    separator = get_separator()
+    separator.warm_up(config.WARMUP_LOAD_MODEL)
+    return separator.device
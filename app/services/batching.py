@@ -0,0 +1,81 @@
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+
+# forward(batch) takes (batch, channels, frames) and returns
+# (batch, sources, channels, frames)
+ForwardFn = Callable[[np.ndarray], np.ndarray]
+
+class InferenceBatcher:
+    # Segments submitted by concurrent tasks are packed into one forward pass.
+    # A batch is closed once it holds max_batch_size segments or max_wait_ms
+    # after its first segment arrived, which bounds the latency it can add.
+
+    def __init__(self, forward: ForwardFn, max_batch_size: int, max_wait_ms: float):
+        self.forward = forward
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.segments = 0
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, segment: np.ndarray) -> np.ndarray:
+        # Blocks the calling worker thread until its segment has been separated
+        self._ensure_started()
+        future = Future()
+        self._queue.put((segment, future))
+        return future.result()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Tuple[np.ndarray, Future]]):
+        # Shorter segments (the end of a file) are zero-padded to the longest
+        frames = max(segment.shape[-1] for segment, _ in batch)
+        channels = batch[0][0].shape[0]
+        stacked = np.zeros((len(batch), channels, frames), dtype=np.float32)
+        for i, (segment, _) in enumerate(batch):
+            stacked[i, :, :segment.shape[-1]] = segment
+
+        try:
+            separated = self.forward(stacked)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.segments += len(batch)
+        for i, (segment, future) in enumerate(batch):
+            future.set_result(separated[i, ..., :segment.shape[-1]])
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "segments": self.segments,
+            "mean_batch_size": self.segments / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
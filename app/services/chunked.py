@@ -0,0 +1,105 @@
+import os
+import numpy as np
+import soundfile as sf
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from app.core.metrics import stage_timer
+from app.services.decoding import PcmReader
+from app.services.encoding import (
+    OUTPUT_FORMATS, open_stem_writer, output_rate, stem_path, transcode_stem, write_blocks
+)
+
+# infer(segment) takes a (channels, frames) float32 array and returns the
+# separated sources as (sources, channels, frames)
+InferFn = Callable[[np.ndarray], np.ndarray]
+
+def iter_segments(sound_file: Union[sf.SoundFile, PcmReader], segment_frames: int,
+                  overlap_frames: int) -> Iterator[Tuple[np.ndarray, bool]]:
+    # Only segment_frames + overlap_frames of input are ever held in memory
+    step = segment_frames - overlap_frames
+    carry = np.zeros((0, sound_file.channels), dtype=np.float32)
+    while True:
+        block = sound_file.read(segment_frames - len(carry), dtype='float32', always_2d=True)
+        segment = np.concatenate([carry, block]) if len(carry) else block
+        is_last = sound_file.tell() >= sound_file.frames
+        if len(segment) == 0:
+            return
+        yield segment.T, is_last
+        if is_last:
+            return
+        carry = segment[step:]
+
+class SegmentStitcher:
+    def __init__(self, overlap_frames: int):
+        self.overlap_frames = overlap_frames
+        self.pending = None
+        # Linear ramps sum to one, so a signal both segments agree on passes unchanged
+        self.fade_in = (np.arange(overlap_frames, dtype=np.float32) + 0.5) / max(overlap_frames, 1)
+        self.fade_out = 1.0 - self.fade_in
+
+    def push(self, separated: np.ndarray, is_last: bool) -> np.ndarray:
+        # Returns the frames that are final; the overlapping tail is held back
+        if self.pending is not None:
+            head = self.pending.shape[-1]
+            separated = separated.copy()
+            separated[..., :head] = (
+                self.pending * self.fade_out[:head] + separated[..., :head] * self.fade_in[:head]
+            )
+
+        if is_last or self.overlap_frames == 0:
+            self.pending = None
+            return separated
+
+        self.pending = separated[..., -self.overlap_frames:]
+        return separated[..., :-self.overlap_frames]
+
+def separate_in_chunks(audio: Union[str, sf.SoundFile, PcmReader], output_dir: str, stem_names: List[str],
+                       infer: InferFn, segment_seconds: float, overlap_seconds: float,
+                       progress: Optional[Callable[[int], None]] = None,
+                       format_name: str = "wav16", timings: Optional[Dict[str, float]] = None) -> List[str]:
+    # audio is a path or an already open reader; time spent reading,
+    # separating and writing is added to timings when given
+    report = progress or (lambda value: None)
+
+    with (sf.SoundFile(audio) if isinstance(audio, str) else audio) as source:
+        sr = source.samplerate
+        # Encoders tied to other sample rates (Opus) get a lossless
+        # intermediate that is converted once separation is done
+        direct = output_rate(OUTPUT_FORMATS[format_name], sr) == sr
+        write_format = format_name if direct else "wav24"
+        stem_files = [stem_path(output_dir, stem_name, write_format) for stem_name in stem_names]
+        segment_frames = max(int(segment_seconds * sr), 1)
+        overlap_frames = min(int(overlap_seconds * sr), segment_frames // 2)
+        stitcher = SegmentStitcher(overlap_frames)
+        writers = [open_stem_writer(stem_file, sr, 2, write_format) for stem_file in stem_files]
+        try:
+            segments = iter_segments(source, segment_frames, overlap_frames)
+            while True:
+                with stage_timer(timings, "decode"):
+                    item = next(segments, None)
+                if item is None:
+                    break
+                segment, is_last = item
+                if segment.shape[0] == 1:
+                    segment = np.repeat(segment, 2, axis=0)
+                with stage_timer(timings, "inference"):
+                    separated = infer(segment)
+                ready = stitcher.push(separated, is_last)
+                # libsndfile hands every write straight to the OS, so each
+                # finished segment can be read back (and streamed) right away
+                with stage_timer(timings, "encode"):
+                    for writer, stem_audio in zip(writers, ready):
+                        write_blocks(writer, stem_audio.T)
+                report(20 + int(75 * source.tell() / source.frames))
+        finally:
+            for writer in writers:
+                writer.close()
+
+    if direct:
+        return stem_files
+    # One stem at a time and block by block, so memory stays flat here too
+    encoded = []
+    with stage_timer(timings, "encode"):
+        for stem_name, intermediate in zip(stem_names, stem_files):
+            encoded.append(transcode_stem(intermediate, stem_path(output_dir, stem_name, format_name), format_name))
+            os.remove(intermediate)
+    return encoded
@@ -0,0 +1,180 @@
+import shutil
+import tempfile
+import subprocess
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import numpy as np
+import soundfile as sf
+
+DECODE_BLOCK_FRAMES = 64 * 1024
+PIPE_CHUNK_BYTES = 1024 * 1024
+# How much of ffmpeg's complaints goes into the error message
+FFMPEG_ERROR_CHARS = 2000
+
+class PcmReader:
+    # Decoded audio held as a (frames, channels) float32 array, in memory or
+    # memory-mapped from disk. Reads like the parts of sf.SoundFile the
+    # separator uses, so a decoded file and a wav on disk are interchangeable.
+
+    def __init__(self, audio: np.ndarray, samplerate: int):
+        self.audio = audio
+        self.samplerate = samplerate
+        self.frames, self.channels = audio.shape
+        self._position = 0
+
+    def read(self, frames: int = -1, dtype: str = 'float32', always_2d: bool = True) -> np.ndarray:
+        end = self.frames if frames < 0 else min(self.frames, self._position + frames)
+        block = np.array(self.audio[self._position:end], dtype=dtype)
+        self._position = end
+        return block
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, frame: int):
+        self._position = frame
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Decoder:
+    name = ""
+
+    def available(self) -> bool:
+        return True
+
+    def can_decode(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def decode(self, path: str) -> Tuple[np.ndarray, int]:
+        # (frames, channels) float32 and the sample rate
+        raise NotImplementedError
+
+    def decode_to(self, path: str, output: BinaryIO) -> Tuple[int, int]:
+        # Writes interleaved float32 frames to output as they are decoded;
+        # returns the sample rate and channel count
+        audio, sr = self.decode(path)
+        output.write(np.ascontiguousarray(audio).tobytes())
+        return sr, audio.shape[1]
+
+class SoundfileDecoder(Decoder):
+    # WAV, FLAC, OGG, MP3 and everything else libsndfile reads, without audioread
+    name = "soundfile"
+
+    def can_decode(self, path):
+        try:
+            return sf.info(path).frames > 0
+        except Exception:
+            return False
+
+    def decode(self, path):
+        audio, sr = sf.read(path, dtype='float32', always_2d=True)
+        return audio, sr
+
+    def decode_to(self, path, output):
+        with sf.SoundFile(path) as source:
+            for block in source.blocks(DECODE_BLOCK_FRAMES, dtype='float32', always_2d=True):
+                output.write(block.tobytes())
+            return source.samplerate, source.channels
+
+class FfmpegDecoder(Decoder):
+    # M4A, AAC and the rest: ffmpeg decodes to raw float32 on a pipe, which is
+    # read in chunks and never goes through a temporary file
+    name = "ffmpeg"
+
+    def available(self):
+        return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+    def stream_info(self, path: str) -> Optional[Tuple[int, int]]:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries",
+             "stream=sample_rate,channels", "-of", "csv=p=0", path],
+            capture_output=True, text=True
+        )
+        try:
+            sr, channels = result.stdout.strip().splitlines()[0].split(",")[:2]
+            return int(sr), int(channels)
+        except (IndexError, ValueError):
+            return None
+
+    def can_decode(self, path):
+        return self.stream_info(path) is not None
+
+    def _pipe(self, path: str, channels: int, stderr: BinaryIO):
+        return subprocess.Popen(
+            ["ffmpeg", "-v", "error", "-nostdin", "-i", path, "-map", "0:a:0",
+             "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "pipe:1"],
+            stdout=subprocess.PIPE, stderr=stderr
+        )
+
+    def _copy(self, path: str, write) -> Tuple[int, int]:
+        info = self.stream_info(path)
+        if info is None:
+            raise ValueError(f"ffmpeg found no audio stream in {path}")
+        sr, channels = info
+        # A damaged file gets an error line per bad frame; in a pipe nobody
+        # reads until the end, those would fill it up and stall ffmpeg
+        with tempfile.TemporaryFile() as stderr:
+            process = self._pipe(path, channels, stderr)
+            try:
+                while True:
+                    chunk = process.stdout.read(PIPE_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    write(chunk)
+            finally:
+                process.stdout.close()
+                process.wait()
+            if process.returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode(errors="replace").strip()
+                raise RuntimeError(f"ffmpeg failed on {path}: {message[-FFMPEG_ERROR_CHARS:]}")
+        return sr, channels
+
+    def decode(self, path):
+        chunks: List[bytes] = []
+        sr, channels = self._copy(path, chunks.append)
+        audio = np.frombuffer(b"".join(chunks), dtype=np.float32)
+        return audio.reshape(-1, channels), sr
+
+    def decode_to(self, path, output):
+        return self._copy(path, output.write)
+
+class LibrosaDecoder(Decoder):
+    # audioread: slow, but takes whatever codec the system has
+    name = "librosa"
+
+    def can_decode(self, path):
+        return True
+
+    def decode(self, path):
+        import librosa
+        audio, sr = librosa.load(path, sr=None, mono=False)
+        return np.atleast_2d(audio).T.astype(np.float32, copy=False), sr
+
+DECODERS: Dict[str, Decoder] = {
+    decoder.name: decoder for decoder in (SoundfileDecoder(), FfmpegDecoder(), LibrosaDecoder())
+}
+
+def pick_decoder(path: str, order: List[str]) -> Decoder:
+    # First decoder in order that is installed and can read the file
+    for name in order:
+        if name not in DECODERS:
+            raise ValueError(f"Unknown decoder '{name}', expected one of: {', '.join(DECODERS)}")
+        decoder = DECODERS[name]
+        if decoder.available() and decoder.can_decode(path):
+            return decoder
+    raise ValueError(f"None of the decoders ({', '.join(order)}) can read {path}")
+
+def open_audio(path: str, order: List[str]):
+    # Files libsndfile reads are streamed from disk as they are; others are
+    # decoded into memory first
+    decoder = pick_decoder(path, order)
+    if isinstance(decoder, SoundfileDecoder):
+        return sf.SoundFile(path)
+    return PcmReader(*decoder.decode(path))
@@ -0,0 +1,131 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+import soundfile as sf
+
+ENCODE_BLOCK_FRAMES = 64 * 1024
+
+class OutputFormat(NamedTuple):
+    extension: str
+    container: str
+    subtype: str
+    media_type: str
+    # Encoder only accepts these rates (empty: any); stems are resampled to the last one
+    sample_rates: Tuple[int, ...] = ()
+
+OUTPUT_FORMATS: Dict[str, OutputFormat] = {
+    "wav16": OutputFormat("wav", "WAV", "PCM_16", "audio/wav"),
+    "wav24": OutputFormat("wav", "WAV", "PCM_24", "audio/wav"),
+    "flac": OutputFormat("flac", "FLAC", "PCM_24", "audio/flac"),
+    "ogg": OutputFormat("ogg", "OGG", "VORBIS", "audio/ogg"),
+    "opus": OutputFormat("opus", "OGG", "OPUS", "audio/ogg", (8000, 12000, 16000, 24000, 48000)),
+}
+
+def available_formats() -> List[str]:
+    # Ogg Vorbis and Opus depend on how libsndfile was built
+    return [
+        name for name, output_format in OUTPUT_FORMATS.items()
+        if output_format.subtype in sf.available_subtypes(output_format.container)
+    ]
+
+def media_type_for(path: str) -> str:
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    for output_format in OUTPUT_FORMATS.values():
+        if output_format.extension == extension:
+            return output_format.media_type
+    return "application/octet-stream"
+
+def output_rate(output_format: OutputFormat, sr: int) -> int:
+    if not output_format.sample_rates or sr in output_format.sample_rates:
+        return sr
+    return output_format.sample_rates[-1]
+
+def resample(audio: np.ndarray, sr: int, target_sr: int) -> np.ndarray:
+    from math import gcd
+    from scipy.signal import resample_poly
+    factor = gcd(sr, target_sr)
+    return resample_poly(audio, target_sr // factor, sr // factor, axis=0).astype(np.float32)
+
+def resample_blocks(source: sf.SoundFile, sr: int, target_sr: int,
+                    block_frames: int = ENCODE_BLOCK_FRAMES) -> Iterator[np.ndarray]:
+    # Same samples as resample() on the whole file, a block at a time. Each
+    # block is read with enough neighbouring input for the filter to see
+    # what it would in one pass, and starts on a multiple of down so that
+    # its output starts on a whole output sample.
+    from math import gcd
+    from scipy.signal import resample_poly
+    factor = gcd(sr, target_sr)
+    up, down = target_sr // factor, sr // factor
+    # resample_poly's filter spans 10 * max(up, down) upsampled samples each way
+    context = -(-(10 * max(up, down) // up + 1) // down) * down
+    step = max(block_frames // down, 1) * down
+    for start in range(0, source.frames, step):
+        first = max(start - context, 0)
+        source.seek(first)
+        block = source.read(min(start + step + context, source.frames) - first, dtype='float32', always_2d=True)
+        resampled = resample_poly(block, up, down, axis=0)
+        skip = (start - first) * up // down
+        count = -(-min(step, source.frames - start) * up // down)
+        yield resampled[skip:skip + count].astype(np.float32)
+
+def transcode_stem(source_path: str, path: str, format_name: str) -> str:
+    # A stem written in one format into another, a block at a time, so a
+    # long stem never has to fit in memory
+    output_format = OUTPUT_FORMATS[format_name]
+    with sf.SoundFile(source_path) as source:
+        sr = source.samplerate
+        target_sr = output_rate(output_format, sr)
+        if target_sr == sr:
+            blocks = source.blocks(ENCODE_BLOCK_FRAMES, dtype='float32', always_2d=True)
+        else:
+            blocks = resample_blocks(source, sr, target_sr)
+        with open_stem_writer(path, target_sr, source.channels, format_name) as writer:
+            for block in blocks:
+                write_blocks(writer, block)
+    return path
+
+def open_stem_writer(path: str, sr: int, channels: int, format_name: str) -> sf.SoundFile:
+    # The format must accept sr as is
+    output_format = OUTPUT_FORMATS[format_name]
+    return sf.SoundFile(
+        path, 'w', samplerate=sr, channels=channels,
+        format=output_format.container, subtype=output_format.subtype
+    )
+
+def stem_path(output_dir: str, stem_name: str, format_name: str) -> str:
+    return os.path.join(output_dir, f"{stem_name}.{OUTPUT_FORMATS[format_name].extension}")
+
+def encode_stem(audio: np.ndarray, sr: int, path: str, format_name: str) -> str:
+    # audio is (frames,) or (frames, channels), as sf.write takes it
+    output_format = OUTPUT_FORMATS[format_name]
+    target_sr = output_rate(output_format, sr)
+    if target_sr != sr:
+        audio = resample(audio, sr, target_sr)
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    with open_stem_writer(path, target_sr, channels, format_name) as writer:
+        write_blocks(writer, audio)
+    return path
+
+def write_blocks(writer: sf.SoundFile, audio: np.ndarray):
+    # libsndfile's Vorbis encoder puts a whole write on the stack, so a long
+    # stem written in one call overflows it
+    for start in range(0, len(audio), ENCODE_BLOCK_FRAMES):
+        writer.write(audio[start:start + ENCODE_BLOCK_FRAMES])
+
+def encode_stems(stems: Dict[str, np.ndarray], sr: int, output_dir: str, format_name: str,
+                 max_workers: Optional[int] = None) -> List[str]:
+    # libsndfile releases the GIL while it encodes, so stems really are
+    # compressed side by side; file order follows the stems dict
+    if format_name not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {format_name}")
+    paths = [stem_path(output_dir, stem_name, format_name) for stem_name in stems]
+    workers = max_workers or len(stems) or 1
+    if workers == 1:
+        return [encode_stem(audio, sr, path, format_name) for audio, path in zip(stems.values(), paths)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="encoder") as pool:
+        futures = [
+            pool.submit(encode_stem, audio, sr, path, format_name)
+            for audio, path in zip(stems.values(), paths)
+        ]
+        return [future.result() for future in futures]
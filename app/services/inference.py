@@ -0,0 +1,68 @@
+import os
+import warnings
+import threading
+import contextlib
+from typing import ContextManager, Tuple
+
+# How the model runs on the CPU: "fp32" as trained, "bf16" under bfloat16
+# autocast (same weights, faster matmuls where the CPU has bf16 support),
+# "int8" with dynamically quantized Linear and LSTM layers (a separate copy
+# of the model, CPU only)
+INFERENCE_PROFILES = ("fp32", "bf16", "int8")
+
+_threads_configured = False
+_threads_lock = threading.Lock()
+
+def default_torch_threads(concurrent_jobs: int) -> int:
+    # Jobs running side by side each get their share of the cores instead
+    # of every one of them starting a thread per core
+    return max(1, (os.cpu_count() or 1) // max(1, concurrent_jobs))
+
+def configure_threads(intra_op: int, inter_op: int = 0) -> bool:
+    # Once per process, before the first forward pass; later calls are no-ops
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured:
+            return False
+        import torch
+        torch.set_num_threads(intra_op)
+        if inter_op > 0:
+            try:
+                torch.set_num_interop_threads(inter_op)
+            except RuntimeError as e:
+                # torch refuses once inter-op work has started
+                print(f"Could not set inter-op threads: {e}")
+        _threads_configured = True
+        print(f"torch using {torch.get_num_threads()} intra-op and {torch.get_num_interop_threads()} inter-op threads")
+        return True
+
+def model_key(model_name: str, profile: str) -> str:
+    # Registry name; only int8 changes the weights, bf16 shares the fp32 model
+    return f"{model_name}:int8" if profile == "int8" else model_name
+
+def split_model_key(key: str) -> Tuple[str, str]:
+    model_name, _, profile = key.partition(":")
+    return model_name, profile or "fp32"
+
+def prepare_model(model, profile: str, device: str):
+    if profile != "int8":
+        return model
+    if device != "cpu":
+        raise ValueError("The int8 inference profile runs on the CPU only")
+    import torch
+    with warnings.catch_warnings():
+        # Eager-mode quantization is deprecated in favour of torchao, which
+        # is not a dependency here
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8
+        )
+
+def inference_context(profile: str, device: str) -> ContextManager:
+    # inference_mode skips autograd bookkeeping that no_grad still does
+    import torch
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if profile == "bf16":
+        stack.enter_context(torch.autocast(device_type=device, dtype=torch.bfloat16))
+    return stack
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Callable, Dict, List, Tuple
+
+SUPPORTED_MODELS = ("htdemucs", "htdemucs_ft", "htdemucs_6s", "mdx_extra")
+
+def model_footprint(model) -> int:
+    # Bytes held by weights and buffers; activations during a forward pass come on top
+    tensors = chain(model.parameters(), model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+class ModelRegistry:
+    # Models are loaded on first use and kept while they fit in the memory
+    # budget; loading one that does not fit drops the least recently used.
+    # A job that still holds an evicted model keeps it alive until it ends.
+
+    def __init__(self, loader: Callable[[str], Any], memory_budget_bytes: int,
+                 footprint: Callable[[Any], int] = model_footprint):
+        self.loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.footprint = footprint
+        self.loads = 0
+        self.evictions = 0
+        self._models: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def get(self, name: str):
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name][0]
+            load_lock = self._loading.setdefault(name, threading.Lock())
+
+        # Concurrent requests for the same model wait for a single load
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name][0]
+
+            try:
+                model = self.loader(name)
+                size = self.footprint(model)
+
+                with self._lock:
+                    self._evict(self.memory_budget_bytes - size)
+                    if size > self.memory_budget_bytes:
+                        print(f"Model {name} ({size} bytes) is larger than the memory budget")
+                    self._models[name] = (model, size)
+                    self.loads += 1
+            finally:
+                # Also after a failed load, or every bad name would leave a lock behind
+                with self._lock:
+                    if self._loading.get(name) is load_lock:
+                        del self._loading[name]
+            return model
+
+    def _evict(self, target_bytes: int):
+        while self._models and self.resident_bytes() > target_bytes:
+            name, _ = self._models.popitem(last=False)
+            self.evictions += 1
+            print(f"Evicted model {name} from memory")
+
+    def resident_bytes(self) -> int:
+        return sum(size for _, size in self._models.values())
+
+    def loaded(self) -> List[dict]:
+        # Least recently used first
+        with self._lock:
+            return [{"name": name, "bytes": size} for name, (_, size) in self._models.items()]
+
+    def stats(self) -> dict:
+        with self._lock:
+            resident = self.resident_bytes()
+        return {
+            "loaded": self.loaded(),
+            "resident_bytes": resident,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
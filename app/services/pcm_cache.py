@@ -0,0 +1,121 @@
+import os
+import json
+import uuid
+import shutil
+import threading
+from typing import List, Optional
+import numpy as np
+from app.services.decoding import PcmReader, pick_decoder
+
+PCM_NAME = "pcm.f32"
+META_NAME = "meta.json"
+
+class PcmCache:
+    # Decoded audio keyed by the upload's content hash: raw interleaved
+    # float32 frames plus their sample rate and channel count. Entries are
+    # memory-mapped, so a retry, another model or a preview of the same file
+    # skips decoding and only pages in what it reads. Shared by every worker
+    # process, so the directory itself is the index.
+
+    def __init__(self, root: str, max_bytes: int, decoders: List[str]):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.decoders = decoders
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry_dir(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash)
+
+    def get(self, content_hash: str) -> Optional[PcmReader]:
+        entry_dir = self._entry_dir(content_hash)
+        try:
+            with open(os.path.join(entry_dir, META_NAME)) as f:
+                meta = json.load(f)
+            frames = os.path.getsize(os.path.join(entry_dir, PCM_NAME)) // (4 * meta["channels"])
+            audio = np.memmap(
+                os.path.join(entry_dir, PCM_NAME), dtype=np.float32, mode='r',
+                shape=(frames, meta["channels"])
+            ) if frames else np.zeros((0, meta["channels"]), dtype=np.float32)
+            os.utime(entry_dir)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return PcmReader(audio, meta["sample_rate"])
+
+    def open(self, content_hash: str, path: str) -> PcmReader:
+        # Decodes path into the cache on a miss
+        reader = self.get(content_hash)
+        if reader is not None:
+            return reader
+        self.put(content_hash, path)
+        reader = self.get(content_hash)
+        if reader is None:
+            raise RuntimeError(f"Decoded audio for {path} vanished from the cache")
+        return reader
+
+    def put(self, content_hash: str, path: str):
+        decoder = pick_decoder(path, self.decoders)
+        staging_dir = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging_dir)
+        try:
+            with open(os.path.join(staging_dir, PCM_NAME), "wb") as output:
+                sr, channels = decoder.decode_to(path, output)
+            with open(os.path.join(staging_dir, META_NAME), "w") as f:
+                json.dump({"sample_rate": sr, "channels": channels, "decoder": decoder.name}, f)
+            try:
+                os.rename(staging_dir, self._entry_dir(content_hash))
+            except OSError:
+                # Another process decoded the same file first
+                return
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        self._evict(keep=content_hash)
+
+    def _entries(self):
+        # (last use, hash, bytes), least recently used first
+        found = []
+        for name in os.listdir(self.root):
+            entry_dir = self._entry_dir(name)
+            if name.startswith("."):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry_dir, file)) for file in os.listdir(entry_dir))
+                found.append((os.path.getmtime(entry_dir), name, size))
+            except OSError:
+                continue
+        return sorted(found)
+
+    def _evict(self, keep: str):
+        # Unlinking a file that is still mapped is safe, the mapping lives on
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        for _, content_hash, size in entries:
+            if total <= self.max_bytes:
+                break
+            if content_hash == keep:
+                continue
+            shutil.rmtree(self._entry_dir(content_hash), ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(entries),
+                "total_bytes": sum(size for _, _, size in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
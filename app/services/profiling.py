@@ -0,0 +1,100 @@
+import os
+import io
+import pstats
+import cProfile
+import threading
+import contextlib
+from typing import List, Optional
+
+# What a profiled task leaves in its profile directory: the raw cProfile
+# stats (for snakeviz, pstats or gprof2dot), the same stats as text, and on
+# the Demucs path a torch profiler trace (chrome://tracing or Perfetto) with
+# its per-operator summary.
+CPROFILE_NAME = "cprofile.prof"
+CPROFILE_SUMMARY_NAME = "cprofile.txt"
+TORCH_TRACE_NAME = "torch_trace.json.gz"
+TORCH_SUMMARY_NAME = "torch_ops.txt"
+SUMMARY_ROWS = 60
+
+# torch runs one profiler per process at a time, and so does cProfile from
+# Python 3.12 on (enabling a second one raises). A task that finds either
+# busy goes without it rather than failing.
+_torch_profiler_lock = threading.Lock()
+_cprofile_lock = threading.Lock()
+# Heads the text summary: work handed to other threads runs outside the
+# profiled one
+CPROFILE_NOTE = (
+    "cProfile only sees the task's own thread: time spent in the encoder pool and the "
+    "inference batcher shows up as waiting for them, not as their calls.\n\n"
+)
+CPROFILE_BUSY_NOTE = (
+    "cProfile was skipped: another task in this process was being profiled at the same time.\n"
+)
+
+@contextlib.contextmanager
+def capture(profile_dir: Optional[str], torch_trace: bool = False):
+    # Profiles the block when profile_dir is set and writes the results there,
+    # also when the block raises. cProfile only sees the calling thread (not
+    # the encoder pool or the batcher); the torch profiler sees every
+    # operator the process runs meanwhile.
+    if profile_dir is None:
+        yield
+        return
+    os.makedirs(profile_dir, exist_ok=True)
+    with contextlib.ExitStack() as stack:
+        if torch_trace and _torch_profiler_lock.acquire(blocking=False):
+            stack.callback(_torch_profiler_lock.release)
+            torch_profiler = start_torch_profiler()
+            stack.callback(write_torch_profile, torch_profiler, profile_dir)
+        if _cprofile_lock.acquire(blocking=False):
+            stack.callback(_cprofile_lock.release)
+            profiler = cProfile.Profile()
+            stack.callback(write_cprofile, profiler, profile_dir)
+            profiler.enable()
+            stack.callback(profiler.disable)
+        else:
+            stack.callback(write_note, profile_dir, CPROFILE_BUSY_NOTE)
+        yield
+
+def start_torch_profiler():
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    profiler = profile(activities=activities, record_shapes=True)
+    profiler.start()
+    return profiler
+
+def write_torch_profile(profiler, profile_dir: str):
+    # A profile that can't be written must not fail the job it describes
+    try:
+        profiler.stop()
+        profiler.export_chrome_trace(os.path.join(profile_dir, TORCH_TRACE_NAME))
+        with open(os.path.join(profile_dir, TORCH_SUMMARY_NAME), "w") as f:
+            f.write(profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=SUMMARY_ROWS))
+    except Exception as e:
+        print(f"Error writing torch profile to {profile_dir}: {e}")
+
+def write_cprofile(profiler: cProfile.Profile, profile_dir: str):
+    try:
+        profiler.dump_stats(os.path.join(profile_dir, CPROFILE_NAME))
+        summary = io.StringIO()
+        summary.write(CPROFILE_NOTE)
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(SUMMARY_ROWS)
+        with open(os.path.join(profile_dir, CPROFILE_SUMMARY_NAME), "w") as f:
+            f.write(summary.getvalue())
+    except Exception as e:
+        print(f"Error writing cProfile stats to {profile_dir}: {e}")
+
+def write_note(profile_dir: str, note: str):
+    try:
+        with open(os.path.join(profile_dir, CPROFILE_SUMMARY_NAME), "w") as f:
+            f.write(note)
+    except OSError as e:
+        print(f"Error writing profile note to {profile_dir}: {e}")
+
+def profile_files(profile_dir: Optional[str]) -> Optional[List[str]]:
+    if profile_dir is None or not os.path.isdir(profile_dir):
+        return None
+    return sorted(os.path.join(profile_dir, name) for name in os.listdir(profile_dir))
@@ -0,0 +1,154 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+MANIFEST_NAME = "manifest.json"
+
+def link_or_copy(src: str, dst: str):
+    # Hard links make cache fills and hits free when both sides share a disk
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class ResultCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def make_key(content_hash: str, signature: Dict) -> str:
+        # signature holds the model name and every parameter that shapes the stems
+        payload = json.dumps({"content": content_hash, **signature}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _load(self):
+        # Rebuild LRU order from the entries' last-use times on disk
+        found = []
+        for key in os.listdir(self.root):
+            entry_dir = self._entry_dir(key)
+            if key.startswith(".") or not os.path.exists(os.path.join(entry_dir, MANIFEST_NAME)):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir)
+            )
+            found.append((os.path.getmtime(entry_dir), key, size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+        self._evict()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            if key not in self._entries and not self._adopt(key):
+                self.misses += 1
+                return None
+            entry_dir = self._entry_dir(key)
+            try:
+                with open(os.path.join(entry_dir, MANIFEST_NAME)) as f:
+                    stem_names = json.load(f)["stems"]
+                os.utime(entry_dir)
+            except (OSError, ValueError, KeyError):
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [os.path.join(entry_dir, name) for name in stem_names]
+
+    def materialize(self, key: str, output_dir: str) -> Optional[List[str]]:
+        # Give the task its own copy so cleanup can never touch the cache
+        cached_stems = self.get(key)
+        if cached_stems is None:
+            return None
+        os.makedirs(output_dir, exist_ok=True)
+        stem_files = []
+        for cached_stem in cached_stems:
+            stem_file = os.path.join(output_dir, os.path.basename(cached_stem))
+            link_or_copy(cached_stem, stem_file)
+            stem_files.append(stem_file)
+        return stem_files
+
+    def put(self, key: str, stem_files: List[str]):
+        size = sum(os.path.getsize(stem_file) for stem_file in stem_files)
+        if size > self.max_bytes:
+            return
+
+        staging_dir = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging_dir)
+        try:
+            for stem_file in stem_files:
+                link_or_copy(stem_file, os.path.join(staging_dir, os.path.basename(stem_file)))
+            with open(os.path.join(staging_dir, MANIFEST_NAME), "w") as f:
+                json.dump({"stems": [os.path.basename(stem_file) for stem_file in stem_files]}, f)
+
+            with self._lock:
+                if key in self._entries or self._adopt(key):
+                    return
+                try:
+                    os.rename(staging_dir, self._entry_dir(key))
+                except OSError:
+                    # Another process stored the same result first
+                    self._adopt(key)
+                    return
+                self._entries[key] = size
+                self._evict()
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _adopt(self, key: str) -> bool:
+        # Worker processes fill the same directory; an entry another process
+        # wrote is taken into this index the first time it is asked for
+        entry_dir = self._entry_dir(key)
+        if not os.path.exists(os.path.join(entry_dir, MANIFEST_NAME)):
+            return False
+        try:
+            size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+        except OSError:
+            return False
+        self._entries[key] = size
+        self._evict()
+        return key in self._entries
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _evict(self):
+        while self._entries and self.total_bytes > self.max_bytes:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
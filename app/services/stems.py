@@ -0,0 +1,55 @@
+from typing import List, Optional, Sequence
+import numpy as np
+
+# Stems the separator never computes directly: name -> the source that is
+# taken out of the mix to get it. Costs one subtraction instead of a pass.
+DERIVED_STEMS = {"instrumental": "vocals"}
+
+MODEL_SOURCES = {
+    "htdemucs": ("drums", "bass", "other", "vocals"),
+    "htdemucs_ft": ("drums", "bass", "other", "vocals"),
+    "htdemucs_6s": ("drums", "bass", "other", "vocals", "guitar", "piano"),
+    "mdx_extra": ("drums", "bass", "other", "vocals"),
+}
+
+# What simple_separation produces when Demucs is not installed
+FALLBACK_SOURCES = ("vocals", "other", "drums", "bass")
+
+def parse_stems(value: Optional[str]) -> Optional[List[str]]:
+    # "vocals, instrumental" -> ["vocals", "instrumental"]; empty means all sources
+    if not value:
+        return None
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    return list(dict.fromkeys(names)) or None
+
+def known_stems(sources: Sequence[str]) -> List[str]:
+    return list(sources) + [name for name, base in DERIVED_STEMS.items() if base in sources]
+
+def resolve_stems(requested: Optional[Sequence[str]], sources: Sequence[str]) -> List[str]:
+    # Requested stems in a fixed order (sources first, then derived ones) so
+    # the same request always gives the same files and the same cache key
+    if not requested:
+        return list(sources)
+    unknown = [name for name in requested if name not in known_stems(sources)]
+    if unknown:
+        raise ValueError(
+            f"Unknown stems: {', '.join(unknown)}. Choose from: {', '.join(known_stems(sources))}"
+        )
+    return [name for name in known_stems(sources) if name in requested]
+
+def sources_needed(stem_names: Sequence[str]) -> List[str]:
+    # Sources that have to be computed to produce stem_names
+    needed = [DERIVED_STEMS.get(name, name) for name in stem_names]
+    return list(dict.fromkeys(needed))
+
+def select_stems(separated: np.ndarray, mix: np.ndarray, sources: Sequence[str],
+                 stem_names: Sequence[str]) -> np.ndarray:
+    # separated is (sources, channels, frames), mix (channels, frames); the
+    # result holds stem_names in order, with derived stems filled in
+    picked = []
+    for name in stem_names:
+        if name in DERIVED_STEMS:
+            picked.append(mix - separated[list(sources).index(DERIVED_STEMS[name])])
+        else:
+            picked.append(separated[list(sources).index(name)])
+    return np.stack(picked)
@@ -0,0 +1,113 @@
+import os
+import time
+import shutil
+from typing import Dict, List, Optional, Set
+from app.core.metrics import STORAGE_JOBS_REMOVED, STORAGE_RECLAIMED_BYTES
+from app.core.task_store import TaskStore
+
+INPUT_DIR = "input"
+
+def directory_size(path: str) -> int:
+    # Bytes that removing path frees: files hard-linked from the result
+    # cache stay on disk and don't count
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                stat = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            if stat.st_nlink <= 1:
+                total += stat.st_size
+    return total
+
+class JobStorage:
+    # One directory per task, named after it: the upload in input/, the
+    # stems in stems/ and a captured profile in profile/. Finished jobs are
+    # removed ttl_seconds after they finish; when the disk is fuller than
+    # high_watermark, the oldest finished ones go until it is back under
+    # low_watermark. Queued and running jobs are never touched, nor is a
+    # finished job whose upload an unfinished one still reads (a preview of
+    # a cancelled task).
+
+    def __init__(self, root: str, ttl_seconds: float, high_watermark: float, low_watermark: float):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        os.makedirs(self.root, exist_ok=True)
+
+    def job_dir(self, task_id: str) -> str:
+        return os.path.join(self.root, task_id)
+
+    def create(self, task_id: str) -> str:
+        job_dir = self.job_dir(task_id)
+        os.makedirs(os.path.join(job_dir, INPUT_DIR))
+        return job_dir
+
+    def input_path(self, job_dir: str, filename: str) -> str:
+        # Only the name of the client's file is used, never its path
+        return os.path.join(job_dir, INPUT_DIR, os.path.basename(filename) or "input")
+
+    def remove(self, job_dir: str, reason: str) -> int:
+        size = directory_size(job_dir)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        STORAGE_RECLAIMED_BYTES.inc(size, reason=reason)
+        STORAGE_JOBS_REMOVED.inc(reason=reason)
+        return size
+
+    def in_use(self, store: TaskStore) -> Set[str]:
+        # Job directories holding the input of a queued or running task
+        root = os.path.realpath(self.root)
+        used = set()
+        for task in store.unfinished():
+            if task.input_path:
+                relative = os.path.relpath(os.path.realpath(task.input_path), root)
+                if not relative.startswith(os.pardir):
+                    used.add(relative.split(os.sep)[0])
+        return used
+
+    def disk_usage(self) -> float:
+        usage = shutil.disk_usage(self.root)
+        return usage.used / usage.total
+
+    def sweep(self, store: TaskStore, now: Optional[float] = None) -> List[str]:
+        # Returns the tasks whose job directory was removed, so their
+        # records can go as well
+        now = time.time() if now is None else now
+        modified: Dict[str, float] = {}
+        for task_id in os.listdir(self.root):
+            try:
+                modified[task_id] = os.path.getmtime(self.job_dir(task_id))
+            except OSError:
+                continue
+
+        # Failed tasks have no completion time, their directory's last change stands in
+        in_use = self.in_use(store)
+        finished = sorted(
+            (task.completed_at.timestamp() if task.completed_at else modified[task.task_id], task.task_id)
+            for task in store.finished(list(modified))
+            if task.task_id not in in_use
+        )
+        removed = []
+
+        if self.ttl_seconds > 0:
+            finished_ids = {task_id for _, task_id in finished}
+            for task_id, mtime in modified.items():
+                # Left behind by uploads that never became a task
+                if (task_id not in finished_ids and task_id not in in_use
+                        and now - mtime > self.ttl_seconds and store.get(task_id) is None):
+                    self.remove(self.job_dir(task_id), "orphaned")
+            for finished_at, task_id in finished:
+                if now - finished_at > self.ttl_seconds:
+                    self.remove(self.job_dir(task_id), "expired")
+                    removed.append(task_id)
+            finished = [(finished_at, task_id) for finished_at, task_id in finished if task_id not in removed]
+
+        if self.high_watermark < 1 and self.disk_usage() > self.high_watermark:
+            for _, task_id in finished:
+                if self.disk_usage() <= self.low_watermark:
+                    break
+                self.remove(self.job_dir(task_id), "disk_full")
+                removed.append(task_id)
+        return removed
@@ -0,0 +1,71 @@
+import json
+import shutil
+import subprocess
+from typing import Optional
+from pydantic import BaseModel
+
+class AudioInfo(BaseModel):
+    duration: float
+    sample_rate: int
+    channels: int
+    prober: str
+
+class ProbeError(Exception):
+    pass
+
+def probe_audio(path: str) -> AudioInfo:
+    # Reads the container header only; libsndfile knows WAV/FLAC/OGG (and MP3
+    # in recent builds), ffprobe or audioread cover the rest (M4A, AAC, ...)
+    for prober in (_probe_soundfile, _probe_ffprobe, _probe_audioread):
+        info = prober(path)
+        if info is not None:
+            if info.duration <= 0 or info.sample_rate <= 0 or info.channels <= 0:
+                raise ProbeError("Audio file has no samples")
+            return info
+    raise ProbeError("Could not read the audio file")
+
+def _probe_soundfile(path: str) -> Optional[AudioInfo]:
+    import soundfile as sf
+    try:
+        info = sf.info(path)
+    except Exception:
+        return None
+    return AudioInfo(
+        duration=info.duration, sample_rate=info.samplerate, channels=info.channels, prober="soundfile"
+    )
+
+def _probe_ffprobe(path: str) -> Optional[AudioInfo]:
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        return None
+    try:
+        result = subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=sample_rate,channels:format=duration",
+             "-of", "json", path],
+            capture_output=True, text=True, timeout=30, check=True
+        )
+        data = json.loads(result.stdout)
+        stream = data["streams"][0]
+        return AudioInfo(
+            duration=float(data["format"]["duration"]),
+            sample_rate=int(stream["sample_rate"]),
+            channels=int(stream["channels"]),
+            prober="ffprobe"
+        )
+    except (subprocess.SubprocessError, ValueError, KeyError, IndexError):
+        return None
+
+def _probe_audioread(path: str) -> Optional[AudioInfo]:
+    try:
+        import audioread
+    except ImportError:
+        return None
+    try:
+        with audioread.audio_open(path) as source:
+            return AudioInfo(
+                duration=source.duration, sample_rate=source.samplerate,
+                channels=source.channels, prober="audioread"
+            )
+    except Exception:
+        return None
@@ -0,0 +1,72 @@
+import os
+import asyncio
+import struct
+from typing import AsyncIterator, Callable, Optional, Tuple
+import anyio
+
+HEADER_READ_BYTES = 4096
+FOLLOW_CHUNK_SIZE = 256 * 1024
+# Sizes a WAV header gives when the length isn't known yet; players read
+# such a file to its end
+UNKNOWN_SIZE = 0xFFFFFFFF
+
+def wav_layout(header: bytes) -> Optional[Tuple[bytes, int, int]]:
+    # The fmt chunk, where the samples start and how many bytes of them the
+    # header claims. libsndfile writes 0 there until the file is closed.
+    # None until the header is all there.
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    fmt_chunk = None
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id = header[offset:offset + 4]
+        size, = struct.unpack("<I", header[offset + 4:offset + 8])
+        if chunk_id == b"data":
+            return (fmt_chunk, offset + 8, size) if fmt_chunk else None
+        if chunk_id == b"fmt ":
+            fmt_chunk = header[offset:offset + 8 + size]
+        # Chunks are padded to an even size
+        offset += 8 + size + (size & 1)
+    return None
+
+def streaming_header(fmt_chunk: bytes) -> bytes:
+    return (
+        b"RIFF" + struct.pack("<I", UNKNOWN_SIZE) + b"WAVE"
+        + fmt_chunk + b"data" + struct.pack("<I", UNKNOWN_SIZE)
+    )
+
+async def read_layout(file) -> Optional[Tuple[bytes, int, int]]:
+    await file.seek(0)
+    return wav_layout(await file.read(HEADER_READ_BYTES))
+
+async def follow_wav(path: str, finished: Callable[[], bool], poll_seconds: float,
+                     chunk_size: int = FOLLOW_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    # A WAV file that is still being written, as one WAV of unknown length:
+    # samples are passed on as they land on disk, until the writer closes
+    # the file or finished() says nobody is going to write to it any more.
+    # The header has to be complete already, see wav_layout.
+    async with await anyio.open_file(path, "rb") as file:
+        fmt_chunk, position, _ = await read_layout(file)
+        yield streaming_header(fmt_chunk)
+        end = None
+        while True:
+            await file.seek(position)
+            limit = chunk_size if end is None else min(chunk_size, end - position)
+            chunk = await file.read(limit) if limit > 0 else b""
+            if chunk:
+                position += len(chunk)
+                yield chunk
+                continue
+            if end is not None:
+                return
+            # Caught up with the writer: checked in this order so that the
+            # last samples of a job that just finished are still read
+            done = finished()
+            _, data_offset, data_size = await read_layout(file)
+            if data_size:
+                end = data_offset + data_size
+            elif done:
+                # The writer is gone without closing the file: what's there is all
+                end = os.fstat(file.wrapped.fileno()).st_size
+            else:
+                await asyncio.sleep(poll_seconds)
@@ -0,0 +1,139 @@
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+import anyio
+from fastapi import Request
+from starlette.responses import FileResponse, Response
+
+HASH_CHUNK_SIZE = 1024 * 1024
+ETAG_CACHE_ENTRIES = 4096
+# A task's stems never change once written, so clients may reuse them for a
+# day and revalidate with the ETag after that
+CACHE_CONTROL = "private, max-age=86400"
+
+_etags: "OrderedDict[tuple, str]" = OrderedDict()
+_etags_lock = threading.Lock()
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def content_etag(path: str, stat_result: os.stat_result) -> str:
+    # Strong ETag from the file's bytes. Each file is hashed once; a file
+    # that is replaced or rewritten gets a new inode, size or mtime.
+    key = (path, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+    with _etags_lock:
+        if key in _etags:
+            _etags.move_to_end(key)
+            return _etags[key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()[:32]}"'
+    with _etags_lock:
+        _etags[key] = etag
+        while len(_etags) > ETAG_CACHE_ENTRIES:
+            _etags.popitem(last=False)
+    return etag
+
+def etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def if_range_matches(header: str, etag: str, mtime: float) -> bool:
+    # If-Range needs a strong match: the exact ETag, or the exact date
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        return header == etag
+    try:
+        return int(parsedate_to_datetime(header).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # First and last byte (inclusive) of a single "bytes=" range. None means
+    # the header is to be ignored and the whole file sent: malformed, another
+    # unit, or several ranges, which aren't worth a multipart response here.
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start, dash, end = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not start:
+            # The last N bytes
+            suffix = int(end)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+        first = int(start)
+        last = int(end) if end else None
+    except ValueError:
+        return None
+    if first < 0 or (last is not None and last < first):
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable()
+    return first, size - 1 if last is None else min(last, size - 1)
+
+class PartialFileResponse(FileResponse):
+    def __init__(self, path: str, first: int, last: int, **kwargs):
+        self.first = first
+        self.last = last
+        super().__init__(path, status_code=206, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.first)
+            remaining = self.last - self.first + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+async def file_response(request: Request, path: str, media_type: str, filename: str) -> Response:
+    # A file download that answers conditional and range requests, so a
+    # resumed download or a seeking audio player only moves the bytes it needs
+    stat_result = await asyncio.to_thread(os.stat, path)
+    size = stat_result.st_size
+    etag = await asyncio.to_thread(content_etag, path, stat_result)
+    headers = {"etag": etag, "accept-ranges": "bytes", "cache-control": CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(
+            status_code=304, headers={**headers, "last-modified": formatdate(stat_result.st_mtime, usegmt=True)}
+        )
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A Range with an outdated If-Range gets the whole, new file
+    if range_header and (if_range is None or if_range_matches(if_range, etag, stat_result.st_mtime)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            first, last = byte_range
+            headers["content-range"] = f"bytes {first}-{last}/{size}"
+            headers["content-length"] = str(last - first + 1)
+            return PartialFileResponse(
+                path, first, last, headers=headers, media_type=media_type, filename=filename,
+                stat_result=stat_result
+            )
+
+    return FileResponse(path, headers=headers, media_type=media_type, filename=filename, stat_result=stat_result)
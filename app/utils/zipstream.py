@@ -0,0 +1,51 @@
+import io
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only, non-seekable target: zipfile then emits data descriptors
+    # instead of seeking back, which lets us hand bytes out as they are made
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(entries: Iterable[Tuple[str, str]], compress: bool = False,
+               chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    # entries are (path on disk, name inside the archive); stems are already
+    # encoded audio that barely deflates, so storing is the default
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    sink = _ChunkSink()
+
+    with zipfile.ZipFile(sink, 'w', compression=compression) as archive:
+        for path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = compression
+            force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+
+            with open(path, 'rb') as source, archive.open(info, 'w', force_zip64=force_zip64) as target:
+                yield sink.drain()
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+
+    # Central directory
+    yield sink.drain()
@@ -0,0 +1,204 @@
+import os
+import time
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime
+from typing import List, Optional
+from app.core import config
+from app.core.executor import JobCancelled
+from app.core.task_store import SqliteTaskStore
+from app.models.task import SeparationTask
+from app.services.inference import configure_threads, default_torch_threads
+from app.services.result_cache import ResultCache
+
+# Run next to an API started with API_ONLY=true:
+#   python -m app.worker --processes 4
+# Every worker process has its own interpreter and its own models, claims
+# jobs from the SQLite queue and writes progress and results back to it.
+# A crashed worker is restarted and its job queued again; the HTTP server
+# never notices.
+
+PROGRESS_WRITE_INTERVAL = 0.5
+
+def worker_id_for(pid: int) -> str:
+    return f"{socket.gethostname()}-{pid}"
+
+class ProgressWriter:
+    # Progress callback for separate_audio; the API reads progress from the
+    # store, so updates are written there, at most every half second
+    def __init__(self, store: SqliteTaskStore, task: SeparationTask, worker_id: str):
+        self.store = store
+        self.task = task
+        self.worker_id = worker_id
+        self._last_write = 0.0
+
+    def __call__(self, progress: int):
+        if progress == self.task.progress:
+            return
+        self.task.progress = progress
+        now = time.monotonic()
+        if now - self._last_write >= PROGRESS_WRITE_INTERVAL:
+            self._last_write = now
+            # Refused once the task was cancelled or handed to another worker
+            if not self.store.update(self.task, self.worker_id):
+                raise JobCancelled()
+
+class Heartbeat:
+    # Keeps the lease fresh from its own thread, so a long model pass that
+    # reports no progress is not mistaken for a dead worker
+    def __init__(self, store: SqliteTaskStore, task_id: str, worker_id: str, interval: float):
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(store, task_id, worker_id, interval), daemon=True
+        )
+
+    def _run(self, store, task_id, worker_id, interval):
+        while not self._stopped.wait(interval):
+            store.heartbeat(task_id, worker_id)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+
+def run_job(store: SqliteTaskStore, task: SeparationTask, worker_id: str,
+            result_cache: Optional[ResultCache] = None):
+    from app.services.audio_separator import DEMUCS_AVAILABLE, get_separator
+    from app.services.profiling import capture, profile_files
+
+    job_dir = task.job_dir or tempfile.mkdtemp()
+    output_dir = os.path.join(job_dir, 'stems')
+    os.makedirs(output_dir, exist_ok=True)
+    profile_dir = os.path.join(job_dir, 'profile') if task.capture_profile else None
+    # Saved with the task; the API process turns them into metrics
+    task.timings = {}
+    try:
+        separator = get_separator()
+        heartbeat = Heartbeat(store, task.task_id, worker_id, config.WORKER_LEASE_SECONDS / 3)
+        with heartbeat, capture(profile_dir, torch_trace=DEMUCS_AVAILABLE):
+            excerpt = None
+            if task.excerpt_seconds:
+                task.excerpt_start = separator.find_excerpt(task.input_path, task.excerpt_seconds, task.content_hash)
+                excerpt = (task.excerpt_start, task.excerpt_seconds)
+            stem_files = separator.separate_audio(
+                task.input_path, output_dir, ProgressWriter(store, task, worker_id),
+                task.model, task.output_format, task.requested_stems, task.inference_profile,
+                task.content_hash, task.timings, excerpt
+            )
+        task.status = "completed"
+        task.progress = 100
+        task.stems = stem_files
+        task.completed_at = datetime.now()
+    except JobCancelled:
+        print(f"Task {task.task_id} was cancelled or handed to another worker")
+        store.release(task.task_id, worker_id)
+        return
+    except Exception as e:
+        print(f"Task {task.task_id} failed: {e}")
+        task.status = "failed"
+        task.error = str(e)
+    task.profile_files = profile_files(profile_dir)
+
+    if not store.update(task, worker_id):
+        print(f"Task {task.task_id} was cleaned up or handed to another worker meanwhile")
+    store.release(task.task_id, worker_id)
+
+    if task.status == "completed" and result_cache is not None and task.cache_key:
+        try:
+            result_cache.put(task.cache_key, task.stems)
+        except Exception as e:
+            print(f"Error caching stems for {task.task_id}: {e}")
+
+def worker_main(torch_threads: int):
+    # The supervisor decides when workers stop; Ctrl+C is meant for it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_id = worker_id_for(os.getpid())
+    if torch_threads > 0:
+        # N workers each using every core would just fight over them
+        configure_threads(torch_threads, config.TORCH_INTEROP_THREADS)
+
+    store = SqliteTaskStore(config.TASK_DB_PATH)
+    result_cache = (
+        ResultCache(config.RESULT_CACHE_DIR, config.RESULT_CACHE_MAX_BYTES)
+        if config.RESULT_CACHE_ENABLED else None
+    )
+
+    from app.services.audio_separator import get_separator
+    try:
+        get_separator().warm_up(config.WARMUP_LOAD_MODEL)
+    except Exception as e:
+        print(f"Worker {worker_id} warm-up failed: {e}")
+    print(f"Worker {worker_id} ready")
+
+    while True:
+        task = store.claim_next(worker_id)
+        if task is None:
+            time.sleep(config.WORKER_POLL_SECONDS)
+            continue
+        print(f"Worker {worker_id} took task {task.task_id}")
+        run_job(store, task, worker_id, result_cache)
+
+class Supervisor:
+    def __init__(self, processes: int, torch_threads: int):
+        self.processes = processes
+        self.torch_threads = torch_threads
+        self.store = SqliteTaskStore(config.TASK_DB_PATH)
+        self.context = multiprocessing.get_context("spawn")
+        self.workers: List[multiprocessing.Process] = []
+        self._stopping = threading.Event()
+
+    def _start_worker(self) -> multiprocessing.Process:
+        process = self.context.Process(target=worker_main, args=(self.torch_threads,), name="separator-worker")
+        process.start()
+        return process
+
+    def _requeue(self, worker_ids: Optional[List[str]] = None, stale_after: Optional[float] = None):
+        requeued = self.store.requeue_abandoned(worker_ids, stale_after, config.WORKER_MAX_ATTEMPTS)
+        if requeued:
+            print(f"Queued {len(requeued)} abandoned tasks again: {', '.join(requeued)}")
+
+    def stop(self, *args):
+        self._stopping.set()
+
+    def run(self):
+        # Jobs of workers that were running when the previous supervisor died
+        self._requeue(stale_after=config.WORKER_LEASE_SECONDS)
+        self.workers = [self._start_worker() for _ in range(self.processes)]
+        print(f"Started {self.processes} workers with {self.torch_threads or 'default'} torch threads each")
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while not self._stopping.wait(1):
+            for index, process in enumerate(self.workers):
+                if process.is_alive():
+                    continue
+                print(f"Worker {worker_id_for(process.pid)} exited with code {process.exitcode}, restarting it")
+                self._requeue(worker_ids=[worker_id_for(process.pid)])
+                self.workers[index] = self._start_worker()
+            self._requeue(stale_after=config.WORKER_LEASE_SECONDS)
+
+        for process in self.workers:
+            process.terminate()
+        for process in self.workers:
+            process.join()
+        self._requeue(worker_ids=[worker_id_for(process.pid) for process in self.workers])
+        self.store.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run separation workers against the shared task queue")
+    parser.add_argument("--processes", type=int, default=config.WORKER_PROCESSES)
+    parser.add_argument("--torch-threads", type=int, default=config.TORCH_THREADS,
+                        help="threads per worker (default: TORCH_THREADS, or cores divided by processes)")
+    args = parser.parse_args()
+
+    torch_threads = args.torch_threads or default_torch_threads(args.processes)
+    Supervisor(args.processes, torch_threads).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import json
+import shutil
+import itertools
+import argparse
+import tempfile
+import soundfile as sf
+from benchmarks.common import synthetic_stereo, timed
+
+# Decode time per input format: the old librosa.load path, every installed
+# decoder, filling the PCM cache, and reading the whole file back from it.
+
+INPUT_FORMATS = {
+    "wav": {"format": "WAV", "subtype": "PCM_16"},
+    "flac": {"format": "FLAC"},
+    "ogg": {"format": "OGG", "subtype": "VORBIS"},
+    "mp3": {"format": "MP3", "subtype": "MPEG_LAYER_III"},
+}
+
+def write_input(path: str, seconds: float, sr: int, options: dict):
+    audio = synthetic_stereo(seconds, sr).T
+    with sf.SoundFile(path, "w", samplerate=sr, channels=2, **options) as output:
+        # Vorbis and MP3 encoders want moderate writes
+        for start in range(0, len(audio), 64 * 1024):
+            output.write(audio[start:start + 64 * 1024])
+
+def run(seconds: float, sr: int, repeat: int, output: str = None):
+    import librosa
+    from app.services.decoding import DECODERS
+    from app.services.pcm_cache import PcmCache
+
+    workdir = tempfile.mkdtemp(prefix="bench-decoders-")
+    results = []
+    try:
+        warm_up = os.path.join(workdir, "warm-up.wav")
+        write_input(warm_up, 1, sr, INPUT_FORMATS["wav"])
+        librosa.load(warm_up, sr=None, mono=False)
+
+        print(f"{seconds:.0f}s stereo @ {sr} Hz")
+        print(f"{'input':>6} {'method':>16} {'time':>9}")
+        for extension, options in INPUT_FORMATS.items():
+            if options.get("subtype", "PCM_16") not in sf.available_subtypes(options["format"]):
+                continue
+            path = os.path.join(workdir, f"input.{extension}")
+            write_input(path, seconds, sr, options)
+
+            cases = [("librosa.load", lambda: librosa.load(path, sr=None, mono=False))]
+            for name, decoder in DECODERS.items():
+                if decoder.available() and decoder.can_decode(path):
+                    cases.append((name, lambda decoder=decoder: decoder.decode(path)))
+
+            # Every fill gets a new key, the hit reads one that is already there
+            cache = PcmCache(os.path.join(workdir, f"pcm-{extension}"), 1024 ** 4, list(DECODERS))
+            fills = itertools.count()
+            cases.append(("pcm cache fill", lambda: cache.put(f"fill-{next(fills)}", path)))
+            cache.put("hit", path)
+            cases.append(("pcm cache hit", lambda: cache.get("hit").read()))
+
+            for method, func in cases:
+                elapsed, _ = timed(func, repeat=repeat)
+                results.append({"input": extension, "method": method, "seconds": elapsed})
+                print(f"{extension:>6} {method:>16} {elapsed:>8.3f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"seconds": seconds, "sample_rate": sr, "results": results}, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare audio decoders and the decoded-PCM cache")
+    parser.add_argument("--seconds", type=float, default=240)
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    run(args.seconds, args.sr, args.repeat, args.output)
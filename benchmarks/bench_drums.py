@@ -0,0 +1,62 @@
+import argparse
+import numpy as np
+import librosa
+from scipy import signal
+from app.services.audio_separator import AudioSeparator, onset_mask
+from benchmarks.common import timed
+
+def synthetic_drums(minutes: float, sr: int, bpm: int = 120, seed: int = 0) -> np.ndarray:
+    # Decaying noise bursts on every eighth note over a sustained chord
+    rng = np.random.default_rng(seed)
+    length = int(minutes * 60 * sr)
+    t = np.arange(length, dtype=np.float32) / sr
+    tones = sum(np.sin(2 * np.pi * f * t) for f in (110.0, 138.6, 164.8)) * 0.1
+
+    hit = rng.standard_normal(int(0.08 * sr)).astype(np.float32)
+    hit *= np.exp(-np.linspace(0, 8, len(hit))).astype(np.float32)
+    impulses = np.zeros(length, dtype=np.float32)
+    impulses[::int(sr * 30 / bpm)] = 0.8
+    drums = signal.oaconvolve(impulses, hit)[:length]
+
+    mono = (tones + drums).astype(np.float32)
+    return np.stack([mono, mono * 0.9])
+
+def legacy_onset_mask(onset_samples: np.ndarray, length: int) -> np.ndarray:
+    # The per-onset slice loop extract_drums used before vectorization
+    drum_mask = np.zeros(length)
+    for sample in onset_samples:
+        start = max(0, sample - 1024)
+        end = min(length, sample + 1024)
+        drum_mask[start:end] = 1
+    return drum_mask
+
+def run(minutes_list, sr: int, hpss_max_minutes: float):
+    separator = AudioSeparator()
+    print(f"{'input':>8} {'onsets':>7} {'mask loop':>10} {'mask vec':>10} {'speedup':>8} "
+          f"{'onset mode':>11} {'hpss mode':>10}")
+    for minutes in minutes_list:
+        audio = synthetic_drums(minutes, sr)
+        onset_frames = librosa.onset.onset_detect(y=audio.mean(axis=0), sr=sr, hop_length=512)
+        onset_samples = onset_frames * 512
+        length = audio.shape[1]
+
+        loop_time, _ = timed(legacy_onset_mask, onset_samples, length)
+        vector_time, _ = timed(onset_mask, onset_samples, length)
+
+        onset_mode_time, _ = timed(separator.extract_drums, audio, sr, repeat=1)
+        # A whole-file STFT of an hour of audio needs several GB
+        hpss_mode = "skipped"
+        if minutes <= hpss_max_minutes:
+            hpss_mode_time, _ = timed(separator.extract_percussive, audio, sr, repeat=1)
+            hpss_mode = f"{hpss_mode_time:.2f}s"
+
+        print(f"{minutes:>6}m {len(onset_samples):>7} {loop_time:>9.3f}s {vector_time:>9.3f}s "
+              f"{loop_time / vector_time:>7.1f}x {onset_mode_time:>10.2f}s {hpss_mode:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fallback drum extraction implementations")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 60])
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--hpss-max-minutes", type=float, default=10)
+    args = parser.parse_args()
+    run(args.minutes, args.sr, args.hpss_max_minutes)
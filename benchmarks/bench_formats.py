@@ -0,0 +1,59 @@
+import os
+import json
+import shutil
+import argparse
+import tempfile
+from app.services.encoding import OUTPUT_FORMATS, available_formats, encode_stems
+from benchmarks.common import synthetic_stereo, timed
+
+STEM_NAMES = ["vocals", "drums", "bass", "other"]
+
+def run(seconds: float, sr: int, repeat: int, output: str = None):
+    # Four stereo stems of the synthetic mix, each slightly different so no
+    # encoder can cheat on identical input
+    mix = synthetic_stereo(seconds, sr).T
+    stems = {name: mix * (0.5 + 0.1 * i) for i, name in enumerate(STEM_NAMES)}
+    workdir = tempfile.mkdtemp(prefix="bench-formats-")
+    results = []
+    try:
+        print(f"{len(stems)} stems x {seconds:.0f}s @ {sr} Hz")
+        print(f"{'format':>8} {'size':>10} {'kbit/s':>8} {'vs wav16':>9} {'sequential':>11} {'parallel':>9} {'speedup':>8}")
+        for name in available_formats():
+            output_dir = os.path.join(workdir, name)
+            os.makedirs(output_dir)
+            sequential, _ = timed(encode_stems, stems, sr, output_dir, name, 1, repeat=repeat)
+            parallel, stem_files = timed(encode_stems, stems, sr, output_dir, name, None, repeat=repeat)
+            size = sum(os.path.getsize(path) for path in stem_files)
+            results.append({
+                "format": name,
+                "codec": OUTPUT_FORMATS[name].subtype,
+                "bytes": size,
+                # What a client pulls per second of separated audio (all stems)
+                "kbit_per_second": size * 8 / seconds / 1000,
+                "encode_sequential_seconds": sequential,
+                "encode_parallel_seconds": parallel,
+            })
+
+        baseline = next((r["bytes"] for r in results if r["format"] == "wav16"), None)
+        for r in results:
+            ratio = f"{r['bytes'] / baseline:.2f}x" if baseline else "-"
+            print(f"{r['format']:>8} {r['bytes'] / 1024 ** 2:>8.1f}MB {r['kbit_per_second']:>8.0f} {ratio:>9} "
+                  f"{r['encode_sequential_seconds']:>10.3f}s {r['encode_parallel_seconds']:>8.3f}s "
+                  f"{r['encode_sequential_seconds'] / r['encode_parallel_seconds']:>7.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"seconds": seconds, "sample_rate": sr, "stems": len(stems),
+                       "cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare stem output formats: size, bandwidth and encode time")
+    parser.add_argument("--seconds", type=float, default=360, help="length of every stem (default: a 6 minute track)")
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    run(args.seconds, args.sr, args.repeat, args.output)
@@ -0,0 +1,97 @@
+import os
+import json
+import random
+import argparse
+import numpy as np
+from benchmarks.common import synthetic_stereo, timed
+
+# Every inference profile against the old path (fp32 under no_grad): how
+# much faster it is, and how far its stems drift from the fp32 stems.
+# Without the real weights on disk a randomly initialised HTDemucs is used;
+# its timings are representative, its error figures only roughly so.
+
+def load_model(model_name: str, random_weights: bool):
+    from app.services.audio_separator import AudioSeparator
+    if not random_weights:
+        try:
+            return AudioSeparator().load_model(model_name), model_name
+        except Exception as e:
+            print(f"Using random weights: {e}")
+    import torch
+    from demucs.htdemucs import HTDemucs
+    torch.manual_seed(0)
+    return HTDemucs(sources=["drums", "bass", "other", "vocals"]).eval(), "htdemucs (random weights)"
+
+def separate(model, mix, context):
+    from demucs.apply import apply_model
+    # apply_model shifts the input by a random offset; the same offset for
+    # every case keeps the error figures about the profile alone
+    random.seed(0)
+    with context():
+        return apply_model(model, mix, device="cpu").float().numpy()[0]
+
+def stem_error(stems: np.ndarray, reference: np.ndarray):
+    # Worst stem: relative RMS difference, and the same as a signal-to-difference ratio
+    errors = []
+    for stem, expected in zip(stems, reference):
+        difference = np.sqrt(np.mean((stem - expected) ** 2))
+        errors.append(difference / max(np.sqrt(np.mean(expected ** 2)), 1e-12))
+    worst = max(errors)
+    return worst, 20 * np.log10(1 / max(worst, 1e-12))
+
+def run(seconds: float, sr: int, repeat: int, threads: list, model_name: str,
+        random_weights: bool, output: str = None):
+    import torch
+    from app.services.inference import INFERENCE_PROFILES, inference_context, prepare_model
+
+    model, label = load_model(model_name, random_weights)
+    models = {profile: prepare_model(model, profile, "cpu") for profile in INFERENCE_PROFILES}
+    mix = torch.from_numpy(synthetic_stereo(seconds, sr)).unsqueeze(0)
+    results = []
+
+    print(f"{label}, {seconds:.0f}s @ {sr} Hz")
+    print(f"{'threads':>7} {'profile':>14} {'time':>8} {'speedup':>8} {'rel. error':>11} {'SDR vs fp32':>12}")
+    for thread_count in threads:
+        torch.set_num_threads(thread_count)
+        cases = [("fp32 (no_grad)", model, torch.no_grad)] + [
+            (profile, models[profile], lambda profile=profile: inference_context(profile, "cpu"))
+            for profile in INFERENCE_PROFILES
+        ]
+        baseline_seconds = reference = None
+        for name, case_model, context in cases:
+            elapsed, stems = timed(separate, case_model, mix, context, repeat=repeat)
+            if reference is None:
+                baseline_seconds, reference = elapsed, stems
+            error, sdr = stem_error(stems, reference)
+            results.append({
+                "threads": thread_count,
+                "profile": name,
+                "seconds": elapsed,
+                "rtf": elapsed / seconds,
+                "speedup": baseline_seconds / elapsed,
+                "relative_error": float(error),
+                "sdr_db": float(sdr),
+            })
+            sdr_text = "-" if name == cases[0][0] else f"{sdr:.1f} dB"
+            print(f"{thread_count:>7} {name:>14} {elapsed:>7.2f}s {baseline_seconds / elapsed:>7.2f}x "
+                  f"{error:>11.2e} {sdr_text:>12}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"model": label, "seconds": seconds, "sample_rate": sr,
+                       "cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CPU inference profiles: speed and stem error")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--threads", type=int, nargs="+", default=[os.cpu_count() or 1],
+                        help="intra-op thread counts to try (default: all cores)")
+    parser.add_argument("--model", default="htdemucs")
+    parser.add_argument("--random-weights", action="store_true",
+                        help="don't look for the real weights, use a randomly initialised model")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    run(args.seconds, args.sr, args.repeat, args.threads, args.model, args.random_weights, args.output)
@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - start)"
+)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def import_seconds(repeat: int):
+    # Every run gets a fresh interpreter, otherwise modules are already cached
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True
+        )
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return samples
+
+def get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def wait_for(url: str, start: float, deadline: float, status: int = None) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            code, _ = get(url)
+            if status is None or code == status:
+                return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} did not answer in time")
+
+def serve_timings(timeout: float):
+    # Seconds from spawning uvicorn to the first liveness byte and to readiness
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + timeout
+        first_byte = wait_for(f"{base}/health/live", start, deadline)
+        ready = wait_for(f"{base}/health/ready", start, deadline, status=200)
+        _, warmup = get(f"{base}/health/ready")
+        return first_byte, ready, warmup
+    finally:
+        server.terminate()
+        server.wait()
+
+def run(repeat: int, timeout: float, output: str = None):
+    imports = import_seconds(repeat)
+    serves = [serve_timings(timeout) for _ in range(repeat)]
+    results = {
+        "python": sys.version.split()[0],
+        "warmup_load_model": os.getenv("WARMUP_LOAD_MODEL", "true"),
+        "import_app_seconds": statistics.median(imports),
+        "time_to_first_byte_seconds": statistics.median(first_byte for first_byte, _, _ in serves),
+        "time_to_ready_seconds": statistics.median(ready for _, ready, _ in serves),
+        "warmup_seconds": statistics.median(warmup["duration_seconds"] for _, _, warmup in serves),
+    }
+
+    print(f"import app.main       {results['import_app_seconds']:.3f}s")
+    print(f"time to first byte    {results['time_to_first_byte_seconds']:.3f}s")
+    print(f"time to ready         {results['time_to_ready_seconds']:.3f}s")
+    print(f"warm-up (background)  {results['warmup_seconds']:.3f}s")
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time, time to first byte and time to ready")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the median is reported")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for the server")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    run(args.repeat, args.timeout, args.output)
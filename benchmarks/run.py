@@ -0,0 +1,285 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from datetime import datetime
+from benchmarks.common import peak_rss_mb, write_wav
+
+DEFAULT_SECONDS = [10, 60, 300]
+DEFAULT_SAMPLE_RATES = [22050, 44100]
+STEM_NAMES = ["vocals", "drums", "bass", "other"]
+
+class Skip(Exception):
+    pass
+
+STAGES = {}
+
+def stage(name):
+    def register(func):
+        STAGES[name] = func
+        return func
+    return register
+
+def stopwatch(func, *args):
+    peak_before = peak_rss_mb()
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start, peak_before
+
+def write_stems(audio, sr, output_dir):
+    import soundfile as sf
+    stem_files = []
+    for stem_name in STEM_NAMES:
+        stem_file = os.path.join(output_dir, f"{stem_name}.wav")
+        sf.write(stem_file, audio.T, sr)
+        stem_files.append(stem_file)
+    return stem_files
+
+def tiny_demucs_model():
+    # Same interface apply_model expects from a Demucs model, a few weights
+    import torch
+    from torch import nn
+
+    class TinyDemucs(nn.Module):
+        sources = list(STEM_NAMES)
+        samplerate = 44100
+        audio_channels = 2
+        segment = 7.8
+
+        def __init__(self):
+            super().__init__()
+            self.conv = nn.Conv1d(2, 2 * len(self.sources), kernel_size=9, padding=4)
+
+        def forward(self, mix):
+            out = self.conv(mix)
+            return out.view(mix.shape[0], len(self.sources), 2, mix.shape[-1])
+
+    torch.manual_seed(0)
+    return TinyDemucs().eval()
+
+def warm_up_input(sr, workdir):
+    # The first librosa call pays for lazy imports and numba compilation
+    warm_up_dir = os.path.join(workdir, "warm-up")
+    os.makedirs(warm_up_dir)
+    return write_wav(os.path.join(warm_up_dir, "warm-up.wav"), 1, sr), warm_up_dir
+
+def decode_input(path, cache_dir):
+    # What a task pays for its input before separating: on a cache miss the
+    # file is decoded into the PCM cache and read back from there
+    from app.core import config
+    from app.services.decoding import open_audio
+    from app.services.pcm_cache import PcmCache
+    if config.PCM_CACHE_ENABLED:
+        reader = PcmCache(cache_dir, config.PCM_CACHE_MAX_BYTES, config.AUDIO_DECODERS).open("bench", path)
+    else:
+        reader = open_audio(path, config.AUDIO_DECODERS)
+    try:
+        reader.read(dtype='float32', always_2d=True)
+    finally:
+        reader.close()
+
+@stage("decode")
+def bench_decode(path, sr, workdir, options):
+    warm_up_path, warm_up_dir = warm_up_input(sr, workdir)
+    decode_input(warm_up_path, os.path.join(warm_up_dir, "pcm"))
+    return stopwatch(decode_input, path, os.path.join(workdir, "pcm"))
+
+@stage("simple_separation")
+def bench_simple_separation(path, sr, workdir, options):
+    from app.services.audio_separator import AudioSeparator
+    separator = AudioSeparator()
+    separator.simple_separation(*warm_up_input(sr, workdir))
+    return stopwatch(separator.simple_separation, path, workdir)
+
+@stage("simple_separation_vocals")
+def bench_simple_separation_vocals(path, sr, workdir, options):
+    # The common "just the vocals and an instrumental" request
+    from app.services.audio_separator import AudioSeparator
+    separator = AudioSeparator()
+    stems = ["vocals", "instrumental"]
+    separator.simple_separation(*warm_up_input(sr, workdir), None, None, stems)
+    return stopwatch(separator.simple_separation, path, workdir, None, None, stems)
+
+@stage("demucs")
+def bench_demucs(path, sr, workdir, options):
+    from app.core import config
+    from app.services import audio_separator
+    if not audio_separator.DEMUCS_AVAILABLE:
+        raise Skip("demucs is not installed")
+    separator = audio_separator.AudioSeparator()
+    note = None
+    use_stub = options.stub_model
+    if not use_stub:
+        try:
+            separator.registry.get(config.DEFAULT_MODEL)
+        except Exception as e:
+            print(f"Falling back to the stub model: {e}")
+            use_stub = True
+    if use_stub:
+        separator.registry.loader = lambda model_name: tiny_demucs_model()
+        note = "tiny stub model"
+    separator.separate_audio(*warm_up_input(sr, workdir))
+    elapsed, peak_before = stopwatch(separator.separate_audio, path, workdir)
+    return elapsed, peak_before, note
+
+@stage("encode")
+def bench_encode(path, sr, workdir, options):
+    # The four stems in the configured OUTPUT_FORMAT, encoded side by side
+    # the way a finished task writes them
+    import soundfile as sf
+    from app.core import config
+    from app.services.encoding import encode_stems
+    audio, sr = sf.read(path, dtype='float32', always_2d=True)
+    stems = {stem_name: audio for stem_name in STEM_NAMES}
+    elapsed, peak_before = stopwatch(encode_stems, stems, sr, workdir, config.OUTPUT_FORMAT)
+    return elapsed, peak_before, config.OUTPUT_FORMAT
+
+@stage("zip_download")
+def bench_zip_download(path, sr, workdir, options):
+    import soundfile as sf
+    from app.utils.zipstream import stream_zip
+    audio, sr = sf.read(path, dtype='float32', always_2d=True)
+    stem_files = write_stems(audio.T, sr, workdir)
+    del audio
+    entries = [(stem_file, os.path.basename(stem_file)) for stem_file in stem_files]
+
+    def drain():
+        for _ in stream_zip(entries):
+            pass
+    return stopwatch(drain)
+
+@stage("upload")
+def bench_upload(path, sr, workdir, options):
+    # Measure ingestion itself: no cache hit on the repeated input, no
+    # tasks recovered from earlier runs and no job directories left behind
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    os.environ["TASK_STORE"] = "memory"
+    os.environ["STORAGE_DIR"] = os.path.join(workdir, "jobs")
+    from fastapi.testclient import TestClient
+    from app.main import app
+    client = TestClient(app)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    def upload():
+        response = client.post("/upload", files={"file": ("input.wav", data, "audio/wav")})
+        response.raise_for_status()
+    return stopwatch(upload)
+
+def run_case(stage_name, path, seconds, sr, options):
+    # Runs in a fresh interpreter so ru_maxrss only sees this one case
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    result = {"stage": stage_name, "audio_seconds": seconds, "sample_rate": sr}
+    try:
+        outcome = STAGES[stage_name](path, sr, workdir, options)
+        elapsed, peak_before = outcome[:2]
+        peak = peak_rss_mb()
+        result.update({
+            "elapsed_s": round(elapsed, 4),
+            "rtf": round(elapsed / seconds, 5),
+            "peak_rss_mb": round(peak, 1),
+            "stage_rss_mb": round(max(peak - peak_before, 0.0), 1),
+        })
+        if len(outcome) > 2 and outcome[2]:
+            result["note"] = outcome[2]
+    except Skip as e:
+        result["skipped"] = str(e)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def run(seconds_list, sample_rates, stage_names, options):
+    inputs_dir = tempfile.mkdtemp(prefix="bench-inputs-")
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    try:
+        for sr in sample_rates:
+            for seconds in seconds_list:
+                path = write_wav(os.path.join(inputs_dir, f"{seconds}s_{sr}.wav"), seconds, sr)
+                for stage_name in stage_names:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                        result = pool.submit(run_case, stage_name, path, seconds, sr, options).result()
+                    results.append(result)
+                    print(format_result(result), file=sys.stderr)
+    finally:
+        shutil.rmtree(inputs_dir, ignore_errors=True)
+    return results
+
+def format_result(result):
+    label = f"{result['stage']:<18} {result['audio_seconds']:>5}s @ {result['sample_rate']:>5} Hz"
+    if "skipped" in result:
+        return f"{label}  skipped: {result['skipped']}"
+    note = f"  ({result['note']})" if "note" in result else ""
+    return (f"{label}  {result['elapsed_s']:>8.3f}s  rtf {result['rtf']:.4f}  "
+            f"peak {result['peak_rss_mb']:>7.1f} MB  stage +{result['stage_rss_mb']:.1f} MB{note}")
+
+def metadata():
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import torch
+        meta["torch"] = torch.__version__
+        meta["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return meta
+
+def compare(results, baseline, tolerance):
+    # A case regresses when its real-time factor or peak memory grows past the tolerance
+    previous = {
+        (r["stage"], r["audio_seconds"], r["sample_rate"]): r
+        for r in baseline["results"] if "skipped" not in r
+    }
+    regressions = []
+    for result in results:
+        key = (result["stage"], result["audio_seconds"], result["sample_rate"])
+        if "skipped" in result or key not in previous:
+            continue
+        for metric in ("rtf", "peak_rss_mb"):
+            before, after = previous[key][metric], result[metric]
+            if before > 0 and after > before * (1 + tolerance):
+                regressions.append(f"{key[0]} {key[1]}s @ {key[2]} Hz: {metric} {before} -> {after}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage against synthetic audio")
+    parser.add_argument("--seconds", type=float, nargs="+", default=DEFAULT_SECONDS)
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=DEFAULT_SAMPLE_RATES)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--stub-model", action="store_true",
+                        help="use a tiny stand-in instead of the real Demucs weights")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown or memory growth before failing")
+    args = parser.parse_args(argv)
+
+    results = run(args.seconds, args.sample_rates, args.stages, args)
+    report = {"meta": metadata(), "results": results}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import sys
 import os
+import json
 import requests
-import time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QPushButton, QLabel, QLineEdit, QMessageBox,
                             QFileDialog, QProgressBar, QFrame, QGridLayout,
@@ -14,6 +14,7 @@ API_BASE = "http://localhost:8000"
 class ProcessingThread(QThread):
     progress_updated = pyqtSignal(int, str)
     processing_complete = pyqtSignal(dict)
+    processing_cancelled = pyqtSignal()
     error_occurred = pyqtSignal(str)
 
     def __init__(self, file_path):
@@ -34,24 +35,39 @@ class ProcessingThread(QThread):
                 self.task_id = result['task_id']
                 self.progress_updated.emit(5, "Processing started...")
 
-            # Poll for status
-            while True:
-                status_response = requests.get(f"{API_BASE}/status/{self.task_id}")
-                if not status_response.ok:
+            # Listen for status updates pushed by the server
+            with requests.get(f"{API_BASE}/events/{self.task_id}", stream=True) as events:
+                if not events.ok:
                     raise Exception("Failed to get status")
                 
-                status = status_response.json()
-                self.progress_updated.emit(status['progress'], status['status'])
+                for status in self.read_events(events):
+                    self.progress_updated.emit(status['progress'], status['status'])
+                    
+                    if status['status'] == 'completed':
+                        self.processing_complete.emit(status)
+                        return
+                    if status['status'] == 'failed':
+                        raise Exception(status.get('error') or 'Processing failed')
+                    if status['status'] == 'cancelled':
+                        self.processing_cancelled.emit()
+                        return
                 
-                if status['status'] == 'completed':
-                    self.processing_complete.emit(status)
-                    break
-                
-                time.sleep(1)
+                raise Exception("Connection closed before processing finished")
 
         except Exception as e:
             self.error_occurred.emit(str(e))
 
+    @staticmethod
+    def read_events(response):
+        # Minimal Server-Sent Events parser: yields the JSON payload of each event
+        data_lines = []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith('data:'):
+                data_lines.append(line[5:].strip())
+            elif not line and data_lines:
+                yield json.loads("\n".join(data_lines))
+                data_lines = []
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -305,6 +321,7 @@ class MainWindow(QMainWindow):
         self.processing_thread = ProcessingThread(file_path)
         self.processing_thread.progress_updated.connect(self.update_progress)
         self.processing_thread.processing_complete.connect(self.show_results)
+        self.processing_thread.processing_cancelled.connect(self.show_cancelled)
         self.processing_thread.error_occurred.connect(self.show_error)
         self.processing_thread.start()
     
@@ -350,6 +367,10 @@ class MainWindow(QMainWindow):
                 col = 0
                 row += 1
     
+    def show_cancelled(self):
+        QMessageBox.information(self, "Cancelled", "The task was cancelled")
+        self.progress_frame.setVisible(False)
+    
     def show_error(self, error_message):
         QMessageBox.critical(self, "Error", f"An error occurred: {error_message}")
         self.progress_frame.setVisible(False)
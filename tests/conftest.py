@@ -0,0 +1,16 @@
+import os
+import shutil
+import tempfile
+
+# Set before anything imports app.core.config: the module-level task
+# manager, job storage and caches in app.api.routes would otherwise share
+# the server's default locations, and each run would leave tasks behind
+# for the next one to recover
+TEST_ROOT = tempfile.mkdtemp(prefix="stem-separator-tests-")
+os.environ["TASK_DB_PATH"] = os.path.join(TEST_ROOT, "tasks.db")
+os.environ["STORAGE_DIR"] = os.path.join(TEST_ROOT, "jobs")
+os.environ["RESULT_CACHE_DIR"] = os.path.join(TEST_ROOT, "cache")
+os.environ["PCM_CACHE_DIR"] = os.path.join(TEST_ROOT, "pcm")
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
@@ -0,0 +1,88 @@
+import io
+import os
+import zipfile
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.routes import router, storage, task_manager
+
+def wav_bytes(seconds=0.5, sr=8000):
+    # Noise, so no earlier run's result is in the cache
+    buffer = io.BytesIO()
+    sf.write(buffer, np.random.default_rng().uniform(-0.1, 0.1, (int(seconds * sr), 2)).astype(np.float32), sr, format="WAV")
+    return buffer.getvalue()
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router)
+    groups = []
+    client = TestClient(app)
+    client.groups = groups
+    yield client
+    for group_id in groups:
+        for task in task_manager.get_group(group_id):
+            task_manager.cleanup_task(task.task_id)
+            storage.remove(task.job_dir, "cleanup")
+
+def submit(client, **kwargs):
+    response = client.post("/batch", **kwargs)
+    if response.status_code == 200:
+        client.groups.append(response.json()["group_id"])
+    return response
+
+def test_files_are_queued_back_to_back(client):
+    files = [("files", (f"track{i}.wav", wav_bytes(), "audio/wav")) for i in range(3)]
+    body = submit(client, files=files, data={"stems": "vocals"}).json()
+    assert (body["status"], body["progress"], body["counts"]) == ("queued", 0, {"queued": 3})
+    assert [task["filename"] for task in body["tasks"]] == ["track0.wav", "track1.wav", "track2.wav"]
+    positions = [task["queue_position"] for task in body["tasks"]]
+    assert positions == list(range(positions[0], positions[0] + 3))
+    assert client.get(f"/batch/{body['group_id']}").json()["tasks"] == body["tasks"]
+    assert task_manager.get_task(body["tasks"][0]["task_id"]).requested_stems == ["vocals"]
+
+def test_archive(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("album/01 intro.wav", wav_bytes())
+        zf.writestr("album/02 song.wav", wav_bytes())
+        zf.writestr("album/cover.jpg", b"not audio")
+        zf.writestr("__MACOSX/album/._01 intro.wav", b"resource fork")
+    body = submit(client, files={"archive": ("album.zip", archive.getvalue(), "application/zip")}).json()
+    assert [task["filename"] for task in body["tasks"]] == ["01 intro.wav", "02 song.wav"]
+
+def test_bad_track_rejects_the_whole_batch(client):
+    job_dirs = set(os.listdir(storage.root))
+    files = [
+        ("files", ("good.wav", wav_bytes(), "audio/wav")),
+        ("files", ("broken.wav", b"definitely not audio" * 100, "audio/wav")),
+    ]
+    response = submit(client, files=files)
+    assert response.status_code == 400
+    assert "broken.wav" in response.json()["detail"]
+    assert set(os.listdir(storage.root)) == job_dirs
+    assert submit(client, files={"archive": ("album.zip", b"not a zip", "application/zip")}).status_code == 400
+    assert submit(client, data={"stems": "vocals"}).status_code == 400
+
+def test_download(client, tmp_path):
+    files = [("files", (name, wav_bytes(), "audio/wav")) for name in ("song.wav", "song.wav", "flop.wav")]
+    body = submit(client, files=files).json()
+    assert client.get(f"/batch/{body['group_id']}/download").status_code == 400
+    for task_info in body["tasks"]:
+        task = task_manager.get_task(task_info["task_id"])
+        if task_info["filename"] == "flop.wav":
+            assert client.post(f"/cancel/{task.task_id}").status_code == 200
+            continue
+        stem = os.path.join(task.job_dir, "vocals.wav")
+        open(stem, "wb").write(b"stem")
+        # As if a worker had separated it
+        task_manager.cleanup_task(task.task_id)
+        task_manager.store.save(task.model_copy(update={"status": "completed", "progress": 100, "stems": [stem]}))
+
+    status = client.get(f"/batch/{body['group_id']}").json()
+    assert (status["status"], status["progress"], status["counts"]) == ("partial", 100, {"completed": 2, "cancelled": 1})
+    archive = zipfile.ZipFile(io.BytesIO(client.get(f"/batch/{body['group_id']}/download").content))
+    assert archive.namelist() == ["song/vocals.wav", "song (2)/vocals.wav"]
+    assert client.get("/batch/missing").status_code == 404
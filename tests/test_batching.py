@@ -0,0 +1,55 @@
+import time
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from app.services.batching import InferenceBatcher
+
+def make_forward(batch_sizes, delay=0.0):
+    def forward(batch):
+        batch_sizes.append(len(batch))
+        time.sleep(delay)
+        return np.stack([batch * 0.5, batch * 2.0], axis=1)
+    return forward
+
+def test_concurrent_segments_share_a_batch():
+    batch_sizes = []
+    batcher = InferenceBatcher(make_forward(batch_sizes), max_batch_size=4, max_wait_ms=200)
+    segments = [np.full((2, 100 + i), i, dtype=np.float32) for i in range(4)]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(batcher.submit, segments))
+
+    assert batch_sizes == [4]
+    for segment, result in zip(segments, results):
+        # Padding is cut off again, every caller gets exactly its own frames
+        assert result.shape == (2,) + segment.shape
+        np.testing.assert_allclose(result[1], segment * 2.0)
+    assert batcher.stats()["mean_batch_size"] == 4
+
+def test_lone_segment_waits_at_most_the_deadline():
+    batch_sizes = []
+    batcher = InferenceBatcher(make_forward(batch_sizes), max_batch_size=8, max_wait_ms=30)
+
+    start = time.perf_counter()
+    batcher.submit(np.zeros((2, 10), dtype=np.float32))
+
+    assert time.perf_counter() - start < 0.5
+    assert batch_sizes == [1]
+
+def test_batches_never_exceed_max_size():
+    batch_sizes = []
+    batcher = InferenceBatcher(make_forward(batch_sizes, delay=0.01), max_batch_size=3, max_wait_ms=50)
+
+    with ThreadPoolExecutor(max_workers=7) as pool:
+        list(pool.map(batcher.submit, [np.zeros((2, 10), dtype=np.float32)] * 7))
+
+    assert sum(batch_sizes) == 7
+    assert max(batch_sizes) <= 3
+
+def test_forward_errors_reach_every_caller():
+    def forward(batch):
+        raise RuntimeError("model exploded")
+
+    batcher = InferenceBatcher(forward, max_batch_size=2, max_wait_ms=10)
+    with pytest.raises(RuntimeError, match="model exploded"):
+        batcher.submit(np.zeros((2, 10), dtype=np.float32))
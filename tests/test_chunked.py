@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from app.services.chunked import SegmentStitcher, separate_in_chunks
+
+SR = 8000
+
+@pytest.fixture
+def long_input(tmp_path):
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.5, 0.5, size=(SR * 10 + 123, 2)).astype(np.float32)
+    path = str(tmp_path / "input.wav")
+    sf.write(path, audio, SR, subtype='FLOAT')
+    return path, audio
+
+def split_in_half(segment):
+    return np.stack([segment * 0.25, segment * 0.75])
+
+def test_stitcher_crossfade_preserves_consistent_signal():
+    signal = np.arange(30, dtype=np.float32).reshape(1, 1, 30)
+    stitcher = SegmentStitcher(overlap_frames=4)
+    out = [stitcher.push(signal[..., 0:12], False), stitcher.push(signal[..., 8:20], False),
+           stitcher.push(signal[..., 16:30], True)]
+    np.testing.assert_allclose(np.concatenate(out, axis=-1), signal, rtol=1e-6)
+
+def test_chunked_output_matches_whole_file(long_input, tmp_path):
+    path, audio = long_input
+    segment_lengths = []
+
+    def infer(segment):
+        segment_lengths.append(segment.shape[1])
+        return split_in_half(segment)
+
+    stem_files = separate_in_chunks(
+        path, str(tmp_path), ["low", "high"], infer,
+        segment_seconds=1.5, overlap_seconds=0.25
+    )
+
+    assert max(segment_lengths) == int(1.5 * SR)
+    assert len(segment_lengths) > 5
+    for stem_file, gain in zip(stem_files, (0.25, 0.75)):
+        stem, sr = sf.read(stem_file, dtype='float32')
+        assert sr == SR
+        assert stem.shape == audio.shape
+        # Stems are 16-bit PCM like every other path, so compare at that precision
+        np.testing.assert_allclose(stem, audio * gain, atol=1e-4)
+
+def test_chunked_mono_input_is_upmixed(tmp_path):
+    path = str(tmp_path / "mono.wav")
+    sf.write(path, np.full(SR * 2, 0.5, dtype=np.float32), SR, subtype='FLOAT')
+
+    stem_files = separate_in_chunks(
+        path, str(tmp_path), ["low", "high"], split_in_half,
+        segment_seconds=0.5, overlap_seconds=0.1
+    )
+
+    stem, _ = sf.read(stem_files[0], dtype='float32')
+    assert stem.shape == (SR * 2, 2)
+    np.testing.assert_allclose(stem, 0.125, atol=1e-4)
+
+def test_progress_is_reported(long_input, tmp_path):
+    path, _ = long_input
+    updates = []
+    separate_in_chunks(
+        path, str(tmp_path), ["low", "high"], split_in_half,
+        segment_seconds=2, overlap_seconds=0.5, progress=updates.append
+    )
+    assert updates == sorted(updates)
+    assert updates[-1] == 95
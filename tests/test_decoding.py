@@ -0,0 +1,137 @@
+import os
+import sys
+import shutil
+import subprocess
+import numpy as np
+import pytest
+import soundfile as sf
+from app.services import pcm_cache
+from app.services.audio_separator import AudioSeparator
+from app.services.chunked import separate_in_chunks
+from app.services.decoding import DECODERS, PcmReader, open_audio, pick_decoder
+from app.services.pcm_cache import PcmCache
+
+SR = 8000
+ORDER = ["soundfile", "ffmpeg", "librosa"]
+
+@pytest.fixture
+def wav(tmp_path):
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.5, 0.5, size=(SR * 3, 2)).astype(np.float32)
+    path = str(tmp_path / "input.wav")
+    sf.write(path, audio, SR, subtype='FLOAT')
+    return path, audio
+
+@pytest.fixture
+def cache(tmp_path):
+    return PcmCache(str(tmp_path / "pcm"), 1024 ** 3, ORDER)
+
+def test_soundfile_decodes_what_libsndfile_reads(wav, tmp_path):
+    path, audio = wav
+    assert pick_decoder(path, ORDER).name == "soundfile"
+    mp3 = str(tmp_path / "input.mp3")
+    sf.write(mp3, audio, 16000, format="MP3")
+    assert pick_decoder(mp3, ORDER).name == "soundfile"
+
+def test_unknown_decoder_is_rejected(wav):
+    with pytest.raises(ValueError):
+        pick_decoder(wav[0], ["gstreamer"])
+
+def test_decoders_agree(wav):
+    path, audio = wav
+    np.testing.assert_array_equal(DECODERS["soundfile"].decode(path)[0], audio)
+    decoded, sr = DECODERS["librosa"].decode(path)
+    assert sr == SR
+    np.testing.assert_allclose(decoded, audio, atol=1e-6)
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_ffmpeg_pipe(wav):
+    path, audio = wav
+    decoded, sr = DECODERS["ffmpeg"].decode(path)
+    assert sr == SR
+    np.testing.assert_allclose(decoded, audio, atol=1e-6)
+
+@pytest.mark.parametrize("exit_code", [0, 1])
+def test_ffmpeg_warnings_never_stall_the_pipe(monkeypatch, exit_code):
+    # Far more on stderr than a pipe buffer holds, as a damaged MP3 gives
+    script = (
+        "import sys; sys.stderr.write('bad frame\\n' * 50000); sys.stderr.flush(); "
+        f"sys.stdout.buffer.write(bytes(4096)); sys.exit({exit_code})"
+    )
+    decoder = DECODERS["ffmpeg"]
+    monkeypatch.setattr(type(decoder), "stream_info", lambda self, path: (SR, 1))
+    monkeypatch.setattr(
+        type(decoder), "_pipe",
+        lambda self, path, channels, stderr: subprocess.Popen(
+            [sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=stderr
+        )
+    )
+    if exit_code:
+        with pytest.raises(RuntimeError, match="bad frame"):
+            decoder.decode("damaged.mp3")
+    else:
+        decoded, sr = decoder.decode("damaged.mp3")
+        assert decoded.shape == (1024, 1)
+
+def test_pcm_reader_reads_like_a_sound_file(wav):
+    path, audio = wav
+    with open_audio(path, ORDER) as sound_file:
+        reader = PcmReader(audio, SR)
+        while reader.tell() < reader.frames:
+            np.testing.assert_array_equal(
+                reader.read(1000, dtype='float32', always_2d=True),
+                sound_file.read(1000, dtype='float32', always_2d=True)
+            )
+            assert reader.tell() == sound_file.tell()
+
+def test_cache_decodes_once(wav, cache, monkeypatch):
+    path, audio = wav
+    assert cache.get("abc") is None
+    first = cache.open("abc", path)
+    assert isinstance(first.audio, np.memmap)
+    np.testing.assert_array_equal(first.read(), audio)
+
+    def no_decoding(*args):
+        raise AssertionError("decoded a cached file again")
+
+    monkeypatch.setattr(pcm_cache, "pick_decoder", no_decoding)
+    second = cache.open("abc", path)
+    assert second.samplerate == SR
+    np.testing.assert_array_equal(second.read(), audio)
+    assert cache.stats()["hits"] == 2
+
+def test_cache_evicts_least_recently_used(wav, tmp_path):
+    path, audio = wav
+    cache = PcmCache(str(tmp_path / "pcm"), int(audio.nbytes * 2.5), ORDER)
+    for content_hash in ("a", "b", "c"):
+        cache.put(content_hash, path)
+        os.utime(cache._entry_dir(content_hash), (0, {"a": 1, "b": 2, "c": 3}[content_hash]))
+    cache.put("d", path)
+    assert sorted(os.listdir(cache.root)) == ["c", "d"]
+    assert cache.stats()["evictions"] == 2
+
+def test_streaming_from_cache_matches_file(wav, cache, tmp_path):
+    path, _ = wav
+    outputs = []
+    for name, audio in (("file", path), ("cache", cache.open("abc", path))):
+        output_dir = tmp_path / name
+        os.makedirs(output_dir)
+        stem_files = separate_in_chunks(
+            audio, str(output_dir), ["low", "high"], lambda segment: np.stack([segment * 0.25, segment * 0.75]),
+            segment_seconds=0.5, overlap_seconds=0.1
+        )
+        outputs.append([sf.read(stem_file)[0] for stem_file in stem_files])
+    for from_file, from_cache in zip(*outputs):
+        np.testing.assert_array_equal(from_file, from_cache)
+
+def test_separator_reuses_decoded_audio(wav, cache, tmp_path, monkeypatch):
+    path, _ = wav
+    separator = AudioSeparator()
+    separator.pcm_cache = cache
+    os.makedirs(tmp_path / "first")
+    os.makedirs(tmp_path / "second")
+    separator.simple_separation(path, str(tmp_path / "first"), stems=["vocals"], content_hash="abc")
+
+    monkeypatch.setattr(pcm_cache, "pick_decoder", lambda *args: pytest.fail("decoded twice"))
+    stem_files = separator.simple_separation(path, str(tmp_path / "second"), stems=["bass"], content_hash="abc")
+    assert [os.path.basename(stem) for stem in stem_files] == ["bass.wav"]
@@ -94,4 +94,34 @@ def test_window_center(main_window):
 
 def test_stems_grid_initialization(main_window):
     assert hasattr(main_window, 'stems_grid')
-    assert main_window.stems_grid.count() == 0 
\ No newline at end of file
+    assert main_window.stems_grid.count() == 0 
+
+
+def test_cancelled_task_is_not_an_error(test_audio_file, monkeypatch):
+    class FakeResponse:
+        ok = True
+
+        def json(self):
+            return {"task_id": "a"}
+
+        def iter_lines(self, decode_unicode=False):
+            yield 'data: {"status": "queued", "progress": 0}'
+            yield ''
+            yield 'data: {"status": "cancelled", "progress": 0}'
+            yield ''
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+    monkeypatch.setattr("desktop.requests.post", lambda *args, **kwargs: FakeResponse())
+    monkeypatch.setattr("desktop.requests.get", lambda *args, **kwargs: FakeResponse())
+    thread = ProcessingThread(test_audio_file)
+    cancelled, errors = [], []
+    thread.processing_cancelled.connect(lambda: cancelled.append(True))
+    thread.error_occurred.connect(errors.append)
+    thread.run()
+    assert cancelled == [True]
+    assert errors == []
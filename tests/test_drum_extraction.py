@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from app.core import config
+from app.services.audio_separator import AudioSeparator, onset_mask
+
+SR = 22050
+
+@pytest.fixture
+def separator():
+    return AudioSeparator()
+
+@pytest.fixture
+def clicks():
+    # Sharp noise bursts every half second over a low tone
+    rng = np.random.default_rng(1)
+    t = np.arange(SR * 4) / SR
+    audio = 0.1 * np.sin(2 * np.pi * 110 * t)
+    for start in range(0, len(t), SR // 2):
+        burst = rng.standard_normal(800) * np.exp(-np.linspace(0, 6, 800))
+        audio[start:start + 800] += burst[:len(audio) - start]
+    return np.stack([audio, audio]).astype(np.float32)
+
+def test_onset_mask_gates_the_same_regions_as_the_hard_mask():
+    onsets = np.array([5000, 6000, 20000])
+    mask = onset_mask(onsets, 30000)
+
+    hard = np.zeros(30000)
+    for sample in onsets:
+        hard[max(0, sample - 1024):sample + 1024] = 1
+
+    np.testing.assert_array_equal(mask > 0, hard > 0)
+    # Overlapping windows merge into one region that is fully open inside
+    assert mask[5000:6000].min() == 1.0
+    assert mask.max() == 1.0
+
+def test_onset_mask_edges_are_smooth():
+    mask = onset_mask(np.array([10000]), 20000, width=2048, fade=256)
+    edge = mask[10000 - 1024:10000 - 1024 + 256]
+    assert np.all(np.diff(edge) > 0)
+    assert edge[0] < 0.01
+    assert np.max(np.abs(np.diff(mask))) < 0.02
+
+def test_onset_mask_handles_edges_and_no_onsets():
+    assert not onset_mask(np.array([], dtype=np.int64), 1000).any()
+    mask = onset_mask(np.array([0, 999]), 1000, width=256, fade=32)
+    assert mask.shape == (1000,)
+    assert mask[50] == 1.0
+    assert mask[500] == 0.0
+
+def test_drum_modes_return_full_length_mono(separator, clicks, monkeypatch):
+    for mode in ("onset", "hpss"):
+        monkeypatch.setattr(config, "DRUM_EXTRACTION_MODE", mode)
+        drums = separator.extract_drums(clicks, SR)
+        assert drums.shape == (clicks.shape[1],)
+        assert np.isfinite(drums).all()
+
+def test_hpss_keeps_clicks_and_drops_the_tone(separator, clicks):
+    percussive = separator.extract_percussive(clicks, SR)
+    burst_energy = np.sum(percussive[:800] ** 2)
+    tone_energy = np.sum(percussive[SR // 4:SR // 4 + 800] ** 2)
+    assert burst_energy > 10 * tone_energy
@@ -0,0 +1,95 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+from app.services.chunked import separate_in_chunks
+from app.services.encoding import (
+    ENCODE_BLOCK_FRAMES, available_formats, encode_stems, media_type_for, resample, resample_blocks
+)
+
+SR = 44100
+
+def tone(seconds, sr=SR, frequency=440.0):
+    t = np.arange(int(seconds * sr)) / sr
+    mono = (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    return np.stack([mono, mono * 0.5], axis=1)
+
+def stems_of(audio):
+    return {"vocals": audio, "drums": audio * 0.5, "bass": audio * 0.25, "other": audio * 0.125}
+
+def skip_unless_available(format_name):
+    if format_name not in available_formats():
+        pytest.skip(f"libsndfile was built without {format_name}")
+
+@pytest.mark.parametrize("format_name", ["wav16", "wav24", "flac"])
+def test_lossless_formats_round_trip(tmp_path, format_name):
+    audio = tone(1)
+    paths = encode_stems(stems_of(audio), SR, str(tmp_path), format_name)
+    assert [os.path.basename(path).split(".")[0] for path in paths] == ["vocals", "drums", "bass", "other"]
+    decoded, sr = sf.read(paths[0], dtype="float32")
+    assert sr == SR
+    np.testing.assert_allclose(decoded, audio, atol=1e-4)
+
+@pytest.mark.parametrize("format_name", ["ogg", "opus"])
+def test_compressed_formats_are_smaller(tmp_path, format_name):
+    skip_unless_available(format_name)
+    audio = tone(2)
+    os.makedirs(tmp_path / "wav")
+    wav = encode_stems({"vocals": audio}, SR, str(tmp_path / "wav"), "wav16")
+    compressed = encode_stems({"vocals": audio}, SR, str(tmp_path), format_name)
+    assert os.path.getsize(compressed[0]) < os.path.getsize(wav[0]) / 4
+    assert media_type_for(compressed[0]) == "audio/ogg"
+
+def test_opus_is_resampled_to_a_supported_rate(tmp_path):
+    skip_unless_available("opus")
+    paths = encode_stems({"vocals": tone(1)}, SR, str(tmp_path), "opus")
+    info = sf.info(paths[0])
+    assert info.samplerate == 48000
+    assert abs(info.duration - 1.0) < 0.05
+
+def test_parallel_encoding_matches_sequential(tmp_path):
+    stems = stems_of(tone(1))
+    os.makedirs(tmp_path / "sequential")
+    os.makedirs(tmp_path / "parallel")
+    sequential = encode_stems(stems, SR, str(tmp_path / "sequential"), "flac", max_workers=1)
+    parallel = encode_stems(stems, SR, str(tmp_path / "parallel"), "flac", max_workers=4)
+    for a, b in zip(sequential, parallel):
+        assert open(a, "rb").read() == open(b, "rb").read()
+
+def test_long_vorbis_stem_is_written_in_blocks(tmp_path):
+    skip_unless_available("ogg")
+    # A single write of this size overflows libsndfile's Vorbis encoder
+    audio = tone(4 * ENCODE_BLOCK_FRAMES / 8000, sr=8000)
+    paths = encode_stems({"vocals": audio}, 8000, str(tmp_path), "ogg")
+    assert sf.info(paths[0]).frames == len(audio)
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        encode_stems({"vocals": tone(0.1)}, SR, str(tmp_path), "mp3")
+
+def test_chunked_separation_transcodes_to_opus(tmp_path):
+    skip_unless_available("opus")
+    path = str(tmp_path / "input.wav")
+    sf.write(path, tone(3), SR)
+    output_dir = tmp_path / "stems"
+    os.makedirs(output_dir)
+
+    stem_files = separate_in_chunks(
+        path, str(output_dir), ["low", "high"], lambda segment: np.stack([segment * 0.5, segment * 0.5]),
+        segment_seconds=1.0, overlap_seconds=0.25, format_name="opus"
+    )
+
+    assert [os.path.basename(stem) for stem in stem_files] == ["low.opus", "high.opus"]
+    # The lossless intermediates are gone
+    assert sorted(os.listdir(output_dir)) == ["high.opus", "low.opus"]
+    assert sf.info(stem_files[0]).samplerate == 48000
+
+@pytest.mark.parametrize("sr, target_sr", [(44100, 48000), (22050, 48000), (48000, 24000)])
+def test_block_resampling_matches_whole_file(tmp_path, sr, target_sr):
+    path = str(tmp_path / "stem.wav")
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, (sr + 1234, 2)).astype(np.float32)
+    sf.write(path, audio, sr, subtype="FLOAT")
+    with sf.SoundFile(path) as source:
+        blocks = list(resample_blocks(source, sr, target_sr, block_frames=5000))
+    assert len(blocks) > 1
+    assert np.allclose(np.concatenate(blocks), resample(audio, sr, target_sr), atol=1e-5)
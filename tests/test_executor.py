@@ -0,0 +1,78 @@
+import pytest
+import asyncio
+import threading
+import time
+from app.core.executor import (
+    ThreadSeparationExecutor,
+    ProcessSeparationExecutor,
+    create_executor,
+)
+
+def slow_job(duration, progress=None):
+    for value in (25, 50, 100):
+        time.sleep(duration / 3)
+        if progress:
+            progress(value)
+    return threading.current_thread().name
+
+def failing_job(progress=None):
+    raise RuntimeError("boom")
+
+def test_create_executor_backends():
+    assert isinstance(create_executor("thread", 1), ThreadSeparationExecutor)
+    assert isinstance(create_executor("process", 1), ProcessSeparationExecutor)
+    with pytest.raises(ValueError):
+        create_executor("gpu-cluster", 1)
+
+@pytest.mark.asyncio
+async def test_thread_executor_keeps_loop_responsive():
+    executor = ThreadSeparationExecutor(max_workers=2)
+    updates = []
+    try:
+        job = asyncio.create_task(executor.run(slow_job, 0.3, progress=updates.append))
+
+        # The loop must keep ticking while the job blocks a worker thread
+        ticks = 0
+        while not job.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+        assert ticks > 10
+        assert job.result().startswith("separator")
+        assert updates == [25, 50, 100]
+    finally:
+        executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_thread_executor_runs_jobs_in_parallel():
+    executor = ThreadSeparationExecutor(max_workers=2)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(executor.run(slow_job, 0.3), executor.run(slow_job, 0.3))
+        assert time.perf_counter() - start < 0.55
+    finally:
+        executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_thread_executor_propagates_errors():
+    executor = ThreadSeparationExecutor(max_workers=1)
+    try:
+        with pytest.raises(RuntimeError, match="boom"):
+            await executor.run(failing_job)
+    finally:
+        executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_process_executor_reports_progress():
+    executor = ProcessSeparationExecutor(max_workers=1)
+    updates = []
+    try:
+        await executor.run(slow_job, 0.3, progress=updates.append)
+        # Progress crosses a process boundary, give the pump a moment
+        for _ in range(50):
+            if len(updates) == 3:
+                break
+            await asyncio.sleep(0.02)
+        assert updates == [25, 50, 100]
+    finally:
+        executor.shutdown()
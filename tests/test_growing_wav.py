@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.models.task import SeparationTask
+from app.utils.growing_wav import UNKNOWN_SIZE, follow_wav, streaming_header, wav_layout
+
+SR = 8000
+
+def samples(frames, offset=0):
+    ramp = (np.arange(offset, offset + frames) % 1000).astype(np.float32) / 2000
+    return np.stack([ramp, -ramp], axis=1)
+
+def decode(body):
+    # The streamed header is 44 bytes, like libsndfile's for 16 bit PCM
+    return np.frombuffer(body[44:], dtype="<i2").reshape(-1, 2)
+
+async def collect(stream):
+    return b"".join([chunk async for chunk in stream])
+
+def test_layout_follows_the_writer(tmp_path):
+    path = str(tmp_path / "vocals.wav")
+    writer = sf.SoundFile(path, "w", samplerate=SR, channels=2, format="WAV", subtype="PCM_16")
+    writer.write(samples(100))
+    fmt_chunk, data_offset, data_size = wav_layout(open(path, "rb").read())
+    assert (fmt_chunk[:4], data_offset, data_size) == (b"fmt ", 44, 0)
+    writer.close()
+    assert wav_layout(open(path, "rb").read())[2] == 400
+    assert wav_layout(b"RIFF\x00\x00") is None
+
+def test_streaming_header_has_no_length(tmp_path):
+    path = str(tmp_path / "vocals.wav")
+    sf.write(path, samples(10), SR, subtype="PCM_16")
+    header = streaming_header(wav_layout(open(path, "rb").read())[0])
+    assert wav_layout(header)[1:] == (44, UNKNOWN_SIZE)
+
+@pytest.mark.asyncio
+async def test_follow_reads_segments_as_they_are_written(tmp_path):
+    path = str(tmp_path / "vocals.wav")
+    writer = sf.SoundFile(path, "w", samplerate=SR, channels=2, format="WAV", subtype="PCM_16")
+    written = threading.Event()
+
+    def render():
+        for segment in range(4):
+            writer.write(samples(SR, offset=segment * SR))
+            written.set()
+            threading.Event().wait(0.05)
+        writer.close()
+
+    stream = follow_wav(path, lambda: False, poll_seconds=0.01)
+    thread = threading.Thread(target=render)
+    thread.start()
+    try:
+        body = await asyncio.wait_for(collect(stream), timeout=5)
+    finally:
+        thread.join()
+    assert np.array_equal(decode(body), sf.read(path, dtype="int16")[0])
+    assert len(decode(body)) == 4 * SR
+
+@pytest.mark.asyncio
+async def test_follow_stops_when_the_job_is_gone(tmp_path):
+    path = str(tmp_path / "vocals.wav")
+    writer = sf.SoundFile(path, "w", samplerate=SR, channels=2, format="WAV", subtype="PCM_16")
+    writer.write(samples(SR))
+    try:
+        # Never closed, as when the job failed halfway
+        body = await asyncio.wait_for(collect(follow_wav(path, lambda: True, poll_seconds=0.01)), timeout=5)
+    finally:
+        writer.close()
+    assert len(decode(body)) == SR
+
+def test_stream_endpoint(tmp_path):
+    from app.api.routes import router, task_manager
+    stems_dir = tmp_path / "stems"
+    stems_dir.mkdir()
+    sf.write(str(stems_dir / "vocals.wav"), samples(SR), SR, subtype="PCM_16")
+    task_manager.store.save(SeparationTask(
+        task_id="rendering", status="processing", progress=50, job_dir=str(tmp_path), requested_stems=["vocals"]
+    ))
+    task_manager.store.save(SeparationTask(
+        task_id="rendered", status="completed", progress=100, stems=[str(stems_dir / "vocals.wav")]
+    ))
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    try:
+        response = client.get("/stream/rendering/vocals")
+        assert response.headers["content-type"] == "audio/wav"
+        assert len(decode(response.content)) == SR
+        assert client.get("/stream/rendering/drums").status_code == 404
+        # Finished tasks are served like a download
+        response = client.get("/stream/rendered/vocals")
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.content == (stems_dir / "vocals.wav").read_bytes()
+    finally:
+        task_manager.cleanup_task("rendering")
+        task_manager.cleanup_task("rendered")
@@ -0,0 +1,89 @@
+import os
+import pytest
+from email.utils import formatdate
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.utils.http_files import RangeNotSatisfiable, file_response, parse_range
+
+DATA = bytes(range(256)) * 1000
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / "vocals.wav")
+    with open(path, "wb") as f:
+        f.write(DATA)
+    app = FastAPI()
+
+    @app.get("/stem")
+    async def stem(request: Request):
+        return await file_response(request, path, "audio/wav", "vocals.wav")
+
+    client = TestClient(app)
+    client.path = path
+    return client
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=-5000", 1000) == (0, 999)
+    assert parse_range("bytes=990-5000", 1000) == (990, 999)
+    # Ignored, the whole file is sent
+    assert parse_range("bytes=0-1,5-6", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+    assert parse_range("bytes=5-2", 1000) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=1000-", 1000)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=-0", 1000)
+
+def test_full_download_has_validators(client):
+    response = client.get("/stem")
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"].startswith('"') and len(response.headers["etag"]) == 34
+    assert "max-age" in response.headers["cache-control"]
+
+def test_etag_follows_content(client):
+    etag = client.get("/stem").headers["etag"]
+    assert client.get("/stem").headers["etag"] == etag
+    with open(client.path, "r+b") as f:
+        f.write(b"changed")
+    os.utime(client.path, ns=(0, 10 ** 9))
+    assert client.get("/stem").headers["etag"] != etag
+
+def test_range_request(client):
+    response = client.get("/stem", headers={"Range": "bytes=1000-1999"})
+    assert response.status_code == 206
+    assert response.content == DATA[1000:2000]
+    assert response.headers["content-range"] == f"bytes 1000-1999/{len(DATA)}"
+    assert response.headers["content-length"] == "1000"
+
+def test_resume_from_offset(client):
+    response = client.get("/stem", headers={"Range": f"bytes={len(DATA) - 300}-"})
+    assert response.status_code == 206
+    assert response.content == DATA[-300:]
+
+def test_unsatisfiable_range(client):
+    response = client.get("/stem", headers={"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+def test_if_none_match(client):
+    etag = client.get("/stem").headers["etag"]
+    response = client.get("/stem", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/stem", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_if_range(client):
+    etag = client.get("/stem").headers["etag"]
+    ranged = {"Range": "bytes=0-9"}
+    assert client.get("/stem", headers={**ranged, "If-Range": etag}).status_code == 206
+    # The file changed since the client's partial download: start over
+    stale = client.get("/stem", headers={**ranged, "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.content == DATA
+    assert client.get("/stem", headers={**ranged, "If-Range": f"W/{etag}"}).status_code == 200
+    last_modified = formatdate(os.stat(client.path).st_mtime, usegmt=True)
+    assert client.get("/stem", headers={**ranged, "If-Range": last_modified}).status_code == 206
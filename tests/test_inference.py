@@ -0,0 +1,58 @@
+import pytest
+import torch
+from app.services import audio_separator, inference
+from app.services.audio_separator import AudioSeparator
+from app.services.inference import (
+    default_torch_threads, inference_context, model_key, prepare_model, split_model_key
+)
+
+def tiny_model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Linear(16, 32), torch.nn.ReLU(), torch.nn.Linear(32, 4)).eval()
+
+def test_only_int8_gets_its_own_model():
+    assert model_key("htdemucs", "fp32") == model_key("htdemucs", "bf16") == "htdemucs"
+    assert split_model_key(model_key("htdemucs", "int8")) == ("htdemucs", "int8")
+    assert split_model_key("htdemucs") == ("htdemucs", "fp32")
+
+def test_concurrent_jobs_split_the_cores(monkeypatch):
+    monkeypatch.setattr(inference.os, "cpu_count", lambda: 8)
+    assert default_torch_threads(2) == 4
+    assert default_torch_threads(16) == 1
+
+def test_threads_are_configured_once(monkeypatch):
+    monkeypatch.setattr(inference, "_threads_configured", False)
+    threads = torch.get_num_threads()
+    assert inference.configure_threads(threads)
+    assert not inference.configure_threads(threads + 1)
+    assert torch.get_num_threads() == threads
+
+def test_int8_quantizes_linear_layers():
+    model = tiny_model()
+    quantized = prepare_model(model, "int8", "cpu")
+    assert quantized is not model
+    assert type(quantized[0]) is not torch.nn.Linear
+    x = torch.randn(8, 16)
+    with inference_context("int8", "cpu"):
+        torch.testing.assert_close(quantized(x), model(x), atol=0.05, rtol=0.1)
+    assert prepare_model(model, "bf16", "cpu") is model
+
+def test_int8_is_cpu_only():
+    with pytest.raises(ValueError):
+        prepare_model(tiny_model(), "int8", "cuda")
+
+def test_inference_context():
+    model = tiny_model()
+    x = torch.randn(8, 16)
+    with inference_context("fp32", "cpu"):
+        out = model(x)
+        assert torch.is_inference_mode_enabled()
+    assert out.dtype == torch.float32 and not out.requires_grad
+    with inference_context("bf16", "cpu"):
+        assert model(x).dtype == torch.bfloat16
+
+def test_cache_signature_depends_on_profile(monkeypatch):
+    monkeypatch.setattr(audio_separator, "DEMUCS_AVAILABLE", True)
+    separator = AudioSeparator()
+    assert separator.cache_signature("htdemucs", "wav16", profile="fp32") == {"format": "wav16", "model": "htdemucs"}
+    assert separator.cache_signature("htdemucs", "wav16", profile="int8")["profile"] == "int8"
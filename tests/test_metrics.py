@@ -0,0 +1,98 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import metrics
+from app.core.metrics import Counter, Histogram, Registry, stage_timer
+from app.core.task_manager import TaskManager
+from app.core.task_store import SqliteTaskStore
+from app.models.task import SeparationTask
+from app.services.audio_separator import AudioSeparator
+from app.worker import run_job
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(Histogram("job_seconds", "Job time", labels=("stage",), buckets=(1, 5)))
+    for value in (0.5, 1, 3, 60):
+        histogram.observe(value, stage="decode")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP job_seconds Job time", "# TYPE job_seconds histogram"]
+    assert lines[2:] == [
+        'job_seconds_bucket{stage="decode",le="1"} 2',
+        'job_seconds_bucket{stage="decode",le="5"} 3',
+        'job_seconds_bucket{stage="decode",le="+Inf"} 4',
+        'job_seconds_sum{stage="decode"} 64.5',
+        'job_seconds_count{stage="decode"} 4',
+    ]
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.register(Counter("errors_total", "Errors", labels=("message",))).inc(message='bad "file"\n\\x')
+    assert 'errors_total{message="bad \\"file\\"\\n\\\\x"} 1' in registry.render()
+
+def test_stage_timer_accumulates():
+    timings = {}
+    for _ in range(2):
+        with stage_timer(timings, "decode"):
+            time.sleep(0.01)
+    assert list(timings) == ["decode"] and timings["decode"] >= 0.02
+    with stage_timer(None, "decode"):
+        pass
+
+def test_observe_task():
+    before = metrics.STAGE_SECONDS.count(stage="encode"), metrics.REAL_TIME_FACTOR.count()
+    created = datetime(2024, 1, 1)
+    metrics.observe_task(SeparationTask(
+        task_id="a", status="completed", progress=100, duration=10.0, created_at=created,
+        started_at=created + timedelta(seconds=2), completed_at=created + timedelta(seconds=7),
+        timings={"decode": 0.5, "inference": 4.0, "encode": 0.5}
+    ))
+    assert metrics.STAGE_SECONDS.count(stage="encode") == before[0] + 1
+    assert metrics.REAL_TIME_FACTOR.count() == before[1] + 1
+
+def test_separation_records_stage_timings(tmp_path):
+    input_path = str(tmp_path / "input.wav")
+    sf.write(input_path, np.random.default_rng(0).uniform(-0.5, 0.5, (22050, 2)), 22050)
+    timings = {}
+    AudioSeparator().simple_separation(input_path, str(tmp_path), stems=["vocals"], timings=timings)
+    assert sorted(timings) == ["decode", "encode", "inference"]
+
+@pytest.mark.asyncio
+async def test_api_observes_tasks_finished_by_workers(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    api = TaskManager(store=SqliteTaskStore(db_path), run_jobs=False)
+    worker_store = SqliteTaskStore(db_path)
+    input_path = str(tmp_path / "input.wav")
+    sf.write(input_path, np.zeros((22050, 2), dtype=np.float32), 22050)
+    before = metrics.TASKS_FINISHED.value(status="completed")
+    watcher = asyncio.create_task(api.watch_store(0.01))
+    try:
+        api.add_task("a", input_path)
+        run_job(worker_store, worker_store.claim_next("worker-1"), "worker-1")
+        assert set(api.get_task("a").timings) >= {"decode", "encode"}
+        for _ in range(100):
+            if metrics.TASKS_FINISHED.value(status="completed") > before:
+                break
+            await asyncio.sleep(0.01)
+        assert metrics.TASKS_FINISHED.value(status="completed") == before + 1
+    finally:
+        watcher.cancel()
+        worker_store.close()
+        api.shutdown()
+
+def test_metrics_endpoint():
+    from app.api.routes import router
+    app = FastAPI()
+    app.include_router(router)
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    for name in ("stem_separator_tasks", "stem_separator_active_tasks", "process_resident_memory_bytes"):
+        assert f"# TYPE {name} gauge" in body
+    assert 'stem_separator_tasks{status="queued"}' in body
+    assert "# TYPE stem_separator_stage_seconds histogram" in body
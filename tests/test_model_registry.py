@@ -0,0 +1,88 @@
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from torch import nn
+from app.services.model_registry import ModelRegistry, model_footprint
+
+SIZES = {"htdemucs": 400, "htdemucs_ft": 500, "htdemucs_6s": 300, "mdx_extra": 700}
+
+def make_loader(loaded, delay=0.0):
+    def loader(name):
+        loaded.append(name)
+        time.sleep(delay)
+        return name
+    return loader
+
+def make_registry(loaded, budget, delay=0.0):
+    return ModelRegistry(make_loader(loaded, delay), budget, footprint=SIZES.__getitem__)
+
+def test_footprint_counts_parameters_and_buffers():
+    model = nn.BatchNorm1d(10)
+    # weight + bias + running mean + running var are float32, the counter is int64
+    assert model_footprint(model) == 4 * 10 * 4 + 8
+
+def test_loads_lazily_and_once():
+    loaded = []
+    registry = make_registry(loaded, budget=1000)
+    assert loaded == []
+
+    assert registry.get("htdemucs") == "htdemucs"
+    assert registry.get("htdemucs") == "htdemucs"
+    assert loaded == ["htdemucs"]
+    assert registry.stats()["resident_bytes"] == 400
+
+def test_evicts_least_recently_used_over_budget():
+    loaded = []
+    registry = make_registry(loaded, budget=1000)
+    registry.get("htdemucs")
+    registry.get("htdemucs_6s")
+    registry.get("htdemucs")
+
+    # 400 + 300 + 500 does not fit, htdemucs_6s was used longest ago
+    registry.get("htdemucs_ft")
+    assert [entry["name"] for entry in registry.loaded()] == ["htdemucs", "htdemucs_ft"]
+    assert registry.stats()["evictions"] == 1
+
+    registry.get("htdemucs_6s")
+    assert loaded == ["htdemucs", "htdemucs_6s", "htdemucs_ft", "htdemucs_6s"]
+
+def test_model_larger_than_budget_still_loads_alone():
+    registry = make_registry([], budget=600)
+    registry.get("htdemucs")
+    assert registry.get("mdx_extra") == "mdx_extra"
+    assert [entry["name"] for entry in registry.loaded()] == ["mdx_extra"]
+
+def test_concurrent_requests_share_one_load():
+    loaded = []
+    registry = make_registry(loaded, budget=1000, delay=0.05)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(registry.get, ["htdemucs"] * 4))
+    assert results == ["htdemucs"] * 4
+    assert loaded == ["htdemucs"]
+
+def test_failed_load_is_retried():
+    attempts = []
+
+    def loader(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise RuntimeError("checkpoint missing")
+        return name
+
+    registry = ModelRegistry(loader, 1000, footprint=SIZES.__getitem__)
+    try:
+        registry.get("htdemucs")
+    except RuntimeError:
+        pass
+    assert registry.loaded() == []
+    assert registry.get("htdemucs") == "htdemucs"
+
+def test_failed_load_leaves_no_lock_behind():
+    def loader(name):
+        raise RuntimeError("checkpoint missing")
+
+    registry = ModelRegistry(loader, 1000, footprint=SIZES.__getitem__)
+    for name in ("typo", "other-typo"):
+        with pytest.raises(RuntimeError):
+            registry.get(name)
+    assert registry._loading == {}
@@ -0,0 +1,33 @@
+import numpy as np
+import soundfile as sf
+from app.services.audio_separator import AudioSeparator, loudest_window
+from app.services.decoding import PcmReader
+
+SR = 8000
+
+def track(loud_from, loud_to, seconds=60):
+    audio = np.full((seconds * SR, 2), 0.01, dtype=np.float32)
+    audio[loud_from * SR:loud_to * SR] = 0.5
+    return audio
+
+def test_loudest_window():
+    assert loudest_window(PcmReader(track(40, 50), SR), 10) == 40.0
+    # Any window holding the whole loud stretch will do
+    assert 28 <= loudest_window(PcmReader(track(35, 38), SR), 10) <= 35
+
+def test_short_track_starts_at_zero():
+    assert loudest_window(PcmReader(track(5, 6, seconds=8), SR), 10) == 0.0
+
+def test_excerpt_is_all_that_gets_separated(tmp_path):
+    input_path = str(tmp_path / "song.wav")
+    sf.write(input_path, track(40, 50), SR)
+    separator = AudioSeparator()
+    start = separator.find_excerpt(input_path, 10)
+    assert start == 40.0
+
+    stems = separator.simple_separation(
+        input_path, str(tmp_path), None, "wav16", ["vocals"], excerpt=(start, 10)
+    )
+    audio, sr = sf.read(stems[0])
+    assert sr == SR
+    assert len(audio) == 10 * SR
@@ -0,0 +1,97 @@
+import io
+import os
+import zipfile
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.task_manager import TaskManager
+from app.core.task_store import SqliteTaskStore
+from app.models.task import SeparationTask
+from app.services.profiling import capture, profile_files
+from app.worker import run_job
+
+def busy_work():
+    return sum(i * i for i in range(20000))
+
+def test_no_profile_dir_is_a_no_op(tmp_path):
+    with capture(None, torch_trace=True):
+        busy_work()
+    assert profile_files(None) is None
+    assert profile_files(str(tmp_path / "missing")) is None
+
+def test_cprofile_output(tmp_path):
+    profile_dir = str(tmp_path / "profile")
+    with capture(profile_dir):
+        busy_work()
+    assert [os.path.basename(path) for path in profile_files(profile_dir)] == ["cprofile.prof", "cprofile.txt"]
+    assert "busy_work" in open(os.path.join(profile_dir, "cprofile.txt")).read()
+
+def test_profile_is_written_when_the_job_fails(tmp_path):
+    profile_dir = str(tmp_path / "profile")
+    with pytest.raises(RuntimeError):
+        with capture(profile_dir):
+            busy_work()
+            raise RuntimeError("separation failed")
+    assert os.path.getsize(os.path.join(profile_dir, "cprofile.prof")) > 0
+
+def test_torch_trace(tmp_path):
+    torch = pytest.importorskip("torch")
+    profile_dir = str(tmp_path / "profile")
+    with capture(profile_dir, torch_trace=True):
+        torch.nn.functional.conv1d(torch.randn(1, 2, 4096), torch.randn(4, 2, 16))
+    names = [os.path.basename(path) for path in profile_files(profile_dir)]
+    assert names == ["cprofile.prof", "cprofile.txt", "torch_ops.txt", "torch_trace.json.gz"]
+    assert "conv1d" in open(os.path.join(profile_dir, "torch_ops.txt")).read()
+
+def test_worker_profiles_requested_tasks(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    api = TaskManager(store=SqliteTaskStore(db_path), run_jobs=False)
+    worker_store = SqliteTaskStore(db_path)
+    try:
+        input_path = str(tmp_path / "input.wav")
+        sf.write(input_path, np.zeros((22050, 2), dtype=np.float32), 22050)
+        api.add_task("a", input_path, capture_profile=True)
+        api.add_task("b", input_path)
+        for _ in range(2):
+            run_job(worker_store, worker_store.claim_next("worker-1"), "worker-1")
+        assert "cprofile.prof" in [os.path.basename(path) for path in api.get_task("a").profile_files]
+        assert api.get_task("b").profile_files is None
+    finally:
+        worker_store.close()
+        api.shutdown()
+
+def test_profile_download(tmp_path):
+    from app.api.routes import router, task_manager
+    profile_dir = str(tmp_path / "profile")
+    with capture(profile_dir):
+        busy_work()
+    task_manager.store.save(SeparationTask(
+        task_id="profiled", status="completed", progress=100, profile_files=profile_files(profile_dir)
+    ))
+    task_manager.store.save(SeparationTask(task_id="plain", status="completed", progress=100))
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    try:
+        response = client.get("/profile/profiled")
+        assert response.status_code == 200
+        assert zipfile.ZipFile(io.BytesIO(response.content)).namelist() == ["cprofile.prof", "cprofile.txt"]
+        assert client.get("/profile/plain").status_code == 404
+    finally:
+        task_manager.cleanup_task("profiled")
+        task_manager.cleanup_task("plain")
+
+def test_overlapping_captures_share_cprofile(tmp_path):
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    with capture(first):
+        with capture(second):
+            busy_work()
+    assert "encoder pool" in open(os.path.join(first, "cprofile.txt")).read()
+    assert [os.path.basename(path) for path in profile_files(second)] == ["cprofile.txt"]
+    assert "skipped" in open(os.path.join(second, "cprofile.txt")).read()
+    # Released again once the first one is done
+    with capture(second):
+        busy_work()
+    assert "cprofile.prof" in [os.path.basename(path) for path in profile_files(second)]
@@ -0,0 +1,61 @@
+import os
+import pytest
+from app.services.result_cache import ResultCache
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+def make_stems(directory, size, names=("vocals", "drums")):
+    os.makedirs(directory, exist_ok=True)
+    stem_files = []
+    for name in names:
+        stem_file = os.path.join(directory, f"{name}.wav")
+        with open(stem_file, "wb") as f:
+            f.write(b"\0" * size)
+        stem_files.append(stem_file)
+    return stem_files
+
+def test_key_depends_on_model_and_params():
+    key = ResultCache.make_key("abc", {"model": "htdemucs"})
+    assert key == ResultCache.make_key("abc", {"model": "htdemucs"})
+    assert key != ResultCache.make_key("abc", {"model": "htdemucs_ft"})
+    assert key != ResultCache.make_key("abc", {"model": "htdemucs", "shifts": 2})
+    assert key != ResultCache.make_key("abd", {"model": "htdemucs"})
+
+def test_miss_then_hit(cache_dir, tmp_path):
+    cache = ResultCache(cache_dir, max_bytes=1024)
+    assert cache.materialize("key", str(tmp_path / "out1")) is None
+
+    cache.put("key", make_stems(str(tmp_path / "job"), 100))
+    stem_files = cache.materialize("key", str(tmp_path / "out2"))
+
+    assert [os.path.basename(f) for f in stem_files] == ["vocals.wav", "drums.wav"]
+    assert all(f.startswith(str(tmp_path / "out2")) for f in stem_files)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+def test_lru_eviction_under_budget(cache_dir, tmp_path):
+    cache = ResultCache(cache_dir, max_bytes=450)
+    cache.put("a", make_stems(str(tmp_path / "a"), 100))
+    cache.put("b", make_stems(str(tmp_path / "b"), 100))
+    cache.get("a")
+    cache.put("c", make_stems(str(tmp_path / "c"), 100))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.total_bytes <= 450
+
+def test_oversized_result_is_not_cached(cache_dir, tmp_path):
+    cache = ResultCache(cache_dir, max_bytes=100)
+    cache.put("big", make_stems(str(tmp_path / "big"), 100))
+    assert cache.get("big") is None
+
+def test_entries_survive_restart(cache_dir, tmp_path):
+    cache = ResultCache(cache_dir, max_bytes=1024)
+    cache.put("key", make_stems(str(tmp_path / "job"), 10))
+
+    reopened = ResultCache(cache_dir, max_bytes=1024)
+    assert reopened.get("key") is not None
@@ -0,0 +1,37 @@
+import sys
+import json
+import subprocess
+import pytest
+from app.core.executor import ThreadSeparationExecutor
+from app.core.warmup import Warmup
+
+HEAVY_MODULES = ("torch", "librosa", "scipy.signal", "demucs")
+
+def test_importing_the_app_skips_heavy_modules():
+    # A fresh interpreter, since this test session may have imported them already
+    code = (
+        "import sys, json, app.main; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+@pytest.mark.asyncio
+async def test_warmup_becomes_ready():
+    warmup = Warmup()
+    assert not warmup.ready
+    await warmup.run(ThreadSeparationExecutor(max_workers=1), lambda progress=None: "cpu")
+    assert warmup.ready
+    assert warmup.status()["device"] == "cpu"
+    assert warmup.status()["duration_seconds"] >= 0
+
+@pytest.mark.asyncio
+async def test_failed_warmup_is_not_ready():
+    def broken(progress=None):
+        raise RuntimeError("no weights")
+
+    warmup = Warmup()
+    await warmup.run(ThreadSeparationExecutor(max_workers=1), broken)
+    assert warmup.state == "failed"
+    assert not warmup.ready
+    assert warmup.status()["error"] == "no weights"
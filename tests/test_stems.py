@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+from app.services import audio_separator
+from app.services.audio_separator import AudioSeparator
+from app.services.chunked import separate_in_chunks
+from app.services.stems import parse_stems, resolve_stems, select_stems, sources_needed
+
+SOURCES = ("drums", "bass", "other", "vocals")
+SR = 8000
+
+@pytest.fixture
+def stereo_input(tmp_path):
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.5, 0.5, size=(SR * 2, 2)).astype(np.float32)
+    path = str(tmp_path / "input.wav")
+    sf.write(path, audio, SR, subtype='FLOAT')
+    output_dir = tmp_path / "stems"
+    os.makedirs(output_dir)
+    return path, audio, str(output_dir)
+
+def test_parse_stems():
+    assert parse_stems("") is None
+    assert parse_stems(" Vocals, instrumental,vocals ") == ["vocals", "instrumental"]
+
+def test_resolve_stems_orders_and_validates():
+    assert resolve_stems(None, SOURCES) == list(SOURCES)
+    assert resolve_stems(["instrumental", "vocals"], SOURCES) == ["vocals", "instrumental"]
+    with pytest.raises(ValueError):
+        resolve_stems(["guitar"], SOURCES)
+
+def test_derived_stems_only_need_their_source():
+    assert sources_needed(["instrumental"]) == ["vocals"]
+    assert sources_needed(["vocals", "instrumental", "bass"]) == ["vocals", "bass"]
+
+def test_instrumental_is_mix_minus_vocals():
+    rng = np.random.default_rng(1)
+    separated = rng.normal(size=(4, 2, 100)).astype(np.float32)
+    mix = separated.sum(axis=0)
+    selected = select_stems(separated, mix, SOURCES, ["bass", "instrumental"])
+    np.testing.assert_allclose(selected[0], separated[1])
+    np.testing.assert_allclose(selected[1], separated[:3].sum(axis=0), atol=1e-5)
+
+def test_fallback_skips_stems_nobody_asked_for(stereo_input, monkeypatch):
+    path, audio, output_dir = stereo_input
+
+    def not_needed(*args):
+        raise AssertionError("computed a stem nobody asked for")
+
+    separator = AudioSeparator()
+    monkeypatch.setattr(separator, "extract_drums", not_needed)
+    monkeypatch.setattr(separator, "extract_bass", not_needed)
+    stem_files = separator.simple_separation(path, output_dir, stems=["instrumental", "vocals"])
+
+    assert [os.path.basename(stem) for stem in stem_files] == ["vocals.wav", "instrumental.wav"]
+    assert sorted(os.listdir(output_dir)) == ["instrumental.wav", "vocals.wav"]
+    vocals, _ = sf.read(stem_files[0], dtype='float32')
+    instrumental, _ = sf.read(stem_files[1], dtype='float32')
+    np.testing.assert_allclose(instrumental, audio - vocals[:, None], atol=1e-3)
+
+def test_cache_signature_depends_on_requested_stems(monkeypatch):
+    monkeypatch.setattr(audio_separator, "DEMUCS_AVAILABLE", False)
+    separator = AudioSeparator()
+    everything = separator.cache_signature("htdemucs", "wav16")
+    assert separator.cache_signature("htdemucs", "wav16", ["vocals", "other", "drums", "bass"]) == everything
+    assert separator.cache_signature("htdemucs", "wav16", ["vocals"]) != everything
+
+def test_streaming_writes_only_selected_stems(stereo_input):
+    path, audio, output_dir = stereo_input
+    stem_names = ["vocals", "instrumental"]
+
+    def infer(segment):
+        separated = np.stack([segment * 0.1, segment * 0.2, segment * 0.3, segment * 0.4])
+        return select_stems(separated, segment, SOURCES, stem_names)
+
+    stem_files = separate_in_chunks(path, output_dir, stem_names, infer, segment_seconds=0.5, overlap_seconds=0.1)
+
+    assert sorted(os.listdir(output_dir)) == ["instrumental.wav", "vocals.wav"]
+    instrumental, _ = sf.read(stem_files[1], dtype='float32')
+    np.testing.assert_allclose(instrumental, audio * 0.6, atol=1e-3)
@@ -0,0 +1,90 @@
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.core import metrics
+from app.core.task_store import MemoryTaskStore
+from app.models.task import SeparationTask
+from app.services.storage import JobStorage, directory_size
+
+HOUR = 60 * 60
+
+@pytest.fixture
+def storage(tmp_path):
+    return JobStorage(str(tmp_path / "jobs"), ttl_seconds=HOUR, high_watermark=0.9, low_watermark=0.8)
+
+@pytest.fixture
+def store():
+    return MemoryTaskStore()
+
+def add_job(storage, store, task_id, status, finished_hours_ago=None, size=1000):
+    job_dir = storage.create(task_id)
+    with open(storage.input_path(job_dir, "../../song.wav"), "wb") as f:
+        f.write(b"x" * size)
+    completed_at = None
+    if finished_hours_ago is not None:
+        completed_at = datetime.now() - timedelta(hours=finished_hours_ago)
+    store.save(SeparationTask(task_id=task_id, status=status, progress=0, job_dir=job_dir, completed_at=completed_at))
+    return job_dir
+
+def test_upload_stays_inside_its_job_dir(storage):
+    job_dir = storage.create("a")
+    assert storage.input_path(job_dir, "../../etc/passwd") == os.path.join(job_dir, "input", "passwd")
+
+def test_hard_links_free_nothing(tmp_path):
+    (tmp_path / "job").mkdir()
+    (tmp_path / "job" / "stem.wav").write_bytes(b"x" * 100)
+    (tmp_path / "job" / "input.wav").write_bytes(b"x" * 50)
+    os.link(tmp_path / "job" / "stem.wav", tmp_path / "cached.wav")
+    assert directory_size(str(tmp_path / "job")) == 50
+
+def test_finished_jobs_expire(storage, store):
+    before = metrics.STORAGE_RECLAIMED_BYTES.value(reason="expired")
+    add_job(storage, store, "old", "completed", finished_hours_ago=2, size=1000)
+    add_job(storage, store, "recent", "completed", finished_hours_ago=0.5)
+    add_job(storage, store, "queued", "queued")
+    os.utime(storage.job_dir("queued"), (0, time.time() - 3 * HOUR))
+    assert storage.sweep(store) == ["old"]
+    assert sorted(os.listdir(storage.root)) == ["queued", "recent"]
+    assert metrics.STORAGE_RECLAIMED_BYTES.value(reason="expired") == before + 1000
+
+def test_failed_jobs_expire_by_last_change(storage, store):
+    add_job(storage, store, "failed", "failed")
+    assert storage.sweep(store) == []
+    os.utime(storage.job_dir("failed"), (0, time.time() - 2 * HOUR))
+    assert storage.sweep(store) == ["failed"]
+
+def test_orphaned_uploads_are_removed(storage, store):
+    storage.create("orphan")
+    storage.sweep(store)
+    assert os.listdir(storage.root) == ["orphan"]
+    os.utime(storage.job_dir("orphan"), (0, time.time() - 2 * HOUR))
+    assert storage.sweep(store) == []
+    assert os.listdir(storage.root) == []
+
+def test_full_disk_evicts_oldest_finished_first(storage, store, monkeypatch):
+    for task_id, hours in (("newest", 0.1), ("oldest", 0.3), ("middle", 0.2)):
+        add_job(storage, store, task_id, "completed", finished_hours_ago=hours)
+    add_job(storage, store, "running", "processing")
+    # Each removal frees 8% of the disk
+    monkeypatch.setattr(storage, "disk_usage", lambda: 0.95 - 0.08 * (4 - len(os.listdir(storage.root))))
+    assert storage.sweep(store) == ["oldest", "middle"]
+    assert sorted(os.listdir(storage.root)) == ["newest", "running"]
+
+def test_zero_ttl_keeps_jobs(tmp_path, store):
+    storage = JobStorage(str(tmp_path / "jobs"), ttl_seconds=0, high_watermark=1, low_watermark=1)
+    add_job(storage, store, "old", "completed", finished_hours_ago=1000)
+    assert storage.sweep(store) == []
+
+def test_upload_is_kept_while_a_preview_reads_it(storage, store, monkeypatch):
+    parent_dir = add_job(storage, store, "parent", "cancelled", finished_hours_ago=2)
+    preview = SeparationTask(
+        task_id="preview", status="processing", progress=0, job_dir=storage.create("preview"),
+        input_path=storage.input_path(parent_dir, "song.wav"),
+    )
+    store.save(preview)
+    monkeypatch.setattr(storage, "disk_usage", lambda: 0.95)
+    assert storage.sweep(store) == []
+    assert sorted(os.listdir(storage.root)) == ["parent", "preview"]
+    store.save(preview.model_copy(update={"status": "completed", "completed_at": datetime.now()}))
+    assert storage.sweep(store) == ["parent", "preview"]
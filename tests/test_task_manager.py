@@ -0,0 +1,272 @@
+import pytest
+import asyncio
+import time
+from app.core.task_manager import TaskManager
+from app.core.task_store import MemoryTaskStore
+
+@pytest.fixture
+def manager():
+    manager = TaskManager(max_concurrent_tasks=2, store=MemoryTaskStore())
+    yield manager
+    manager.shutdown()
+
+async def start_scheduler(manager, process_task_func):
+    scheduler = asyncio.create_task(manager.process_queue(process_task_func))
+    await asyncio.sleep(0)
+    return scheduler
+
+@pytest.mark.asyncio
+async def test_dispatch_is_immediate(manager):
+    started = {}
+
+    async def process_task(task_id):
+        started[task_id] = time.perf_counter()
+
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        enqueued_at = time.perf_counter()
+        manager.add_task("a", "a.wav")
+        while "a" not in started:
+            await asyncio.sleep(0)
+        # Polling used to add up to a full second here
+        assert started["a"] - enqueued_at < 0.05
+    finally:
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_burst_fills_all_slots_at_once(manager):
+    release = asyncio.Event()
+    running = []
+
+    async def process_task(task_id):
+        running.append(task_id)
+        await release.wait()
+
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        for task_id in ("a", "b", "c", "d"):
+            manager.add_task(task_id, f"{task_id}.wav")
+        await asyncio.sleep(0.01)
+
+        assert running == ["a", "b"]
+        assert manager.tasks["c"].queue_position == 1
+        assert manager.tasks["d"].queue_position == 2
+    finally:
+        release.set()
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_finished_worker_frees_its_own_slot(manager):
+    gates = {task_id: asyncio.Event() for task_id in ("a", "b", "c")}
+    running = []
+
+    async def process_task(task_id):
+        running.append(task_id)
+        await gates[task_id].wait()
+
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        for task_id in ("a", "b", "c"):
+            manager.add_task(task_id, f"{task_id}.wav")
+        await asyncio.sleep(0.01)
+
+        gates["a"].set()
+        await asyncio.sleep(0.01)
+
+        assert running == ["a", "b", "c"]
+        assert set(manager.active_tasks) == {"b", "c"}
+    finally:
+        for gate in gates.values():
+            gate.set()
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_cleaned_up_task_is_never_dispatched(manager):
+    release = asyncio.Event()
+    running = []
+
+    async def process_task(task_id):
+        running.append(task_id)
+        await release.wait()
+
+    manager.max_concurrent_tasks = 1
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        for task_id in ("a", "b", "c"):
+            manager.add_task(task_id, f"{task_id}.wav")
+        await asyncio.sleep(0.01)
+        manager.cleanup_task("b")
+        assert manager.tasks["c"].queue_position == 1
+
+        release.set()
+        await asyncio.sleep(0.01)
+        assert running == ["a", "c"]
+    finally:
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_subscribers_get_pushed_updates(manager):
+    release = asyncio.Event()
+
+    async def process_task(task_id):
+        await release.wait()
+        # Progress arrives from an executor thread in real jobs
+        await asyncio.to_thread(manager.update_progress, task_id, 50)
+        # Subscribers only keep the latest snapshot, give the reader a turn
+        await asyncio.sleep(0.01)
+        manager.complete_task(task_id, ["vocals.wav"])
+
+    manager.max_concurrent_tasks = 1
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        manager.add_task("a", "a.wav")
+        manager.add_task("b", "b.wav")
+        events = manager.subscribe("b")
+        await asyncio.sleep(0.01)
+
+        release.set()
+        seen = []
+        while not seen or seen[-1]["status"] != "completed":
+            seen.append(await asyncio.wait_for(events.get(), timeout=1))
+
+        # b moves up when a starts, then starts itself once a finishes
+        assert (seen[0]["status"], seen[0]["queue_position"]) == ("queued", 1)
+        assert (seen[1]["status"], seen[1]["queue_position"]) == ("processing", None)
+        assert 50 in [event["progress"] for event in seen]
+        assert seen[-1]["stems"] == ["vocals.wav"]
+    finally:
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_queue_position_changes_are_published(manager):
+    release = asyncio.Event()
+
+    async def process_task(task_id):
+        await release.wait()
+
+    manager.max_concurrent_tasks = 1
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        for task_id in ("a", "b", "c"):
+            manager.add_task(task_id, f"{task_id}.wav")
+        await asyncio.sleep(0.01)
+        events = manager.subscribe("c")
+
+        manager.cleanup_task("b")
+        event = await asyncio.wait_for(events.get(), timeout=1)
+        assert event["queue_position"] == 1
+        assert event["queue_length"] == 1
+    finally:
+        release.set()
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_preview_jumps_the_queue(manager):
+    release = asyncio.Event()
+    running = []
+
+    async def process_task(task_id):
+        running.append(task_id)
+        await release.wait()
+
+    manager.max_concurrent_tasks = 1
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        for task_id in ("a", "b", "c"):
+            manager.add_task(task_id, f"{task_id}.wav")
+        await asyncio.sleep(0.01)
+        manager.add_task("c-preview", "c.wav", priority=1)
+        await asyncio.sleep(0.01)
+        assert manager.tasks["c-preview"].queue_position == 1
+        assert manager.tasks["c"].queue_position == 3
+
+        release.set()
+        await asyncio.sleep(0.01)
+        assert running == ["a", "c-preview", "b", "c"]
+    finally:
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_cancelled_task_never_runs(manager):
+    release = asyncio.Event()
+    running = []
+
+    async def process_task(task_id):
+        running.append(task_id)
+        await release.wait()
+
+    manager.max_concurrent_tasks = 1
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        for task_id in ("a", "b", "c"):
+            manager.add_task(task_id, f"{task_id}.wav")
+        await asyncio.sleep(0.01)
+        assert manager.cancel_task("b").status == "cancelled"
+        assert manager.get_task("b").status == "cancelled"
+        assert manager.get_task("c").queue_position == 1
+        assert manager.cancel_task("b") is None
+
+        release.set()
+        await asyncio.sleep(0.01)
+        assert running == ["a", "c"]
+    finally:
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_cancelled_task_stops_at_next_progress_report(manager):
+    from app.core.executor import JobCancelled
+    started = asyncio.Event()
+    release = asyncio.Event()
+    reports = []
+
+    async def process_task(task_id):
+        started.set()
+        await release.wait()
+        try:
+            for progress in (10, 20):
+                await asyncio.to_thread(manager.update_progress, task_id, progress)
+                reports.append(progress)
+        except JobCancelled:
+            return
+        manager.complete_task(task_id, ["vocals.wav"])
+
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        manager.add_task("a", "a.wav")
+        await asyncio.wait_for(started.wait(), timeout=1)
+        manager.cancel_task("a")
+        release.set()
+        await asyncio.sleep(0.01)
+        assert reports == []
+        assert manager.get_task("a").status == "cancelled"
+        assert "a" not in manager.active_tasks
+    finally:
+        scheduler.cancel()
+
+@pytest.mark.asyncio
+async def test_full_task_waits_for_its_preview(manager):
+    gates = {task_id: asyncio.Event() for task_id in ("preview", "full", "other")}
+    running = []
+
+    async def process_task(task_id):
+        running.append(task_id)
+        await gates[task_id].wait()
+        manager.complete_task(task_id, [])
+
+    scheduler = await start_scheduler(manager, process_task)
+    try:
+        manager.add_task("preview", "song.wav", priority=1)
+        manager.add_task("full", "song.wav", preview_task_id="preview")
+        manager.add_task("other", "other.wav")
+        await asyncio.sleep(0.01)
+        # The free slot goes to the next task instead
+        assert running == ["preview", "other"]
+        assert manager.get_task("full").status == "queued"
+
+        gates["preview"].set()
+        await asyncio.sleep(0.01)
+        assert running == ["preview", "other", "full"]
+    finally:
+        for gate in gates.values():
+            gate.set()
+        scheduler.cancel()
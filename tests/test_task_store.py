@@ -0,0 +1,156 @@
+import pytest
+from datetime import datetime, timedelta
+from app.core.task_manager import TaskManager
+from app.core.task_store import MemoryTaskStore, SqliteTaskStore
+from app.models.task import SeparationTask
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryTaskStore()
+    else:
+        store = SqliteTaskStore(str(tmp_path / "tasks.db"))
+        yield store
+        store.close()
+
+def make_task(task_id, status="completed", minutes_ago=0, **fields):
+    created_at = datetime(2024, 1, 1, 12, 0) - timedelta(minutes=minutes_ago)
+    return SeparationTask(task_id=task_id, status=status, progress=0, created_at=created_at, **fields)
+
+def test_created_at_is_per_task():
+    first = SeparationTask(task_id="a", status="queued", progress=0)
+    second = SeparationTask(task_id="b", status="queued", progress=0)
+    assert second.created_at > first.created_at
+
+def test_save_get_delete(store):
+    store.save(make_task("a", stems=["vocals.wav"]))
+    assert store.get("a").stems == ["vocals.wav"]
+
+    store.save(make_task("a", status="failed", error="boom"))
+    assert store.get("a").status == "failed"
+
+    store.delete("a")
+    assert store.get("a") is None
+
+def test_list_filters_and_paginates_newest_first(store):
+    for i in range(5):
+        store.save(make_task(f"done-{i}", minutes_ago=i))
+    store.save(make_task("broken", status="failed", minutes_ago=10))
+
+    page, total = store.list(limit=2, offset=1)
+    assert [task.task_id for task in page] == ["done-1", "done-2"]
+    assert total == 6
+
+    page, total = store.list(status="failed")
+    assert [task.task_id for task in page] == ["broken"]
+    assert total == 1
+
+def test_unfinished_oldest_first(store):
+    store.save(make_task("late", status="queued", minutes_ago=1))
+    store.save(make_task("early", status="processing", minutes_ago=5))
+    store.save(make_task("done", minutes_ago=10))
+    assert [task.task_id for task in store.unfinished()] == ["early", "late"]
+
+def test_sqlite_uses_wal_and_indexes(tmp_path):
+    store = SqliteTaskStore(str(tmp_path / "tasks.db"))
+    assert store._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = store._db.execute(
+        "EXPLAIN QUERY PLAN SELECT data FROM tasks WHERE status = ? ORDER BY created_at DESC",
+        ("queued",)
+    ).fetchall()
+    assert "tasks_status_created" in str(plan)
+    store.close()
+
+def test_restart_recovers_unfinished_tasks(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    inputs = {}
+    for name in ("a", "b", "c"):
+        inputs[name] = tmp_path / f"{name}.wav"
+        inputs[name].write_bytes(b"RIFF")
+
+    manager = TaskManager(max_concurrent_tasks=1, store=SqliteTaskStore(db_path))
+    for name in ("a", "b", "c"):
+        manager.add_task(name, str(inputs[name]))
+    manager.add_task("lost", str(tmp_path / "gone.wav"))
+    # a was running and c finished when the process went away
+    manager.tasks["a"].status = "processing"
+    manager.store.save(manager.tasks["a"])
+    manager.complete_task("c", ["vocals.wav"])
+    manager.shutdown()
+
+    restarted = TaskManager(max_concurrent_tasks=1, store=SqliteTaskStore(db_path))
+    try:
+        assert list(restarted.task_queue) == ["a", "b"]
+        assert restarted.get_task("a").status == "queued"
+        assert restarted.get_task("b").queue_position == 2
+        assert restarted.get_task("c").stems == ["vocals.wav"]
+        assert restarted.get_task("lost").status == "failed"
+        assert restarted.list_tasks(status="queued")["count"] == 2
+    finally:
+        restarted.shutdown()
+
+def test_live_processes_keep_their_tasks(tmp_path):
+    # uvicorn --workers: each process recovers on start, but only takes
+    # over tasks whose owner stopped renewing its lease
+    db_path = str(tmp_path / "tasks.db")
+    input_path = tmp_path / "x.wav"
+    input_path.write_bytes(b"RIFF")
+    first = TaskManager(max_concurrent_tasks=1, store=SqliteTaskStore(db_path), lease_seconds=60)
+    first.add_task("x", str(input_path))
+    second = TaskManager(max_concurrent_tasks=1, store=SqliteTaskStore(db_path), lease_seconds=60)
+    third = TaskManager(max_concurrent_tasks=1, store=SqliteTaskStore(db_path), lease_seconds=-1)
+    try:
+        assert list(second.task_queue) == []
+        # The first process went quiet: its lease is stale for the third
+        assert list(third.task_queue) == ["x"]
+        second.recover()
+        assert list(second.task_queue) == []
+    finally:
+        for manager in (first, second, third):
+            manager.shutdown()
+
+def test_higher_priority_goes_first(store):
+    store.save(make_task("old", status="queued", minutes_ago=5))
+    store.save(make_task("new", status="queued", minutes_ago=1))
+    store.save(make_task("preview", status="queued", minutes_ago=0, priority=1))
+    assert [task.task_id for task in store.unfinished()] == ["preview", "old", "new"]
+    assert store.queue_position(store.get("preview")) == 1
+    assert store.queue_position(store.get("new")) == 3
+
+def test_sqlite_adds_priority_to_old_databases(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "tasks.db")
+    db = sqlite3.connect(db_path)
+    db.execute(
+        "CREATE TABLE tasks (task_id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+        "created_at TEXT NOT NULL, data TEXT NOT NULL)"
+    )
+    task = make_task("a", status="queued")
+    db.execute("INSERT INTO tasks VALUES (?, ?, ?, ?)", ("a", "queued", task.created_at.isoformat(), task.model_dump_json()))
+    db.commit()
+    db.close()
+
+    store = SqliteTaskStore(db_path)
+    store.save(make_task("b", status="queued", minutes_ago=-1, priority=1))
+    assert [task.task_id for task in store.unfinished()] == ["b", "a"]
+    assert store.claim_next("worker-1").task_id == "b"
+    store.close()
+
+def test_sqlite_cancel(tmp_path):
+    store = SqliteTaskStore(str(tmp_path / "tasks.db"))
+    store.save(make_task("queued", status="queued"))
+    store.save(make_task("done"))
+    assert store.cancel("queued").status == "cancelled"
+    assert store.get("queued").status == "cancelled"
+    assert store.claim_next("worker-1") is None
+    assert store.cancel("done") is None
+    assert store.cancel("missing") is None
+    store.close()
+
+def test_group_in_submission_order(store):
+    store.save(make_task("second", status="queued", minutes_ago=1, group_id="album"))
+    store.save(make_task("first", status="queued", minutes_ago=2, group_id="album"))
+    store.save(make_task("other", status="queued", minutes_ago=3, group_id="single"))
+    store.save(make_task("loose", status="queued"))
+    assert [task.task_id for task in store.group("album")] == ["first", "second"]
+    assert store.group("missing") == []
@@ -0,0 +1,105 @@
+import io
+import hashlib
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from app.api.middleware import UploadSizeLimit
+from app.api.routes import ingest_upload
+from app.core.config import parse_size
+from app.utils.audio_probe import ProbeError, probe_audio
+
+def wav_bytes(seconds=0.5, sr=22050, channels=2):
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros((int(seconds * sr), channels), dtype=np.float32), sr, format="WAV")
+    return buffer.getvalue()
+
+def test_parse_size():
+    assert parse_size("100MB") == 100 * 1024 ** 2
+    assert parse_size("1.5 GiB") == int(1.5 * 1024 ** 3)
+    assert parse_size("4096") == 4096
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+@pytest.mark.asyncio
+async def test_ingest_hashes_while_writing(tmp_path):
+    data = b"x" * (3 * 1024 * 1024 + 17)
+    destination = str(tmp_path / "input.wav")
+    content_hash = await ingest_upload(UploadFile(io.BytesIO(data)), destination, max_bytes=len(data))
+    assert content_hash == hashlib.sha256(data).hexdigest()
+    assert open(destination, "rb").read() == data
+
+@pytest.mark.asyncio
+async def test_ingest_stops_at_the_limit(tmp_path):
+    # No declared size, as with a chunked request body
+    upload = UploadFile(io.BytesIO(b"x" * 5000))
+    with pytest.raises(HTTPException) as error:
+        await ingest_upload(upload, str(tmp_path / "input.wav"), max_bytes=4096)
+    assert error.value.status_code == 413
+
+def test_probe_reads_the_header(tmp_path):
+    path = tmp_path / "input.wav"
+    path.write_bytes(wav_bytes(seconds=0.5, sr=22050, channels=1))
+    info = probe_audio(str(path))
+    assert (info.duration, info.sample_rate, info.channels) == (0.5, 22050, 1)
+
+def test_probe_rejects_garbage(tmp_path):
+    path = tmp_path / "input.mp3"
+    path.write_bytes(b"definitely not audio" * 100)
+    with pytest.raises(ProbeError):
+        probe_audio(str(path))
+
+def test_middleware_rejects_large_content_length():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload():
+        return {"ok": True}
+
+    app.add_middleware(UploadSizeLimit, path="/upload", max_bytes=1024)
+    client = TestClient(app)
+    assert client.post("/upload", content=b"x" * 1024).status_code == 200
+    response = client.post("/upload", content=b"x" * (200 * 1024))
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
+
+def test_size_limit_answers_cross_origin_requests():
+    # A browser only shows the 413 if it carries the CORS headers
+    from app.core import config
+    from app.main import app
+    client = TestClient(app)
+    response = client.post(
+        "/upload", content=b"x",
+        headers={"Origin": "http://example.com", "Content-Length": str(config.MAX_FILE_SIZE * 2)},
+    )
+    assert response.status_code == 413
+    assert response.headers["access-control-allow-origin"] == "*"
+
+def test_preview_upload_and_cancel():
+    from app.api.routes import router, storage, task_manager
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    # Noise, so no earlier run's result is in the cache
+    buffer = io.BytesIO()
+    sf.write(buffer, np.random.default_rng().uniform(-0.1, 0.1, (40 * 8000, 2)).astype(np.float32), 8000, format="WAV")
+    response = client.post(
+        "/upload", files={"file": ("song.wav", buffer.getvalue(), "audio/wav")}, data={"preview": "true"}
+    )
+    body = response.json()
+    task_id, preview_id = body["task_id"], body["preview_task_id"]
+    try:
+        preview = task_manager.get_task(preview_id)
+        assert (preview.preview_of, preview.priority, preview.excerpt_seconds) == (task_id, 1, 30)
+        assert preview.queue_position < task_manager.get_task(task_id).queue_position
+
+        response = client.post(f"/cancel/{task_id}")
+        assert response.json() == {"task_id": task_id, "status": "cancelled"}
+        assert task_manager.get_task(task_id).status == "cancelled"
+        assert client.post(f"/cancel/{task_id}").status_code == 409
+        assert client.post("/cancel/missing").status_code == 404
+    finally:
+        for cleanup_id in (task_id, preview_id):
+            task_manager.cleanup_task(cleanup_id)
+            storage.remove(storage.job_dir(cleanup_id), "cleanup")
@@ -0,0 +1,151 @@
+import uuid
+import asyncio
+import threading
+import numpy as np
+import pytest
+import soundfile as sf
+from app.core.task_manager import TaskManager
+from app.core.task_store import MemoryTaskStore, SqliteTaskStore
+from app.models.task import SeparationTask
+from app.worker import run_job
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "tasks.db")
+
+@pytest.fixture
+def api(db_path):
+    manager = TaskManager(max_concurrent_tasks=1, store=SqliteTaskStore(db_path), run_jobs=False)
+    yield manager
+    manager.shutdown()
+
+@pytest.fixture
+def worker_store(db_path):
+    # Every worker process opens its own connection to the same file
+    store = SqliteTaskStore(db_path)
+    yield store
+    store.close()
+
+def test_api_only_mode_needs_a_shared_store():
+    with pytest.raises(ValueError):
+        TaskManager(store=MemoryTaskStore(), run_jobs=False)
+
+def test_workers_claim_in_queue_order(api, worker_store):
+    for task_id in ("a", "b", "c"):
+        api.add_task(task_id, f"{task_id}.wav")
+    assert api.get_task("c").queue_position == 3
+
+    assert worker_store.claim_next("worker-1").task_id == "a"
+    assert worker_store.claim_next("worker-2").task_id == "b"
+    assert api.get_task("a").status == "processing"
+    assert api.get_task("c").queue_position == 1
+    assert api.get_queue_status()["active_task_ids"] == ["a", "b"]
+
+    assert worker_store.claim_next("worker-1").task_id == "c"
+    assert worker_store.claim_next("worker-1") is None
+
+def test_dead_worker_tasks_are_queued_again(api, worker_store):
+    api.add_task("a", "a.wav")
+    task = worker_store.claim_next("worker-1")
+    task.progress = 40
+    worker_store.update(task, "worker-1")
+
+    assert worker_store.requeue_abandoned(worker_ids=["worker-1"]) == ["a"]
+    assert (api.get_task("a").status, api.get_task("a").progress) == ("queued", 0)
+
+    # The dead worker's late writes are ignored once another one holds the lease
+    assert worker_store.claim_next("worker-2").task_id == "a"
+    task.status = "failed"
+    assert not worker_store.update(task, "worker-1")
+    assert api.get_task("a").status == "processing"
+
+def test_task_that_keeps_crashing_workers_fails(api, worker_store):
+    api.add_task("a", "a.wav")
+    for attempt in range(3):
+        worker_store.claim_next(f"worker-{attempt}")
+        worker_store.requeue_abandoned(worker_ids=[f"worker-{attempt}"], max_attempts=3)
+    assert api.get_task("a").status == "failed"
+    assert "3 times" in api.get_task("a").error
+
+def test_stale_lease_is_queued_again(api, worker_store):
+    api.add_task("a", "a.wav")
+    worker_store.claim_next("worker-1")
+    assert worker_store.requeue_abandoned(stale_after=60) == []
+    assert worker_store.requeue_abandoned(stale_after=-1) == ["a"]
+
+def test_run_job_writes_results_to_the_store(api, worker_store, tmp_path):
+    input_path = str(tmp_path / "input.wav")
+    sf.write(input_path, np.zeros((22050, 2), dtype=np.float32), 22050)
+    api.add_task("a", input_path)
+
+    run_job(worker_store, worker_store.claim_next("worker-1"), "worker-1")
+    task = api.get_task("a")
+    assert task.status == "completed"
+    assert sorted(stem.rsplit("/", 1)[-1] for stem in task.stems) == [
+        "bass.wav", "drums.wav", "other.wav", "vocals.wav"
+    ]
+    assert worker_store.claim_next("worker-1") is None
+
+@pytest.mark.asyncio
+async def test_api_streams_worker_progress(api, worker_store):
+    api.add_task("a", "a.wav")
+    events = api.subscribe("a")
+    watcher = asyncio.create_task(api.watch_store(0.01))
+    try:
+        assert (await asyncio.wait_for(events.get(), timeout=1))["status"] == "queued"
+        task = worker_store.claim_next("worker-1")
+        assert (await asyncio.wait_for(events.get(), timeout=1))["status"] == "processing"
+        task.status = "completed"
+        worker_store.update(task, "worker-1")
+        assert (await asyncio.wait_for(events.get(), timeout=1))["status"] == "completed"
+    finally:
+        watcher.cancel()
+
+def test_event_stream_follows_a_task_run_by_another_process(monkeypatch):
+    # uvicorn --workers: the events request may land on a process that never
+    # hears the updates of the one running the task
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api import routes
+    monkeypatch.setattr(routes, "SSE_KEEPALIVE_SECONDS", 0.05)
+    task = SeparationTask(task_id=str(uuid.uuid4()), status="processing", progress=40, input_path="a.wav")
+    routes.task_manager.store.save(task)
+    app = FastAPI()
+    app.include_router(routes.router)
+    finished = task.model_copy(update={"status": "completed", "progress": 100})
+    timer = threading.Timer(0.2, routes.task_manager.store.save, [finished])
+    timer.start()
+    try:
+        with TestClient(app).stream("GET", f"/events/{task.task_id}") as response:
+            body = "".join(response.iter_text())
+    finally:
+        timer.join()
+        routes.task_manager.cleanup_task(task.task_id)
+    assert body.index("event: processing") < body.index("event: completed")
+
+def test_cancelled_task_stops_its_worker(api, worker_store, tmp_path):
+    input_path = str(tmp_path / "input.wav")
+    sf.write(input_path, np.zeros((22050, 2), dtype=np.float32), 22050)
+    api.add_task("a", input_path)
+    task = worker_store.claim_next("worker-1")
+    assert api.cancel_task("a").status == "cancelled"
+
+    run_job(worker_store, task, "worker-1")
+    task = api.get_task("a")
+    assert task.status == "cancelled"
+    assert task.stems is None
+    assert worker_store.cancel("a") is None
+
+def test_full_task_waits_for_its_preview(api, worker_store):
+    api.add_task("preview", "song.wav", priority=1)
+    api.add_task("full", "song.wav", preview_task_id="preview")
+    api.add_task("other", "other.wav")
+
+    preview = worker_store.claim_next("worker-1")
+    assert preview.task_id == "preview"
+    assert worker_store.claim_next("worker-2").task_id == "other"
+    assert worker_store.claim_next("worker-2") is None
+
+    preview.status = "completed"
+    worker_store.update(preview, "worker-1")
+    assert worker_store.claim_next("worker-1").task_id == "full"
@@ -0,0 +1,34 @@
+import io
+import os
+import zipfile
+import pytest
+from app.utils.zipstream import stream_zip
+
+@pytest.fixture
+def stem_files(tmp_path):
+    paths = []
+    for name, size in (("vocals.wav", 300_000), ("drums.wav", 10), ("bass.wav", 0)):
+        path = tmp_path / name
+        path.write_bytes(os.urandom(size))
+        paths.append((str(path), name))
+    return paths
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_stream_zip_roundtrip(stem_files, compress):
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(stem_files, compress=compress))))
+
+    assert archive.namelist() == ["vocals.wav", "drums.wav", "bass.wav"]
+    assert archive.testzip() is None
+    expected_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    for path, name in stem_files:
+        assert archive.getinfo(name).compress_type == expected_type
+        with open(path, "rb") as f:
+            assert archive.read(name) == f.read()
+
+def test_stream_zip_is_incremental(stem_files):
+    chunks = stream_zip(stem_files, chunk_size=64 * 1024)
+    first = next(chunks)
+    # The first local header goes out before any file data has been read
+    assert first.startswith(b"PK\x03\x04")
+    assert len(first) < 1024
+    assert max(len(chunk) for chunk in chunks) <= 64 * 1024 + 1024